@@ -0,0 +1,172 @@
+import os
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+
+ACTION_ID_BYTES = 6
+
+
+def new_action_id():
+    """Identifiant d'action aléatoire (pas de collision après suppression ni entre sessions)"""
+    return f"action_{os.urandom(ACTION_ID_BYTES).hex()}"
+
+
+def parse_deadline(value):
+    """Convertit une échéance (date, datetime ou texte ISO) en date ; None si absente ou invalide"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value.strip()[:10])
+        except ValueError:
+            return None
+    return None
+
+
+class ActionStore:
+    """Actions correctives et leurs index
+
+    ``actions`` conserve le format historique (identifiant -> dict de l'action)
+    pour l'import/export et la base SQLite ; l'échéance y est toujours une
+    ``date`` (ou None). Les index sont maintenus à chaque ajout, mise à jour
+    et suppression :
+
+    - mesure -> actions, pour l'affichage d'une mesure ;
+    - statut -> actions et priorité -> actions ;
+    - liste triée ``(échéance, action)``, pour que « en retard » ou « dans
+      les 7 jours » soient des recherches par intervalle (bisect).
+    """
+
+    def __init__(self, actions=None):
+        self.actions = {}
+        self._by_measure = {}
+        self._by_status = {}
+        self._by_priority = {}
+        self._deadlines = []
+        self.load(actions or {})
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __contains__(self, action_id):
+        return action_id in self.actions
+
+    def load(self, actions):
+        """Remplace toutes les actions et reconstruit les index"""
+        self.actions = {}
+        self._by_measure = {}
+        self._by_status = {}
+        self._by_priority = {}
+        self._deadlines = []
+        for action_id, action in actions.items():
+            action = dict(action, deadline=parse_deadline(action.get("deadline")))
+            self.actions[action_id] = action
+            self._index(action_id, action, sort=False)
+        self._deadlines.sort()
+
+    def _index(self, action_id, action, sort=True):
+        self._by_measure.setdefault(action["measure_id"], {})[action_id] = None
+        self._by_status.setdefault(action["statut"], {})[action_id] = None
+        self._by_priority.setdefault(action["priorite"], {})[action_id] = None
+        if action["deadline"] is not None:
+            if sort:
+                insort(self._deadlines, (action["deadline"], action_id))
+            else:
+                self._deadlines.append((action["deadline"], action_id))
+
+    def _unindex(self, action_id, action):
+        for index, key in (
+            (self._by_measure, action["measure_id"]),
+            (self._by_status, action["statut"]),
+            (self._by_priority, action["priorite"])
+        ):
+            related = index[key]
+            del related[action_id]
+            if not related:
+                del index[key]
+        if action["deadline"] is not None:
+            position = bisect_left(self._deadlines, (action["deadline"], action_id))
+            del self._deadlines[position]
+
+    def add(self, action_id, action):
+        """Ajoute (ou remplace) une action"""
+        if action_id in self.actions:
+            self.delete(action_id)
+        action = dict(action, deadline=parse_deadline(action.get("deadline")))
+        self.actions[action_id] = action
+        self._index(action_id, action)
+        return action
+
+    def update(self, action_id, **fields):
+        """Met à jour une action ; retourne l'action modifiée ou None"""
+        action = self.actions.get(action_id)
+        if action is None:
+            return None
+        if "deadline" in fields:
+            fields["deadline"] = parse_deadline(fields["deadline"])
+        self._unindex(action_id, action)
+        action.update(fields)
+        self._index(action_id, action)
+        return action
+
+    def delete(self, action_id):
+        """Supprime une action ; retourne False si elle n'existe pas"""
+        action = self.actions.pop(action_id, None)
+        if action is None:
+            return False
+        self._unindex(action_id, action)
+        return True
+
+    def action_ids_for_measure(self, measure_id):
+        """Identifiants des actions d'une mesure, dans l'ordre de création"""
+        return list(self._by_measure.get(measure_id, ()))
+
+    def actions_for_measure(self, measure_id):
+        """Actions (identifiant, action) d'une mesure"""
+        return [(action_id, self.actions[action_id]) for action_id in self._by_measure.get(measure_id, ())]
+
+    def count_by_measure(self):
+        """Nombre d'actions par mesure"""
+        return {measure_id: len(related) for measure_id, related in self._by_measure.items()}
+
+    def count_by_status(self):
+        """Nombre d'actions par statut"""
+        return {status: len(related) for status, related in self._by_status.items()}
+
+    def count_by_priority(self):
+        """Nombre d'actions par priorité"""
+        return {priority: len(related) for priority, related in self._by_priority.items()}
+
+    def due_between(self, first=None, last=None):
+        """Actions dont l'échéance est comprise entre ``first`` et ``last`` (inclus), triées par échéance"""
+        start = 0 if first is None else bisect_left(self._deadlines, (first,))
+        # (jour,) précède tous les (jour, action) : on borne au jour suivant ``last``
+        end = len(self._deadlines) if last is None else bisect_left(self._deadlines, (last + timedelta(days=1),))
+        return [action_id for _, action_id in self._deadlines[start:end]]
+
+    def query(self, statuses=None, priorities=None, first=None, last=None):
+        """Filtre les actions par statut, priorité et fenêtre d'échéance
+
+        Les actions sont triées par échéance ; sans fenêtre, les actions sans
+        échéance suivent, dans l'ordre de création.
+        """
+        candidates = None
+        for index, keys in ((self._by_status, statuses), (self._by_priority, priorities)):
+            if keys is None:
+                continue
+            selected = set()
+            for key in keys:
+                selected.update(index.get(key, ()))
+            candidates = selected if candidates is None else candidates & selected
+            if not candidates:
+                return []
+
+        if first is None and last is None:
+            ordered = [action_id for _, action_id in self._deadlines]
+            ordered.extend(action_id for action_id, action in self.actions.items() if action["deadline"] is None)
+        else:
+            ordered = self.due_between(first, last)
+        if candidates is None:
+            return ordered
+        return [action_id for action_id in ordered if action_id in candidates]
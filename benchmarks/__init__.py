@@ -0,0 +1,11 @@
+"""Benchmarks de l'application
+
+Les modules s'exécutent depuis la racine du dépôt avec ``python -m`` :
+
+- ``generator`` : registres synthétiques reproductibles (1k à 1M mesures) ;
+- ``harness`` : rerun complet de chaque vue avec ``AppTest`` ;
+- ``micro`` : fonctions de données de ``carto.py``, résultats en JSON ;
+- ``bench_*`` : comparaisons ciblées (couverture, import CSV, recherche,
+  miroir colonnaire, snapshot, mémoire du registre partagé, démarrage à
+  froid, rapports par processus, import par fusion).
+"""
@@ -0,0 +1,67 @@
+"""Requêtes multi-processus : parcours du registre imbriqué contre miroir NumPy
+
+Mesure, selon la taille du registre, une requête ET sur deux processus avec
+ses statistiques de couverture, la construction du miroir colonnaire et la
+mémoire de ses tableaux. Vérifie aussi les requêtes et le contrôle de
+cohérence sur un registre vide et sur un registre dont tous les risques
+ont été supprimés.
+
+    python -m benchmarks.bench_arrays
+"""
+import time
+
+from benchmarks.bench_coverage import build_store, timed
+from benchmarks.generator import MEASURE_TYPES
+from risk_store import RiskStore
+
+QUERY = ["VENTE", "LOGISTIQUE"]
+
+
+def scan_query(families, all_of):
+    refs = []
+    measures = 0
+    for family_key, family_data in families.items():
+        for risk_key, risk_data in family_data["risks"].items():
+            if all(process in risk_data["processes"] for process in all_of):
+                refs.append((family_key, risk_key))
+                measures += sum(len(m) for m in risk_data["measures"].values())
+    return refs, measures
+
+
+def arrays_query(arrays, all_of):
+    rows = arrays.select(all_of=all_of)
+    return arrays.refs_of(rows), arrays.stats(rows)["total_measures"]
+
+
+def check_empty():
+    """Miroir sans aucune ligne valide : statistiques nulles, aucune anomalie"""
+    emptied = build_store(1_000)
+    emptied.arrays
+    for family_key, family_data in list(emptied.families.items()):
+        for risk_key in list(family_data["risks"]):
+            emptied.delete_risk(family_key, risk_key)
+    for store in (RiskStore(measure_types=MEASURE_TYPES), emptied):
+        arrays = store.arrays
+        assert store.check_consistency() == [], "contrôle de cohérence en échec sur un registre vide"
+        assert arrays_query(arrays, QUERY) == ([], 0)
+        assert all(totals == (0, 0) for totals in arrays.totals_by_process().values())
+
+
+def main():
+    check_empty()
+    print(f"{'risques':>10} {'mesures':>10} {'construction (s)':>17} {'Mo':>6} {'parcours (ms)':>14} {'numpy (ms)':>11}")
+    for n_measures in (50_000, 500_000, 2_000_000):
+        store = build_store(n_measures)
+        start = time.perf_counter()
+        arrays = store.arrays
+        build = time.perf_counter() - start
+        n_risks = len(arrays)
+        memory = sum(a.nbytes for a in (arrays.masks, arrays.counts, arrays.family_codes, arrays.valid)) / 1e6
+        assert scan_query(store.families, QUERY) == arrays_query(arrays, QUERY)
+        scan = timed(lambda: scan_query(store.families, QUERY), 3)
+        vectorized = timed(lambda: arrays_query(arrays, QUERY), 20)
+        print(f"{n_risks:>10} {n_measures:>10} {build:>17.2f} {memory:>6.1f} {scan:>14.1f} {vectorized:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Latence des métriques de couverture selon la taille du registre
+
+Compare le recalcul complet (ancien ``get_process_coverage_stats``) aux
+compteurs incrémentaux de ``RiskStore.coverage``.
+
+    python -m benchmarks.bench_coverage
+"""
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from benchmarks.generator import MEASURE_TYPES, generate_register
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from risk_store import RiskStore  # noqa: E402
+
+
+def build_store(n_measures, seed=0):
+    return RiskStore(generate_register(n_measures, seed), MEASURE_TYPES)
+
+
+def full_scan_stats(families, process_name):
+    stats = {"total_risks": 0, "measures_by_type": defaultdict(int), "total_measures": 0}
+    for family_data in families.values():
+        for risk_data in family_data["risks"].values():
+            if process_name in risk_data.get("processes", []):
+                stats["total_risks"] += 1
+                for measure_type, measures in risk_data["measures"].items():
+                    stats["measures_by_type"][measure_type] += len(measures)
+                    stats["total_measures"] += len(measures)
+    return stats
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    print(f"{'mesures':>10} {'scan complet (ms)':>18} {'compteurs (ms)':>15}")
+    for n_measures in (10_000, 100_000, 1_000_000):
+        store = build_store(n_measures)
+        assert not store.check_consistency()
+        scan = timed(lambda: full_scan_stats(store.families, "VENTE"), 5)
+        counters = timed(lambda: store.coverage.process_stats("VENTE"), 1000)
+        print(f"{n_measures:>10} {scan:>18.3f} {counters:>15.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Temps d'import CSV : boucle iterrows historique contre import vectorisé par blocs
+
+Vérifie aussi qu'un identifiant de mesure répété (dans un bloc ou d'un bloc
+à l'autre) est remplacé, la première mesure gardant le sien.
+
+    python -m benchmarks.bench_csv_import [nb_lignes ...]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.generator import MEASURE_TYPES, generate_register, iter_measures
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from register_io import CSV_COLUMNS, read_csv_register  # noqa: E402
+
+
+def write_csv(path, n_rows, seed=0, duplicate_every=0):
+    """Export CSV d'un registre généré ; ``duplicate_every`` reprend l'identifiant de la première mesure"""
+    families = generate_register(n_rows, seed)
+    rows = []
+    for i, (family_key, risk_key, measure_type, measure) in enumerate(iter_measures(families)):
+        family_data = families[family_key]
+        risk_data = family_data["risks"][risk_key]
+        measure_id = rows[0][6] if duplicate_every and i and i % duplicate_every == 0 else measure["id"]
+        rows.append((
+            family_key, family_data["name"], risk_key.split(" - ", 1)[1], risk_data["description"],
+            "|".join(risk_data["processes"]), measure_type, measure_id, measure["text"]
+        ))
+    pd.DataFrame(rows, columns=CSV_COLUMNS).to_csv(path, index=False)
+    return rows[0][6]
+
+
+def check_duplicate_ids(path, n_rows=2_000, chunksize=500):
+    first_id = write_csv(path, n_rows, duplicate_every=300)
+    families = read_csv_register(path, MEASURE_TYPES, chunksize=chunksize)
+    ids = [measure["id"] for _, _, _, measure in iter_measures(families)]
+    assert len(ids) == n_rows and len(set(ids)) == n_rows, "identifiants de mesure en double après lecture"
+    assert ids.count(first_id) == 1
+
+
+def legacy_load(path):
+    df = pd.read_csv(path)
+    new_data = {}
+    for _, row in df.iterrows():
+        family_key = row["family"]
+        if family_key not in new_data:
+            new_data[family_key] = {"name": row["family_name"], "risks": {}}
+        risk_key = f"{family_key} - {row['risk_name']}"
+        if risk_key not in new_data[family_key]["risks"]:
+            new_data[family_key]["risks"][risk_key] = {
+                "description": row["description"],
+                "processes": row["processes"].split("|"),
+                "measures": {k: [] for k in MEASURE_TYPES}
+            }
+        new_data[family_key]["risks"][risk_key]["measures"][row["measure_type"]].append(row["measure"])
+    return new_data
+
+
+def measure_texts(families):
+    """Registre où chaque mesure est réduite à son texte (format historique)"""
+    for family in families.values():
+        for risk in family["risks"].values():
+            for measure_type, measures in risk["measures"].items():
+                risk["measures"][measure_type] = [m["text"] for m in measures]
+    return families
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main(sizes):
+    print(f"{'lignes':>10} {'iterrows (s)':>13} {'par blocs (s)':>14} {'gain':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        check_duplicate_ids(Path(tmp) / "duplicates.csv")
+        for n_rows in sizes:
+            path = Path(tmp) / f"register_{n_rows}.csv"
+            write_csv(path, n_rows)
+            before, expected = timed(lambda: legacy_load(path))
+            after, result = timed(lambda: read_csv_register(path, MEASURE_TYPES))
+            assert measure_texts(result) == expected
+            print(f"{n_rows:>10} {before:>13.2f} {after:>14.2f} {before / after:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
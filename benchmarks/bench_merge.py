@@ -0,0 +1,164 @@
+"""Import par fusion contre import par remplacement
+
+Un même fichier de quelques centaines de risques (mesures déjà présentes
+à la casse et aux espaces près, nouvelles mesures, descriptions modifiées,
+nouvelle famille) est fusionné dans des registres de tailles croissantes :
+la durée de la fusion doit rester à peu près constante, alors que
+l'import par remplacement relit le registre complet augmenté du fichier.
+
+Vérifie aussi le résumé (ajoutés, mis à jour, inchangés), la cohérence
+des compteurs, qu'une description ou des processus vides dans le fichier
+laissent ceux du registre, qu'une seconde fusion du même fichier ne
+change rien, que le rejeu des opérations produites redonne le même
+registre, et que SqliteBackend et Journal enregistrent la fusion à
+l'identique.
+
+    python -m benchmarks.bench_merge [--sizes 10k 100k 1M] [--risks 200]
+"""
+import argparse
+import copy
+import io
+import json
+import os
+import random
+import statistics
+import tempfile
+
+from benchmarks.generator import MEASURE_TYPES, generate_register, parse_size
+from benchmarks.micro import timed
+import core
+from journal import Journal
+from risk_store import RiskStore
+from sqlite_backend import SqliteBackend
+
+NEW_FAMILY = "FNEW"
+
+
+def incoming_file(families, n_risks, seed=0):
+    """Fichier JSON à fusionner et résumé attendu
+
+    Chaque risque repris du registre garde ses mesures (réécrites en
+    majuscules avec des espaces en trop : doublons à ignorer) et en gagne
+    une ; un sur quatre change aussi de description, un autre sur quatre
+    arrive sans description ni processus. S'y ajoutent autant de risques
+    dans une nouvelle famille.
+    """
+    rng = random.Random(seed)
+    refs = [(f, r) for f, family_data in families.items() for r in family_data["risks"]]
+    incoming = {}
+    expected = {"families": {"unchanged": 0, "added": 1}, "risks": {"updated": n_risks, "added": n_risks},
+                "measures": {"added": 2 * n_risks, "unchanged": 0}}
+    for i, (family_key, risk_key) in enumerate(rng.sample(refs, n_risks)):
+        risk_data = families[family_key]["risks"][risk_key]
+        family = incoming.setdefault(family_key, {"name": families[family_key]["name"], "risks": {}})
+        measures = {
+            measure_type: [{"id": m["id"], "text": f"  {m['text'].upper()} "} for m in measures]
+            for measure_type, measures in risk_data["measures"].items()
+        }
+        measures[MEASURE_TYPES[i % len(MEASURE_TYPES)]].append({"id": "", "text": f"Nouvelle mesure {i}"})
+        expected["measures"]["unchanged"] += sum(len(m) for m in risk_data["measures"].values())
+        family["risks"][risk_key] = {
+            "description": f"{risk_data['description']} (révisée)" if i % 4 == 0 else risk_data["description"],
+            "processes": list(risk_data["processes"]),
+            "measures": measures
+        }
+        if i % 4 == 1:
+            # Description et processus absents : ceux du registre sont conservés
+            family["risks"][risk_key].update(description="", processes=[])
+    expected["families"]["unchanged"] = len(incoming)
+    incoming[NEW_FAMILY] = {"name": "Nouvelle famille", "risks": {
+        f"{NEW_FAMILY} - Risque {i}": {
+            "description": f"Nouveau risque {i}",
+            "processes": ["VENTE"],
+            # Deux mesures identiques après normalisation : une seule est ajoutée
+            "measures": {t: ([{"id": "", "text": f"Mesure {i}"}, {"id": "", "text": f"mesure  {i}"}] if t == "D" else [])
+                         for t in MEASURE_TYPES}
+        }
+        for i in range(n_risks)
+    }}
+    expected["measures"]["unchanged"] += n_risks
+    return json.dumps(incoming).encode(), expected
+
+
+def parse(payload):
+    return core.parse_upload(io.BytesIO(payload), "json")
+
+
+def check_merge(families, payload, expected):
+    """Résumé, cohérence, idempotence, rejeu et persistance d'une fusion"""
+    store = RiskStore(copy.deepcopy(families), MEASURE_TYPES)
+    summary, operations = store.merge(parse(payload)["families"])
+    summary = {level: {k: v for k, v in counts.items() if v} for level, counts in summary.items()}
+    wanted = {level: {k: v for k, v in counts.items() if v} for level, counts in expected.items()}
+    assert summary == wanted, f"résumé inattendu : {summary} au lieu de {wanted}"
+    assert store.check_consistency() == [], "compteurs incohérents après fusion"
+    for family_key, family_data in parse(payload)["families"].items():
+        for risk_key, risk_data in family_data["risks"].items():
+            if not risk_data["description"] and risk_key in families.get(family_key, {}).get("risks", {}):
+                kept, before = store.families[family_key]["risks"][risk_key], families[family_key]["risks"][risk_key]
+                assert (kept["description"], kept["processes"]) == (before["description"], before["processes"]), \
+                    f"{risk_key} : valeurs vides de l'import appliquées au registre"
+
+    again, operations_again = store.merge(parse(payload)["families"])
+    assert not operations_again and not again["risks"]["added"], "une seconde fusion modifie le registre"
+
+    replayed = RiskStore(copy.deepcopy(families), MEASURE_TYPES)
+    for operation, args in json.loads(json.dumps(operations)):
+        replayed.apply(operation, *args)
+    assert replayed.families == store.families, "le rejeu des opérations diffère de la fusion"
+
+    with tempfile.TemporaryDirectory() as directory:
+        backends = {
+            "sqlite": SqliteBackend(os.path.join(directory, "carto.db")),
+            "journal": Journal(os.path.join(directory, "journal"), MEASURE_TYPES)
+        }
+        for name, backend in backends.items():
+            backend.replace_register(copy.deepcopy(families))
+            backend.merge_register(operations)
+            assert backend.load_state(MEASURE_TYPES)["families"] == store.families, f"{name} : fusion mal enregistrée"
+            backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k", "1M"], help="1k, 10k, 100k, 1M ou un entier")
+    parser.add_argument("--risks", type=int, default=200, help="risques existants repris dans le fichier")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--check-max", default="10k", help="vérifications complètes jusqu'à cette taille")
+    args = parser.parse_args()
+
+    print(f"{'mesures':>9} {'import':<14} {'Mo lus':>8} {'médiane (ms)':>13}")
+    for label in args.sizes:
+        n_measures = parse_size(label)
+        families = generate_register(n_measures)
+        payload, expected = incoming_file(families, args.risks)
+        if n_measures <= parse_size(args.check_max):
+            check_merge(families, payload, expected)
+
+        # Registre neuf avant chaque fusion (hors chronométrage)
+        stores = []
+
+        def merge():
+            stores[0].merge(parse(payload)["families"])
+
+        def reset():
+            stores[:] = [RiskStore(copy.deepcopy(families), MEASURE_TYPES)]
+
+        # Remplacement : le fichier complet (registre existant + nouveautés) est relu
+        full = copy.deepcopy(families)
+        for family_key, family_data in parse(payload)["families"].items():
+            full.setdefault(family_key, {"name": family_data["name"], "risks": {}})["risks"].update(family_data["risks"])
+        full_payload = core.save_to_json(full)
+        del full
+
+        cases = {
+            "fusion": (merge, reset, len(payload)),
+            "remplacement": (lambda: RiskStore(parse(full_payload)["families"], MEASURE_TYPES), None, len(full_payload))
+        }
+        for name, (func, setup, size) in cases.items():
+            median = statistics.median(timed(func, args.repeat, setup))
+            print(f"{n_measures:>9} {name:<14} {size / 1e6:>8.2f} {median * 1000:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
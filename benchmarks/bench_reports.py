@@ -0,0 +1,62 @@
+"""Rapports par processus et par service : rendu séquentiel contre pool de processus
+
+Mesure la construction de l'agrégation partagée puis l'écriture de tous les
+rapports (HTML et CSV, processus et services) avec un seul processus et
+avec un pool. Vérifie que les fichiers produits sont identiques dans les
+deux cas et que les rapports CSV des processus comptent autant de mesures
+que les compteurs de couverture.
+
+    python -m benchmarks.bench_reports [--sizes 10k 100k] [--workers 4]
+"""
+import argparse
+import csv
+import filecmp
+import os
+import tempfile
+import time
+
+from benchmarks.generator import MEASURE_TYPES, generate_register, parse_size
+from reports import build_report_data, report_name, write_reports
+from risk_store import RiskStore
+
+
+def check_reports(data, sequential_dir, parallel_dir):
+    """Même contenu quel que soit le nombre de processus, et comptes cohérents"""
+    names = sorted(os.listdir(sequential_dir))
+    assert names == sorted(os.listdir(parallel_dir)), "fichiers différents selon le nombre de processus"
+    _, mismatch, errors = filecmp.cmpfiles(sequential_dir, parallel_dir, names, shallow=False)
+    assert not mismatch and not errors, f"contenus différents : {(mismatch + errors)[:3]}"
+    for process, summary in data["by_process"].items():
+        with open(os.path.join(sequential_dir, f"{report_name('processus', process)}.csv"), newline="") as f:
+            measures = sum(1 for row in csv.DictReader(f) if row["mesure"])
+        assert measures == summary["total_measures"], f"{process} : {measures} mesures au lieu de {summary['total_measures']}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k"], help="1k, 10k, 100k, 1M ou un entier")
+    parser.add_argument("--workers", type=int, default=4, help="taille du pool")
+    args = parser.parse_args()
+
+    print(f"{'mesures':>9} {'étape':<30} {'durée (s)':>10} {'Mo':>8}")
+    for label in args.sizes:
+        n_measures = parse_size(label)
+        store = RiskStore(generate_register(n_measures), MEASURE_TYPES)
+        start = time.perf_counter()
+        data = build_report_data(store)
+        print(f"{n_measures:>9} {'agrégation partagée':<30} {time.perf_counter() - start:>10.2f}")
+        with tempfile.TemporaryDirectory() as sequential_dir, tempfile.TemporaryDirectory() as parallel_dir:
+            for name, directory, workers in (
+                ("rendu, 1 processus", sequential_dir, 1),
+                (f"rendu, pool de {args.workers}", parallel_dir, args.workers)
+            ):
+                start = time.perf_counter()
+                count, size = write_reports(data, directory, workers=workers)
+                seconds = time.perf_counter() - start
+                print(f"{n_measures:>9} {name:<30} {seconds:>10.2f} {size / 1e6:>8.1f}")
+            check_reports(data, sequential_dir, parallel_dir)
+        print(f"{'':>9} {count} rapports vérifiés")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Latence de la recherche plein texte sur un registre d'environ 100 000 mesures
+
+Mesure aussi la recherche juste après chaque modification publiée, comme
+avec un stockage persistant (chaque écriture publie une nouvelle version
+par fork) : l'index doit suivre le fork sans être reconstruit.
+
+    python -m benchmarks.bench_search
+"""
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.generator import MEASURE_TYPES, generate_register
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from risk_store import RiskStore  # noqa: E402
+from shared_register import SessionRegister, SharedRegister  # noqa: E402
+
+QUERIES = ["sécurité", "securite", "fraude paiement", "rapprochement bancaire", "chiffr", "xyzzy", "rupture stock"]
+
+
+def build_store(n_measures, seed=0):
+    return RiskStore(generate_register(n_measures, seed, sentences=True), MEASURE_TYPES)
+
+
+def search_after_edits(families, edits, query="sécurité"):
+    """(reconstructions de l'index, pire latence en ms) d'une recherche après chaque modification publiée"""
+    shared = SharedRegister(MEASURE_TYPES)
+    shared.replace(families)
+    session = SessionRegister(shared)
+    session.search(query)
+    rebuilds = 0
+    worst = 0.0
+    for i in range(edits):
+        family_key = sorted(session.families)[i % len(session.families)]
+        risk_key = next(iter(session.families[family_key]["risks"]))
+        session.add_measures(family_key, risk_key, MEASURE_TYPES[0], [f"Contrôle de sécurité {i}"])
+        session.commit(revision=i + 1)
+        rebuilds += session.store._search is None
+        start = time.perf_counter()
+        results = session.search(query)
+        worst = max(worst, (time.perf_counter() - start) * 1000)
+        assert (family_key, risk_key) in results, "mesure ajoutée introuvable"
+    fresh = RiskStore(session.families, MEASURE_TYPES)
+    assert sorted(session.search(query)) == sorted(fresh.search(query)), "index du fork différent d'une reconstruction"
+    return rebuilds, worst
+
+
+def main():
+    store = build_store(100_000)
+    start = time.perf_counter()
+    store.search_index
+    print(f"construction de l'index : {time.perf_counter() - start:.2f} s ({len(store.search_index)} risques)")
+    print(f"{'requête':<25} {'résultats':>10} {'ms':>8}")
+    for query in QUERIES:
+        repeat = 20
+        start = time.perf_counter()
+        for _ in range(repeat):
+            results = store.search(query)
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        print(f"{query:<25} {len(results):>10} {elapsed:>8.2f}")
+
+    edits = 50
+    rebuilds, worst = search_after_edits(generate_register(100_000, sentences=True), edits)
+    print(f"après {edits} modifications publiées : {rebuilds} reconstruction(s), pire recherche {worst:.1f} ms")
+    assert rebuilds == 0, "index reconstruit après une modification"
+
+
+if __name__ == "__main__":
+    main()
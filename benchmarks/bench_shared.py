@@ -0,0 +1,155 @@
+"""Mémoire par session : registre partagé en copie sur écriture contre copie complète
+
+Charge un registre dans un ``SharedRegister`` puis mesure (tracemalloc)
+la mémoire allouée par session : lecture seule, session qui modifie
+quelques risques (fork), et copie profonde du registre comme en gardait
+chaque session auparavant. Vérifie au passage que les modifications du
+fork, rejouées sur une copie ordinaire, donnent le même registre, sans
+toucher à la version partagée, qu'une suppression sans cible ne crée ni
+fork ni opération, et que deux sessions sur un même stockage SQLite voient
+les écritures l'une de l'autre.
+
+    python -m benchmarks.bench_shared [--sizes 10k 100k] [--edits 20]
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generator import (
+    MEASURE_TYPES, PROCESSES, generate_actions, generate_evaluations, generate_register, parse_size
+)
+from core import Workspace, new_state
+from risk_store import RiskStore
+from shared_register import SessionRegister, SharedRegister
+from sqlite_backend import SqliteBackend
+
+
+def allocated(func):
+    """(résultat, octets restés alloués, durée en s) de ``func()``"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, seconds
+
+
+def edit(session, edits, seed=0):
+    """Modifications typiques d'un utilisateur : risques ajoutés, mesures ajoutées et supprimées"""
+    rng = random.Random(seed)
+    families = sorted(session.families)
+    for i in range(edits):
+        family_key = rng.choice(families)
+        risk_key = rng.choice(sorted(session.families[family_key]["risks"]))
+        if i % 3 == 0:
+            session.add_risk(family_key, f"{family_key} - Nouveau {i}", "Ajout", rng.sample(PROCESSES, 2))
+        elif i % 3 == 1:
+            session.add_measures(family_key, risk_key, rng.choice(MEASURE_TYPES), ["Contrôle", "Revue"])
+        else:
+            session.delete_measure(family_key, risk_key, rng.choice(MEASURE_TYPES), 0)
+    return session
+
+
+def check_fork(shared, session):
+    """Le fork équivaut à une copie modifiée et la version partagée est intacte"""
+    _, base = shared.current()
+    before = json.dumps(base.families, sort_keys=True)
+    reference = RiskStore(copy.deepcopy(base.families), MEASURE_TYPES)
+    for operation, args in session.operations:
+        reference.apply(operation, *args)
+    assert session.store.families == reference.families, "fork différent d'une copie modifiée"
+    assert session.store.check_consistency() == [], "compteurs du fork incohérents"
+    assert json.dumps(base.families, sort_keys=True) == before, "version partagée modifiée"
+
+
+def check_noop_deletes(shared):
+    """Suppressions dont la cible n'existe pas : la session reste sur la version publiée"""
+    session = SessionRegister(shared)
+    family_key = next(iter(session.families))
+    risk_key = next(iter(session.families[family_key]["risks"]))
+    assert not session.delete_risk(family_key, f"{family_key} - Absent")
+    assert not session.delete_measure(family_key, risk_key, MEASURE_TYPES[0], 10 ** 6)
+    assert not session.pending and session.store is shared.current()[1], "suppression sans effet enregistrée"
+
+
+def check_two_sessions(families):
+    """Deux sessions sur un même stockage SQLite
+
+    Un import de snapshot (registre, actions, évaluations) de l'une est relu
+    par l'autre ; une mesure ajoutée ensuite est reprise sans relecture.
+    """
+    measure_status, measure_performance = generate_evaluations(families)
+    snapshot = {
+        "families": copy.deepcopy(families),
+        "actions": generate_actions(families, 20),
+        "measure_status": measure_status,
+        "measure_performance": measure_performance
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        backend = SqliteBackend(os.path.join(directory, "carto.db"))
+        loads = []
+        load_state = backend.load_state
+        backend.load_state = lambda measure_types: loads.append(measure_types) or load_state(measure_types)
+        shared = SharedRegister(MEASURE_TYPES)
+        sessions = []
+        for _ in range(2):
+            state = new_state()
+            state["risk_store"] = SessionRegister(shared)
+            sessions.append(Workspace(state, backend))
+            sessions[-1].sync()
+        a, b = sessions
+
+        a.import_state(snapshot)
+        assert b.sync(), "import de l'autre session ignoré"
+        assert b.families == snapshot["families"], "registre importé absent"
+        assert b.action_store.actions.keys() == snapshot["actions"].keys(), "actions importées absentes"
+        assert (b.measure_status, b.measure_performance) == (measure_status, measure_performance), \
+            "évaluations importées absentes"
+
+        loads.clear()
+        family_key = next(iter(families))
+        risk_key = next(iter(families[family_key]["risks"]))
+        a.add_measure(family_key, risk_key, MEASURE_TYPES[0], "Contrôle ajouté")
+        assert b.sync() and b.families == a.families, "mesure de l'autre session absente"
+        assert not loads, "stockage relu pour une modification du registre"
+        assert b.action_store.actions.keys() == snapshot["actions"].keys()
+        backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k"], help="1k, 10k, 100k, 1M ou un entier")
+    parser.add_argument("--edits", type=int, default=20, help="modifications de la session qui édite")
+    args = parser.parse_args()
+
+    check_two_sessions(generate_register(parse_size("1k")))
+    print(f"{'mesures':>9} {'session':<28} {'Mo':>8} {'durée (ms)':>11}")
+    for label in args.sizes:
+        n_measures = parse_size(label)
+        shared = SharedRegister(MEASURE_TYPES)
+        shared.replace(generate_register(n_measures))
+        _, base = shared.current()
+        # Index construits une fois pour toutes, comme après le premier rerun
+        base.arrays
+        check_noop_deletes(shared)
+
+        cases = {
+            "lecture seule": lambda: SessionRegister(shared),
+            f"{args.edits} modifications (fork)": lambda: edit(SessionRegister(shared), args.edits),
+            "copie complète": lambda: RiskStore(copy.deepcopy(base.families), MEASURE_TYPES)
+        }
+        for name, build in cases.items():
+            result, size, seconds = allocated(build)
+            print(f"{n_measures:>9} {name:<28} {size / 1e6:>8.2f} {seconds * 1000:>11.1f}")
+            if isinstance(result, SessionRegister) and result.pending:
+                check_fork(shared, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Snapshot compressé contre exports JSON et CSV : aller-retour, taille et vitesse
+
+Vérifie d'abord qu'un snapshot relu redonne exactement l'état écrit
+(registre, actions, évaluations), puis compare taille et durées d'écriture
+et de lecture avec ``save_to_json`` / ``save_to_csv`` (qui ne couvrent que
+le registre).
+
+    python -m benchmarks.bench_snapshot [--sizes 10k 100k]
+"""
+import argparse
+import io
+import statistics
+
+from benchmarks.generator import generate_actions, generate_evaluations, generate_register, parse_size
+from benchmarks.micro import Upload, timed
+import core
+
+
+def check_round_trip(families, actions, evaluations):
+    payload = core.save_to_snapshot(families, actions, *evaluations)
+    state = core.parse_upload(io.BytesIO(payload), "snapshot")
+    assert state["families"] == families, "registre différent après relecture"
+    assert state["actions"] == actions, "actions différentes après relecture"
+    assert (state["measure_status"], state["measure_performance"]) == evaluations, "évaluations différentes"
+    # Un snapshot tronqué est refusé
+    try:
+        core.parse_upload(io.BytesIO(payload[:len(payload) // 2]), "snapshot")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("snapshot tronqué accepté")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k"], help="1k, 10k, 100k, 1M ou un entier")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'mesures':>9} {'format':<10} {'Mo':>8} {'écriture (ms)':>14} {'lecture (ms)':>13}  contenu")
+    for label in args.sizes:
+        n_measures = parse_size(label)
+        families = generate_register(n_measures)
+        actions = generate_actions(families, n_measures // 10)
+        evaluations = generate_evaluations(families)
+        # Les lectures valident et complètent le registre : chaque format relit sa propre copie
+        check_round_trip(families, actions, evaluations)
+
+        formats = {
+            "json": (lambda: core.save_to_json(families), "registre"),
+            "csv": (lambda: core.save_to_csv(families), "registre"),
+            "snapshot": (
+                lambda: core.save_to_snapshot(families, actions, *evaluations),
+                "registre, actions, évaluations"
+            )
+        }
+        for fmt, (write, content) in formats.items():
+            payload = write()
+            write_s = statistics.median(timed(write, args.repeat))
+            read_s = statistics.median(timed(lambda: core.parse_upload(Upload(payload), fmt), args.repeat))
+            print(
+                f"{n_measures:>9} {fmt:<10} {len(payload) / 1e6:>8.2f} {write_s * 1000:>14.0f} "
+                f"{read_s * 1000:>13.0f}  {content}"
+            )
+
+
+if __name__ == "__main__":
+    main()
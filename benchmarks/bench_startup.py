@@ -0,0 +1,123 @@
+"""Démarrage à froid : temps jusqu'au premier rendu et répartition des imports
+
+Chaque mesure part d'un interpréteur neuf (aucun module en cache) :
+
+- premier rendu : import de Streamlit, puis premier ``AppTest.run()`` de
+  ``carto.py`` (imports de l'application et vue par défaut), rerun suivant,
+  puis première ouverture de chaque vue ; indique aussi si pandas et
+  plotly ont été importés au premier rendu ;
+- imports : ``python -X importtime`` sur l'import de ``carto.py`` et de
+  ``cli.py``, temps propre cumulé par paquet racine.
+
+``--max-first-render-ms`` fait échouer la commande au-delà d'un seuil
+(régression du démarrage).
+
+    python -m benchmarks.bench_startup [--repeat 3] [--top 15] [--max-first-render-ms 1500]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Modules dont l'import est différé jusqu'à la vue qui en a besoin
+DEFERRED_MODULES = ("pandas", "plotly.graph_objects")
+
+FIRST_RENDER_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.run()
+first = time.perf_counter()
+loaded = {{name: name in sys.modules for name in {deferred!r}}}
+at.run()
+rerun = time.perf_counter()
+views = {{}}
+for view in at.radio(key="active_view").options[1:]:
+    view_start = time.perf_counter()
+    at.radio(key="active_view").set_value(view).run()
+    views[view] = time.perf_counter() - view_start
+print(json.dumps({{
+    "streamlit_import_s": imported - start,
+    "first_render_s": first - imported,
+    "rerun_s": rerun - first,
+    "views_s": views,
+    "loaded_at_first_render": loaded,
+    "errors": [str(e.value) for e in at.exception]
+}}))
+"""
+
+IMPORT_SCRIPTS = {
+    "carto.py": "import logging; logging.disable(logging.WARNING); import carto",
+    "cli.py": "import cli"
+}
+
+
+def run_python(*args):
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+
+def first_render():
+    script = FIRST_RENDER_SCRIPT.format(app=str(ROOT / "carto.py"), deferred=DEFERRED_MODULES)
+    output = run_python("-c", script).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_breakdown(statement):
+    """(total en s, Counter paquet racine -> temps propre en s) d'après -X importtime"""
+    stderr = run_python("-X", "importtime", "-c", statement).stderr
+    by_package = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        by_package[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return sum(by_package.values()), by_package
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="paquets affichés par import")
+    parser.add_argument("--max-first-render-ms", type=float, help="seuil de régression du premier rendu")
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    runs = [first_render() for _ in range(args.repeat)]
+    for run in runs:
+        if run["errors"]:
+            raise SystemExit(f"erreur au rendu : {run['errors'][0]}")
+    first_ms = statistics.median(run["first_render_s"] for run in runs) * 1000
+    print(f"{'étape':<48} {'médiane (ms)':>13}")
+    print(f"{'import de Streamlit':<48} {statistics.median(r['streamlit_import_s'] for r in runs) * 1000:>13.0f}")
+    print(f"{'premier rendu (imports de l application + vue)':<48} {first_ms:>13.0f}")
+    print(f"{'rerun suivant':<48} {statistics.median(r['rerun_s'] for r in runs) * 1000:>13.0f}")
+    for view in runs[0]["views_s"]:
+        view_ms = statistics.median(r["views_s"][view] for r in runs) * 1000
+        print(f"{'première ouverture : ' + view:<48} {view_ms:>13.0f}")
+    for name, loaded in runs[0]["loaded_at_first_render"].items():
+        print(f"{name} importé au premier rendu : {'oui' if loaded else 'non'}")
+
+    breakdowns = {}
+    for label, statement in IMPORT_SCRIPTS.items():
+        total, by_package = import_breakdown(statement)
+        breakdowns[label] = {"total_s": total, "packages_s": dict(by_package.most_common())}
+        print(f"\nimport {label} : {total * 1000:.0f} ms")
+        for package, seconds in by_package.most_common(args.top):
+            print(f"  {package:<40} {seconds * 1000:>8.1f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"runs": runs, "imports": breakdowns}, ensure_ascii=False, indent=2))
+    if args.max_first_render_ms is not None and first_ms > args.max_first_render_ms:
+        raise SystemExit(f"premier rendu {first_ms:.0f} ms > seuil {args.max_first_render_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
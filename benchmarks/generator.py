@@ -0,0 +1,118 @@
+"""Générateur reproductible de registres synthétiques
+
+Les registres ont le format de l'application : familles, risques rattachés à
+un sous-ensemble aléatoire de ``PROCESSES``, mesures ``{"id", "text"}`` de
+tous les types de ``MEASURE_TYPES``. Le même germe donne toujours le même
+registre (identifiants compris), ainsi que les mêmes actions et évaluations.
+"""
+import random
+from datetime import date, timedelta
+
+import core
+from core import ACTION_PRIORITY, ACTION_STATUS, MEASURE_STATUS, PROCESSES
+
+# Codes des types de mesure, dans l'ordre de core.MEASURE_TYPES
+MEASURE_TYPES = list(core.MEASURE_TYPES)
+
+WORDS = (
+    "contrôle accès sécurité fraude paiement fournisseur délai stock inventaire "
+    "qualité conformité réglementaire données personnelles sauvegarde chiffrement "
+    "audit procédure validation double signature formation sensibilisation "
+    "incendie évacuation assurance contrat litige prestataire sous-traitance "
+    "trésorerie rapprochement bancaire écart facturation relance client "
+    "livraison transport entrepôt réception rupture prévision achat négociation"
+).split()
+
+# Tailles de référence, en nombre de mesures
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+
+# Date de référence des échéances : fixe pour que les résultats soient comparables
+REFERENCE_DATE = date(2026, 1, 1)
+
+
+def parse_size(label):
+    """« 10k » -> 10000 (accepte aussi un entier)"""
+    if label in SIZES:
+        return SIZES[label]
+    return int(label)
+
+
+def generate_register(n_measures, seed=0, n_families=None, sentences=False):
+    """Registre d'environ 5 mesures par risque, totalisant exactement ``n_measures`` mesures
+
+    Avec ``sentences=True``, noms, descriptions et mesures sont des phrases
+    tirées d'un vocabulaire français (utile pour la recherche plein texte).
+    """
+    rng = random.Random(seed)
+    n_families = n_families or max(1, min(200, n_measures // 500))
+
+    def sentence(n_words):
+        return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+    families = {
+        f"F{f:03d}": {"name": f"Famille {f}", "risks": {}}
+        for f in range(n_families)
+    }
+    family_keys = list(families)
+    count = 0
+    r = 0
+    while count < n_measures:
+        family_key = rng.choice(family_keys)
+        name = f"{sentence(3)} {r}" if sentences else f"Risque {r}"
+        measures = {}
+        for measure_type in MEASURE_TYPES:
+            n = min(rng.randint(0, 2), n_measures - count)
+            measures[measure_type] = [
+                {
+                    "id": f"{rng.getrandbits(48):012x}",
+                    "text": sentence(8) if sentences else f"Mesure {measure_type} {r}-{i}"
+                }
+                for i in range(n)
+            ]
+            count += n
+        families[family_key]["risks"][f"{family_key} - {name}"] = {
+            "description": sentence(12) if sentences else f"Description du risque {r}",
+            "processes": rng.sample(PROCESSES, rng.randint(1, 4)),
+            "measures": measures
+        }
+        r += 1
+    return families
+
+
+def iter_measures(families):
+    """Itère sur (famille, risque, type, mesure)"""
+    for family_key, family_data in families.items():
+        for risk_key, risk_data in family_data["risks"].items():
+            for measure_type, measures in risk_data["measures"].items():
+                for measure in measures:
+                    yield family_key, risk_key, measure_type, measure
+
+
+def generate_actions(families, n_actions, seed=0, reference=REFERENCE_DATE):
+    """Actions rattachées à des mesures tirées au hasard, échéances à ±180 jours"""
+    rng = random.Random(seed)
+    measure_ids = [measure["id"] for *_, measure in iter_measures(families)]
+    actions = {}
+    for a in range(n_actions if measure_ids else 0):
+        actions[f"action_{rng.getrandbits(48):012x}"] = {
+            "measure_id": rng.choice(measure_ids),
+            "description": f"Action corrective {a}",
+            "responsable": f"Responsable {rng.randrange(50)}",
+            "deadline": reference + timedelta(days=rng.randint(-180, 180)),
+            "statut": rng.choice(ACTION_STATUS),
+            "priorite": rng.choice(ACTION_PRIORITY),
+            "commentaire": ""
+        }
+    return actions
+
+
+def generate_evaluations(families, fraction=0.5, seed=0):
+    """Statuts et évaluations d'une fraction des mesures : (measure_status, measure_performance)"""
+    rng = random.Random(seed)
+    measure_status = {}
+    measure_performance = {}
+    for *_, measure in iter_measures(families):
+        if rng.random() < fraction:
+            measure_status[measure["id"]] = rng.choice(MEASURE_STATUS[1:])
+            measure_performance[measure["id"]] = f"{rng.randint(0, 100)} %"
+    return measure_status, measure_performance
@@ -0,0 +1,115 @@
+"""Latence d'un rerun complet de l'application, par vue et par mode d'affichage
+
+Mesure, avec ``streamlit.testing.v1.AppTest``, le temps d'un rerun pour
+chaque vue (et chaque mode de la vue « Mesures & Actions ») sur un registre
+synthétique avec actions et évaluations. Si une révision git est donnée,
+la même mesure est faite sur cette révision (qui peut exécuter tous les
+onglets à la fois).
+
+    python -m benchmarks.harness [--baseline REV] [--size 10k] [--repeat 3] [--output res.json]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.generator import (
+    MEASURE_TYPES, generate_actions, generate_evaluations, generate_register, parse_size
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from action_store import ActionStore  # noqa: E402
+from risk_store import RiskStore  # noqa: E402
+
+MEASURES_VIEW = "🔍 Mesures & Actions"
+
+
+def make_app(app_dir, families, actions, evaluations):
+    at = AppTest.from_file(str(app_dir / "carto.py"), default_timeout=600)
+    # Les anciennes révisions lisent risk_families, les récentes risk_store
+    at.session_state["risk_families"] = families
+    at.session_state["risk_store"] = RiskStore(families, MEASURE_TYPES)
+    at.session_state["action_store"] = ActionStore(actions)
+    at.session_state["measure_status"], at.session_state["measure_performance"] = evaluations
+    return at
+
+
+def time_rerun(at, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_tree(app_dir, families, actions, evaluations, repeat):
+    at = make_app(app_dir, families, actions, evaluations)
+    at.run()
+    try:
+        views = at.radio(key="active_view").options
+    except KeyError:
+        return {"toutes les vues (onglets)": time_rerun(at, repeat)}
+    results = {}
+    for view in views:
+        at.radio(key="active_view").set_value(view)
+        at.run()
+        if view != MEASURES_VIEW:
+            results[view] = time_rerun(at, repeat)
+            continue
+        try:
+            modes = at.radio(key="measures_view_mode").options
+        except KeyError:
+            results[view] = time_rerun(at, repeat)
+            continue
+        for mode in modes:
+            at.radio(key="measures_view_mode").set_value(mode)
+            at.run()
+            results[f"{view} / {mode}"] = time_rerun(at, repeat)
+    return results
+
+
+def export_revision(rev, target):
+    archive = subprocess.run(["git", "-C", str(ROOT), "archive", rev], check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", str(target)], input=archive, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", help="révision git à comparer (ex. HEAD~1)")
+    parser.add_argument("--size", default="10k", help="nombre de mesures : 1k, 10k, 100k, 1M ou un entier")
+    parser.add_argument("--actions", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    n_measures = parse_size(args.size)
+    families = generate_register(n_measures)
+    actions = generate_actions(families, args.actions)
+    evaluations = generate_evaluations(families)
+    n_risks = sum(len(f["risks"]) for f in families.values())
+    print(f"registre : {n_risks} risques, {n_measures} mesures, {len(actions)} actions")
+
+    trees = [("courant", ROOT)]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.baseline:
+            export_revision(args.baseline, Path(tmp))
+            trees.insert(0, (args.baseline, Path(tmp)))
+        for label, app_dir in trees:
+            for view, seconds in bench_tree(app_dir, families, actions, evaluations, args.repeat).items():
+                print(f"{label:<10} {view:<55} {seconds * 1000:>9.0f} ms")
+                results.append({"tree": label, "view": view, "measures": n_measures, "seconds": seconds})
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
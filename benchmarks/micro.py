@@ -0,0 +1,179 @@
+"""Microbenchmarks des fonctions de données de carto.py, avec sortie JSON
+
+``carto`` est importé en mode « bare » de Streamlit : les éléments
+d'interface sont ignorés, ``st.session_state`` fonctionne en mémoire et les
+fonctions s'appellent directement. Chaque fonction est chronométrée sur des
+registres synthétiques (voir ``generator``) ; le fichier JSON produit peut
+être comparé à celui d'un autre commit avec ``--compare``.
+
+    python -m benchmarks.micro [--sizes 1k 10k 100k 1M] [--output res.json] [--compare ancien.json]
+"""
+import argparse
+import io
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.generator import PROCESSES, generate_register, parse_size
+import core
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+class Upload(io.BytesIO):
+    """Équivalent minimal de l'objet renvoyé par st.file_uploader"""
+
+    def __init__(self, payload):
+        super().__init__(payload)
+        self.size = len(payload)
+
+
+def import_app():
+    """Importe carto.py sans serveur Streamlit"""
+    # Le mode « bare » signale chaque appel d'interface sans contexte de script
+    # (Streamlit réinitialise le niveau de ses loggers en lisant sa configuration)
+    logging.disable(logging.WARNING)
+    import carto
+    return carto
+
+
+def timed(func, repeat, setup=None):
+    """Durées (s) de ``repeat`` appels ; ``setup`` est exécuté hors chronométrage"""
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "-C", str(ROOT), "rev-parse", "--short", "HEAD"],
+            check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_size(carto, n_measures, repeat):
+    """Chronomètre chaque fonction sur un registre de ``n_measures`` mesures"""
+    state = carto.st.session_state
+    families = generate_register(n_measures)
+    n_risks = sum(len(f["risks"]) for f in families.values())
+    state.risk_store.load(families)
+    carto.bump_data_version()
+
+    json_payload = core.save_to_json(families)
+    csv_payload = core.save_to_csv(families)
+
+    # Le CSV n'a qu'une ligne par mesure : les risques sans mesure n'y figurent pas
+    n_risks_with_measures = sum(
+        1 for f in families.values() for r in f["risks"].values() if any(r["measures"].values())
+    )
+
+    def check_loaded(expected):
+        # Les erreurs d'import sont affichées par st.error, qui ne fait rien ici
+        loaded = sum(len(f["risks"]) for f in state.risk_store.families.values())
+        if loaded != expected:
+            raise RuntimeError(f"import incomplet : {loaded} risques sur {expected}")
+
+    def load_json():
+        carto.load_from_json(Upload(json_payload))
+        check_loaded(n_risks)
+
+    def load_csv():
+        carto.load_from_csv(Upload(csv_payload))
+        check_loaded(n_risks_with_measures)
+
+    def coverage_all_processes():
+        for process in PROCESSES:
+            carto.get_process_coverage_stats(process)
+
+    benchmarks = {
+        "save_to_json": (lambda: core.save_to_json(state.risk_store.families), None),
+        "save_to_csv": (lambda: core.save_to_csv(state.risk_store.families), None),
+        "load_from_json": (load_json, None),
+        "load_from_csv": (load_csv, None),
+        # Cache invalidé avant chaque appel : coût de construction du DataFrame
+        "get_all_measures": (carto.get_all_measures, carto.bump_data_version),
+        # Données inchangées : coût d'un rerun
+        "get_all_measures (cache)": (carto.get_all_measures, None),
+        "get_process_coverage_stats (30 processus)": (coverage_all_processes, None),
+    }
+    results = []
+    for name, (func, setup) in benchmarks.items():
+        durations = timed(func, repeat, setup)
+        results.append({
+            "benchmark": name,
+            "measures": n_measures,
+            "risks": n_risks,
+            "repeat": repeat,
+            "min_s": min(durations),
+            "median_s": statistics.median(durations)
+        })
+    results.append({"benchmark": "taille JSON (octets)", "measures": n_measures, "value": len(json_payload)})
+    results.append({"benchmark": "taille CSV (octets)", "measures": n_measures, "value": len(csv_payload)})
+    return results
+
+
+def print_results(results, previous=None):
+    reference = {}
+    for record in (previous or {}).get("results", []):
+        reference[(record["benchmark"], record["measures"])] = record
+    print(f"{'fonction':<44} {'mesures':>9} {'min (ms)':>10} {'médiane (ms)':>13} {'écart':>8}")
+    for record in results:
+        if "value" in record:
+            print(f"{record['benchmark']:<44} {record['measures']:>9} {record['value']:>10}")
+            continue
+        ratio = ""
+        old = reference.get((record["benchmark"], record["measures"]))
+        if old and old.get("median_s"):
+            ratio = f"{record['median_s'] / old['median_s']:.2f}x"
+        print(
+            f"{record['benchmark']:<44} {record['measures']:>9} {record['min_s'] * 1000:>10.1f} "
+            f"{record['median_s'] * 1000:>13.1f} {ratio:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=["1k", "10k", "100k"], help="1k, 10k, 100k, 1M ou un entier")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    parser.add_argument("--compare", help="résultats JSON d'un autre commit")
+    args = parser.parse_args()
+
+    carto = import_app()
+    results = []
+    for label in args.sizes:
+        n_measures = parse_size(label)
+        # Une seule mesure au-delà de 100k : l'ordre de grandeur suffit
+        repeat = args.repeat if n_measures <= 100_000 else 1
+        results.extend(bench_size(carto, n_measures, repeat))
+
+    report = {
+        "commit": git_revision(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    previous = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_results(results, previous)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime
-import json
-import base64
-import plotly.graph_objects as go
-from collections import defaultdict
+from datetime import datetime, timedelta
+import hashlib
+import io
+import os
+import re
+import numpy as np
+from collections import defaultdict, deque
+import profiling
+from jobs import DONE, ERROR, QUEUED, JobLimitError, JobPool
+from shared_register import SessionRegister, SharedRegister
+from action_store import ActionStore
+from core import (
+    ACTION_PRIORITY, ACTION_STATUS, EXPORT_FORMATS, FILE_UNITS, MEASURE_STATUS, MEASURE_TYPES,
+    PROCESS_BITS, PROCESSES, SNAPSHOT_SUFFIX, Workspace, build_measures_report, detect_file_type,
+    merge_summary_text, open_backend, parse_upload
+)
 
 # Configuration de la page
 st.set_page_config(
@@ -13,212 +23,74 @@ st.set_page_config(
     initial_sidebar_state="collapsed",
     menu_items=None
 )
+profile = profiling.start_rerun()
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+@st.cache_resource
+def stylesheet():
+    """Feuille de style (carto.css), lue et compactée une fois par processus serveur"""
+    with open(os.path.join(APP_DIR, "carto.css"), encoding="utf-8") as f:
+        css = f.read()
+    # Sans commentaires ni indentation : elle est renvoyée au navigateur à chaque rerun
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    return "<style>" + re.sub(r"\s*\n\s*", "", css) + "</style>"
 
-st.markdown("""
-   <style>
-   /* Cacher la barre Streamlit */
-   #MainMenu {visibility: hidden;}
-   footer {visibility: hidden;}
-   header {visibility: hidden;}
-
-   /* Style de base de la page - Plus compact */
-   .block-container {
-       padding: 0.5rem 0.5rem 5rem !important;
-       max-width: 100% !important;
-   }
-   
-   /* Réduction des espacements */
-   div[data-testid="stVerticalBlock"] > div {
-       padding: 0.2rem 0 !important;
-   }
-
-   /* Style plus austère pour les expansions */
-   .streamlit-expanderHeader {
-       font-size: 0.9rem !important;
-       padding: 0.3rem !important;
-       background: #fafafa !important;
-       border: none !important;
-   }
-
-   /* Style de l'uploader plus compact */
-   [data-testid="stFileUploader"] {
-       background-color: transparent !important;
-       border: 1px solid #eee !important;
-       padding: 0.2rem 0.3rem !important;
-       border-radius: 3px !important;
-       min-height: unset !important;
-   }
-   
-   [data-testid="stFileUploader"]:hover {
-       border-color: #ddd !important;
-   }
-
-   /* Masquer texte drag and drop */
-   [data-testid="stFileUploader"] div {
-       display: none !important;
-   }
-
-   /* Garder icône et bouton browse */
-   [data-testid="stFileUploader"] section {
-       display: flex;
-       gap: 0.3rem;
-       align-items: center;
-   }
-   
-   /* Style compact des boutons de téléchargement */
-   .download-link {
-       text-decoration: none !important;
-       color: #666 !important;
-       font-size: 13px !important;
-       border: 1px solid #eee !important;
-       padding: 0.2rem 0.4rem !important;
-       border-radius: 3px !important;
-   }
-
-   .download-link:hover {
-       border-color: #ddd !important;
-   }
-
-   .download-container {
-       display: flex;
-       gap: 0.3rem;
-       align-items: center;
-       padding-top: 0.1rem;
-   }
-
-   /* Réduction des marges titres */
-   h3 {
-       margin: 0 !important;
-       padding: 0 !important;
-       font-size: 1rem !important;
-   }
-
-   /* Style compact des onglets */
-   .stTabs [data-baseweb="tab-list"] {
-       gap: 1rem;
-       margin-top: 0.5rem;
-   }
-
-   .stTabs [data-baseweb="tab"] {
-       padding: 0.2rem 0.5rem !important;
-       font-size: 0.9rem !important;
-   }
-
-   /* Style minimaliste du bouton d'ajout */
-   [data-testid="baseButton-secondary"] {
-       background: transparent !important;
-       border: none !important;
-       color: #666 !important;
-       font-size: 14px !important;
-       padding: 0 !important;
-       margin: 0 !important;
-   }
-
-   /* Réduction taille des inputs */
-   .stTextInput input, .stTextArea textarea {
-       padding: 0.3rem !important;
-       font-size: 0.9rem !important;
-   }
-   
-   /* Style compact des checkboxes */
-   .stCheckbox {
-       padding: 0.1rem !important;
-       margin: 0 !important;
-   }
-   .stCheckbox label {
-       font-size: 0.85rem !important;
-   }
-   
-   /* Réduction marges boutons */
-   .stButton {
-       margin: 0.1rem 0 !important;
-   }
-   .stButton button {
-       padding: 0.2rem 0.5rem !important;
-       font-size: 0.85rem !important;
-   }
-   
-   /* Style compact select boxes */
-   .stSelectbox {
-       margin: 0.1rem 0 !important;
-   }
-   .stSelectbox > div > div {
-       padding: 0.2rem !important;
-   }
-   
-   /* Réduction marges colonnes */
-   .row-widget {
-       margin: 0.1rem 0 !important;
-   }
-
-   /* Métriques compactes */
-   .metric-container {
-       padding: 0.3rem;
-       border-radius: 0.25rem;
-       background-color: #f8f9fa;
-       margin: 0.2rem 0;
-   }
-   .metric-value {
-       font-size: 1.1rem;
-       font-weight: bold;
-   }
-   .metric-label {
-       font-size: 0.75rem;
-       color: #6c757d;
-   }
-   </style>
-""", unsafe_allow_html=True)
+# Balises <style> seules : st.html les place hors de la mise en page
+st.html(stylesheet())
+profiling.mark("css")
 
 # Initialisation session state
-if 'risk_families' not in st.session_state:
-    st.session_state.risk_families = {}
-if 'actions' not in st.session_state:
-    st.session_state.actions = {}
+if 'action_store' not in st.session_state:
+    st.session_state.action_store = ActionStore()
 if 'measure_status' not in st.session_state:
     st.session_state.measure_status = {}
 if 'measure_performance' not in st.session_state:
     st.session_state.measure_performance = {}
+if 'data_version' not in st.session_state:
+    st.session_state.data_version = 0
+if 'export_cache' not in st.session_state:
+    st.session_state.export_cache = {}
+if 'frame_cache' not in st.session_state:
+    st.session_state.frame_cache = {}
+if 'upload_imports' not in st.session_state:
+    # empreinte du contenu -> état de l'import
+    st.session_state.upload_imports = {}
+    st.session_state.upload_digests = {}
+if 'notifications' not in st.session_state:
+    st.session_state.notifications = []
+if 'jobs_owner' not in st.session_state:
+    # Identifiant de la session auprès du pool de tâches partagé
+    st.session_state.jobs_owner = os.urandom(4).hex()
 
 # Constantes
-PROCESSES = [
-    "DIRECTION", "INTERNATIONAL", "PERFORMANCE", "DEVELOPPEMENT_NATIONAL",
-    "DEVELOPPEMENT_INTERNATIONAL", "RSE", "GESTION_RISQUES", "FUSAC",
-    "INNOV_TRANSFO", "VENTE", "MAGASIN", "LOGISTIQUE", "APPROVISONNEMENT",
-    "ACHATS", "SAV", "IMPORT", "FINANCEMENT", "AUTRES_MODES_VENTE",
-    "VALO_DECHETS", "QUALITE", "VENTE WEB", "FRANCHISE", "COMPTABILITE",
-    "DSI", "RH", "MARKETING", "ORGANISATION", "TECHNIQUE", "JURIDIQUE", "SECURITE"
-]
-
-MEASURE_TYPES = {
-    "D": "Détection",
-    "R": "Réduction",
-    "A": "Acceptation",
-    "F": "Refus",
-    "T": "Transfert"
+MEASURE_SORT_COLUMNS = {
+    "Famille / risque": ["famille", "risque"],
+    "Type": ["type", "famille", "risque"],
+    "Statut": ["statut", "famille", "risque"],
+    "Mesure": ["mesure"]
 }
 
-MEASURE_STATUS = [
-    "Non évalué",
-    "Efficace",
-    "Partiellement efficace",
-    "Insuffisant",
-    "Critique"
-]
-
-ACTION_STATUS = [
-    "À faire",
-    "En cours",
-    "En attente",
-    "Terminé",
-    "Annulé"
-]
-
-ACTION_PRIORITY = [
-    "BASSE",
-    "NORMALE",
-    "HAUTE",
-    "CRITIQUE"
-]
+MEASURE_PAGE_SIZES = [25, 50, 100, 200]
+# Affiché dans la grille des mesures à la place d'une évaluation absente (jamais enregistré)
+NO_EVALUATION = "N/A"
+
+# Fenêtres d'échéance (premier jour, dernier jour) relatives à aujourd'hui ; None = ouvert
+ACTION_DEADLINE_WINDOWS = {
+    "Toutes": None,
+    "En retard": (None, -1),
+    "À échéance": (0, 0),
+    "7 prochains jours": (0, 7),
+    "30 prochains jours": (0, 30)
+}
+
+# Au-delà de cette taille, un fichier importé est lu en arrière-plan
+UPLOAD_BACKGROUND_BYTES = 5 * 1024 * 1024
+# Tâches d'arrière-plan : threads du serveur et tâches actives par session
+JOB_WORKERS = 3
+JOB_PER_SESSION = 2
+# Au-delà de ce nombre de risques, les exports sont générés en arrière-plan
+EXPORT_BACKGROUND_RISKS = 20_000
 
 # Couleurs pour les différents statuts
 STATUS_COLORS = {
@@ -238,264 +110,514 @@ STATUS_COLORS = {
     "CRITIQUE": "#dc3545"
 }
 
+# Registre canonique partagé par les sessions ; chaque session n'en garde que ses modifications
+@st.cache_resource
+def get_shared_register():
+    """Registre partagé unique par processus serveur"""
+    return SharedRegister(MEASURE_TYPES)
+
+if 'risk_store' not in st.session_state:
+    st.session_state.risk_store = SessionRegister(get_shared_register())
+
+# Stockage SQLite optionnel, partagé par toutes les sessions du serveur
+SQLITE_PATH = os.environ.get("CARTO_SQLITE_PATH")
+# Sinon, journal d'opérations optionnel (répertoire du journal et de ses snapshots)
+JOURNAL_DIR = os.environ.get("CARTO_JOURNAL_DIR")
+
+
+# Fonctions de persistance
+@st.cache_resource
+def get_sqlite_backend(path):
+    """Connexion SQLite unique par processus serveur"""
+    return open_backend(sqlite_path=path)
+
+@st.cache_resource
+def get_journal(directory):
+    """Journal unique par processus serveur"""
+    return open_backend(journal_dir=directory)
+
+def get_backend():
+    """Retourne le stockage persistant activé (SQLite, sinon journal), ou None"""
+    if SQLITE_PATH:
+        return get_sqlite_backend(SQLITE_PATH)
+    return get_journal(JOURNAL_DIR) if JOURNAL_DIR else None
+
+def workspace():
+    """Espace de travail de la session : état de st.session_state et stockage du serveur"""
+    return Workspace(st.session_state, get_backend())
+
+def session_register():
+    """Registre de la session s'il suit le registre partagé (None pour un RiskStore autonome)"""
+    store = st.session_state.risk_store
+    return store if isinstance(store, SessionRegister) else None
+
+def sync_shared_register():
+    """Suit les versions publiées par les autres sessions"""
+    register = session_register()
+    if register is not None and register.refresh():
+        bump_data_version()
+
+@profiling.timed
+def sync_from_backend():
+    """Recharge l'état de la session si le stockage a changé depuis le dernier chargement"""
+    workspace().sync()
 
 # Fonctions de gestion des fichiers
-def save_to_json():
-    """Exporte les données en JSON"""
-    json_str = json.dumps(st.session_state.risk_families, ensure_ascii=False, indent=2)
-    b64 = base64.b64encode(json_str.encode()).decode()
-    current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"risk_data_{current_time}.json"
-    return f'<a class="download-link" href="data:file/json;base64,{b64}" download="{filename}">⬇️ JSON</a>'
-
-def save_to_csv():
-    """Exporte les données en CSV"""
-    rows = []
-    for family_key, family_data in st.session_state.risk_families.items():
-        for risk_key, risk_data in family_data["risks"].items():
-            for measure_type, measures in risk_data["measures"].items():
-                for measure in measures:
-                    rows.append({
-                        "family": family_key,
-                        "family_name": family_data["name"],
-                        "risk_name": risk_key.split(" - ")[1],
-                        "description": risk_data["description"],
-                        "processes": "|".join(risk_data["processes"]),
-                        "measure_type": measure_type,
-                        "measure": measure
-                    })
-    
-    if rows:
-        df = pd.DataFrame(rows)
-        csv = df.to_csv(index=False)
-        b64 = base64.b64encode(csv.encode()).decode()
-        current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"risk_data_{current_time}.csv"
-        return f'<a class="download-link" href="data:file/csv;base64,{b64}" download="{filename}">⬇️ CSV</a>'
-    return ""
+def bump_data_version():
+    """Signale une modification du registre (invalide les exports en cache)"""
+    st.session_state.data_version += 1
 
-def load_from_json(uploaded_file):
-    """Charge les données depuis un fichier JSON"""
+def export_builder(fmt, serializer, *sources):
+    """Prépare la génération différée d'un export, mémorisée par version des données
+
+    ``serializer`` reçoit ``sources`` (par défaut le registre seul).
+    """
+    # Le callable est exécuté hors du thread du script : on capture les références ici
+    sources = sources or (st.session_state.risk_store.families,)
+    version = st.session_state.data_version
+    cache = st.session_state.export_cache
+
+    def build():
+        cached = cache.get(fmt)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        payload = serializer(*sources)
+        cache[fmt] = (version, payload)
+        return payload
+    return build
+
+def frozen_families():
+    """Registre de la session figé, lisible par une tâche pendant que la session continue"""
+    register = session_register()
+    if register is None:
+        return st.session_state.risk_store.families
+    return register.freeze().families
+
+def start_export(fmt, file_name):
+    """Lance la génération d'un export en arrière-plan (résultat dans le panneau des tâches)"""
+    serializer, mime, _ = EXPORT_FORMATS[fmt]
+    sources = (frozen_families(),)
+    if fmt == "snapshot":
+        # Copies superficielles : les actions et évaluations restent modifiables par la session
+        sources += (
+            {action_id: dict(action) for action_id, action in st.session_state.action_store.actions.items()},
+            dict(st.session_state.measure_status),
+            dict(st.session_state.measure_performance)
+        )
+    submit_job("export", f"Export {fmt.upper()}", run_export, serializer, file_name, mime, *sources, unit=FILE_UNITS[fmt])
+
+def export_button(label, fmt, file_name, *sources, help_text=None, disabled=False):
+    """Téléchargement généré au clic, ou tâche d'arrière-plan au-delà de EXPORT_BACKGROUND_RISKS"""
+    serializer, mime, _ = EXPORT_FORMATS[fmt]
+    risk_count = sum(len(family_data["risks"]) for family_data in st.session_state.risk_store.families.values())
+    if risk_count < EXPORT_BACKGROUND_RISKS:
+        st.download_button(
+            label,
+            data=export_builder(fmt, serializer, *sources),
+            file_name=file_name,
+            mime=mime,
+            on_click="ignore",
+            help=help_text,
+            disabled=disabled
+        )
+    else:
+        st.button(
+            label,
+            key=f"export_{fmt}",
+            on_click=start_export,
+            args=(fmt, file_name),
+            help=f"{help_text or label} : généré en arrière-plan, à télécharger dans le panneau des tâches",
+            disabled=disabled
+        )
+
+def upload_type(uploaded_file):
+    """Format d'un fichier importé : json, csv ou snapshot"""
+    return detect_file_type(uploaded_file.name, uploaded_file.type)
+
+def apply_import(state, merge=False):
+    """Remplace l'état de la session par un état importé, ou le fusionne avec le registre ; retourne le message à afficher"""
+    if merge:
+        return f"Fusion terminée — {merge_summary_text(workspace().merge_state(state))}"
+    workspace().import_state(state)
+    return "Données chargées avec succès !"
+
+@profiling.timed
+def load_upload(uploaded_file, file_type, merge=False):
+    """Charge un fichier importé (JSON, CSV ou snapshot) en affichant la progression"""
     try:
-        content = uploaded_file.getvalue().decode()
-        data = json.loads(content)
-        st.session_state.risk_families = data
-        st.success("Données chargées avec succès !")
+        label = f"Import {file_type.upper()}"
+        progress_bar = st.progress(0.0, text=f"{label}...")
+
+        def report(count):
+            fraction = min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0)
+            progress_bar.progress(fraction, text=f"{label} : {count:,} {FILE_UNITS[file_type]}")
+
+        uploaded_file.seek(0)
+        state = parse_upload(uploaded_file, file_type, progress=report)
+        progress_bar.empty()
+        st.session_state.notifications.append({"message": apply_import(state, merge)})
         st.rerun()
     except Exception as e:
         st.error(f"Erreur lors du chargement : {str(e)}")
 
+def load_from_json(uploaded_file):
+    """Charge les données depuis un fichier JSON"""
+    load_upload(uploaded_file, "json")
+
 def load_from_csv(uploaded_file):
     """Charge les données depuis un fichier CSV"""
+    load_upload(uploaded_file, "csv")
+
+# Tâches d'arrière-plan (imports, exports, rapports) : pool partagé par les sessions du serveur
+@st.cache_resource
+def get_job_pool():
+    """Pool de tâches unique par processus serveur (voir jobs.JobPool)"""
+    return JobPool(max_workers=JOB_WORKERS, max_per_owner=JOB_PER_SESSION)
+
+def submit_job(kind, label, func, *args, unit=""):
+    """Soumet ``func(job, *args)`` pour la session ; None (et un message) si sa limite est atteinte"""
     try:
-        df = pd.read_csv(uploaded_file)
-        new_data = {}
-        
-        # Conversion du CSV en structure de données
-        for _, row in df.iterrows():
-            family_key = row["family"]
-            if family_key not in new_data:
-                new_data[family_key] = {
-                    "name": row["family_name"],
-                    "risks": {}
-                }
-            
-            risk_key = f"{family_key} - {row['risk_name']}"
-            if risk_key not in new_data[family_key]["risks"]:
-                new_data[family_key]["risks"][risk_key] = {
-                    "description": row["description"],
-                    "processes": row["processes"].split("|"),
-                    "measures": {k: [] for k in MEASURE_TYPES}
-                }
-            
-            new_data[family_key]["risks"][risk_key]["measures"][row["measure_type"]].append(row["measure"])
-        
-        st.session_state.risk_families = new_data
-        st.success("Données chargées avec succès !")
-        st.rerun()
+        return get_job_pool().submit(st.session_state.jobs_owner, kind, label, func, *args, unit=unit)
+    except JobLimitError as e:
+        st.session_state.notifications.append({"message": f"⏳ {e}"})
+        return None
+
+def session_jobs():
+    """Tâches de la session, dans l'ordre de soumission"""
+    return get_job_pool().jobs_for(st.session_state.jobs_owner)
+
+def run_export(job, serializer, file_name, mime, *sources):
+    """Génère un export ou un rapport hors du thread du script"""
+    return {"data": serializer(*sources, progress=job.progress), "file_name": file_name, "mime": mime}
+
+# Imports dédoublonnés : st.file_uploader renvoie le même fichier à chaque rerun,
+# chaque contenu n'est donc lu qu'une fois (clé : empreinte SHA-256)
+def upload_digest(uploaded_file):
+    """Empreinte du contenu, calculée une seule fois par fichier téléversé"""
+    digests = st.session_state.upload_digests
+    digest = digests.get(uploaded_file.file_id)
+    if digest is None:
+        digest = digests[uploaded_file.file_id] = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+    return digest
+
+def parse_in_background(job, payload, file_type):
+    """Lecture hors du thread du script ; la progression est publiée dans ``job``"""
+    def report(count):
+        job.progress(source.tell() / max(len(payload), 1), count)
+
+    source = io.BytesIO(payload)
+    return parse_upload(source, file_type, progress=report)
+
+def finish_import(job):
+    """Applique dans la session le résultat d'un import terminé en arrière-plan"""
+    entry = next(
+        (entry for entry in st.session_state.upload_imports.values() if entry.get("job_id") == job.id),
+        {}
+    )
+    try:
+        if job.status == DONE:
+            message = apply_import(job.result, entry.get("merge", False))
+            entry["status"] = "done"
+            st.session_state.notifications.append({"message": message})
+        elif job.status == ERROR:
+            entry["status"] = "error"
+            entry["message"] = f"Erreur lors du chargement : {job.error}"
+        else:
+            entry["status"] = "cancelled"
+            st.session_state.notifications.append({"message": "Import annulé"})
     except Exception as e:
-        st.error(f"Erreur lors du chargement : {str(e)}")
+        # Import lu mais refusé à l'application (écriture du stockage, fusion…)
+        entry["status"] = "error"
+        entry["message"] = f"Erreur lors du chargement : {e}"
+    finally:
+        # Sinon chaque rerun rappliquerait la tâche terminée
+        get_job_pool().forget(job.id)
+
+def render_job(job):
+    """Ligne du panneau des tâches : progression et annulation, ou résultat"""
+    pool = get_job_pool()
+    text_col, action_col = st.columns([4, 1])
+    with text_col:
+        if job.status == QUEUED:
+            st.progress(0.0, text=f"{job.label} : en attente d'un thread libre")
+        elif job.active:
+            detail = f" : {job.count:,} {job.unit}" if job.count else "..."
+            st.progress(job.fraction or 0.0, text=f"{job.label}{detail}")
+        elif job.status == DONE:
+            st.caption(f"✅ {job.label} : {len(job.result['data']) / 1e6:.1f} Mo")
+        elif job.status == ERROR:
+            st.error(f"{job.label} : {job.error}")
+        else:
+            st.caption(f"🚫 {job.label} : annulé")
+    with action_col:
+        if job.active:
+            st.button(
+                "Annuler", key=f"job_cancel_{job.id}", on_click=job.cancel,
+                disabled=job.cancel_requested
+            )
+            return
+        if job.status == DONE:
+            st.download_button(
+                "⬇️ Télécharger",
+                data=job.result["data"],
+                file_name=job.result["file_name"],
+                mime=job.result["mime"],
+                on_click="ignore",
+                key=f"job_download_{job.id}"
+            )
+        st.button("Retirer", key=f"job_forget_{job.id}", on_click=pool.forget, args=(job.id,))
+
+@st.fragment(run_every=0.5)
+def watch_jobs():
+    """Progression des tâches actives ; rerun complet dès que l'une d'elles se termine"""
+    jobs = session_jobs()
+    for job in jobs:
+        render_job(job)
+    if sum(job.active for job in jobs) < st.session_state.jobs_active:
+        st.rerun()
+
+def render_jobs():
+    """Panneau des tâches de la session ; un import terminé est appliqué puis la page relancée"""
+    finished_imports = [job for job in session_jobs() if job.kind == "import" and not job.active]
+    for job in finished_imports:
+        finish_import(job)
+    if finished_imports:
+        # L'en-tête et les exports ont été construits avant l'import
+        st.rerun()
+    jobs = session_jobs()
+    if not jobs:
+        return
+    st.session_state.jobs_active = sum(job.active for job in jobs)
+    with st.expander(f"⚙️ Tâches en arrière-plan ({len(jobs)})", expanded=True):
+        if st.session_state.jobs_active:
+            watch_jobs()
+        else:
+            for job in jobs:
+                render_job(job)
+
+def handle_upload(uploaded_file):
+    """Importe le fichier si son contenu n'a pas encore été importé dans la session"""
+    imports = st.session_state.upload_imports
+    digest = upload_digest(uploaded_file)
+    entry = imports.get(digest)
+    if entry is None:
+        file_type = upload_type(uploaded_file)
+        merge = st.session_state.get("import_merge", False)
+        if uploaded_file.size < UPLOAD_BACKGROUND_BYTES:
+            # Marqué avant la lecture : un fichier en erreur n'est pas relu au rerun suivant
+            imports[digest] = {"type": file_type, "status": "done"}
+            load_upload(uploaded_file, file_type, merge)
+            return
+        job = submit_job(
+            "import", f"Import {file_type.upper()}", parse_in_background,
+            uploaded_file.getvalue(), file_type, unit=FILE_UNITS[file_type]
+        )
+        if job is None:
+            imports[digest] = {
+                "type": file_type,
+                "status": "error",
+                "message": "Import non lancé : retirez le fichier puis déposez-le à nouveau après la fin d'une tâche"
+            }
+        else:
+            # Progression et résultat : voir render_jobs
+            imports[digest] = {"type": file_type, "status": "running", "job_id": job.id, "merge": merge}
+    elif entry["status"] == "error":
+        st.error(entry["message"])
+
+def forget_finished_uploads():
+    """Fichier retiré de l'import : un nouveau dépôt du même contenu sera réimporté"""
+    imports = st.session_state.upload_imports
+    for digest in [d for d, entry in imports.items() if entry["status"] != "running"]:
+        del imports[digest]
+    st.session_state.upload_digests.clear()
 
-# Fonctions de gestion des données
+# Fonctions de gestion des données (voir core.Workspace)
 def add_risk_family(family_key, family_name):
     """Ajoute une nouvelle famille de risques"""
-    if family_key and family_name:
-        st.session_state.risk_families[family_key] = {
-            "name": family_name,
-            "risks": {}
-        }
+    workspace().add_family(family_key, family_name)
 
 def add_risk(family_key, risk_name, description, processes=None):
     """Ajoute un nouveau risque à une famille"""
-    if not risk_name:
-        return
-    risk_key = f"{family_key} - {risk_name}"
-    st.session_state.risk_families[family_key]["risks"][risk_key] = {
-        "description": description,
-        "processes": processes or [],
-        "measures": {k: [] for k in MEASURE_TYPES}
-    }
+    workspace().add_risk(family_key, risk_name, description, processes)
 
 def add_measure(family_key, risk_key, measure_type, measure_text):
     """Ajoute une ou plusieurs mesures à un risque"""
-    if measure_text:
-        # Sépare le texte en mesures individuelles basées sur les sauts de ligne
-        measures = [m.strip() for m in measure_text.split('\n') if m.strip()]
-        for measure in measures:
-            st.session_state.risk_families[family_key]["risks"][risk_key]["measures"][measure_type].append(measure)
+    workspace().add_measure(family_key, risk_key, measure_type, measure_text)
 
 def delete_risk(family_key, risk_key):
     """Supprime un risque"""
-    if risk_key in st.session_state.risk_families[family_key]["risks"]:
-        del st.session_state.risk_families[family_key]["risks"][risk_key]
+    workspace().delete_risk(family_key, risk_key)
 
 def delete_measure(family_key, risk_key, measure_type, measure_index):
     """Supprime une mesure"""
-    measures = st.session_state.risk_families[family_key]["risks"][risk_key]["measures"][measure_type]
-    if 0 <= measure_index < len(measures):
-        del measures[measure_index]
+    workspace().delete_measure(family_key, risk_key, measure_type, measure_index)
 
 # Fonctions pour les mesures et actions
+def cached_frame(name, builder):
+    """Retourne un DataFrame mémorisé tant que la version des données ne change pas"""
+    version = st.session_state.data_version
+    cached = st.session_state.frame_cache.get(name)
+    if cached is None or cached[0] != version:
+        cached = st.session_state.frame_cache[name] = (version, builder())
+    return cached[1]
+
+@profiling.timed
+def build_measures_frame():
+    """Construit le DataFrame des mesures avec leur contexte"""
+    return workspace().measures_frame()
+
+@profiling.timed
+def build_actions_frame():
+    """Construit le DataFrame des actions"""
+    return workspace().actions_frame()
+
+@profiling.timed
 def get_all_measures():
-    """Récupère toutes les mesures avec leur contexte"""
-    measures_data = []
-    for family_key, family_data in st.session_state.risk_families.items():
-        for risk_key, risk_data in family_data["risks"].items():
-            risk_name = risk_key.split(" - ")[1]
-            for measure_type, measures in risk_data["measures"].items():
-                for measure in measures:
-                    measure_id = f"{family_key}-{risk_name}-{measure_type}"
-                    measures_data.append({
-                        "id": measure_id,
-                        "famille": family_data["name"],
-                        "risque": risk_name,
-                        "processus": ", ".join(risk_data["processes"]),
-                        "type": MEASURE_TYPES[measure_type],
-                        "mesure": measure,
-                        "statut": st.session_state.measure_status.get(measure_id, "Non évalué"),
-                        "performance": st.session_state.measure_performance.get(measure_id, "N/A")
-                    })
-    return pd.DataFrame(measures_data)
+    """Récupère toutes les mesures avec leur contexte (mémorisé par version des données)"""
+    return cached_frame("measures", build_measures_frame)
 
+@profiling.timed
 def get_all_actions():
-    """Récupère toutes les actions avec leur contexte"""
-    actions_data = []
-    for action_id, action in st.session_state.actions.items():
-        actions_data.append({
-            "id": action_id,
-            "mesure_id": action["measure_id"],
-            "description": action["description"],
-            "responsable": action["responsable"],
-            "deadline": action["deadline"],
-            "statut": action["statut"],
-            "priorite": action["priorite"],
-            "commentaire": action["commentaire"]
-        })
-    return pd.DataFrame(actions_data)
+    """Récupère toutes les actions avec leur contexte (mémorisé par version des données)"""
+    return cached_frame("actions", build_actions_frame)
 
 def add_action(measure_id, description, responsable, deadline, priorite="NORMALE"):
     """Ajoute une nouvelle action"""
-    action_id = f"action_{len(st.session_state.actions) + 1}"
-    st.session_state.actions[action_id] = {
-        "measure_id": measure_id,
-        "description": description,
-        "responsable": responsable,
-        "deadline": deadline,
-        "statut": "À faire",
-        "priorite": priorite,
-        "commentaire": ""
-    }
+    workspace().add_action(measure_id, description, responsable, deadline, priorite)
 
 def update_action(action_id, **kwargs):
     """Met à jour une action existante"""
-    if action_id in st.session_state.actions:
-        st.session_state.actions[action_id].update(kwargs)
+    workspace().update_action(action_id, **kwargs)
 
 def update_measure_status(measure_id, status, performance):
     """Met à jour le statut et la performance d'une mesure"""
-    st.session_state.measure_status[measure_id] = status
-    st.session_state.measure_performance[measure_id] = performance
+    workspace().update_measure_status(measure_id, status, performance)
+
+def update_measure_statuses(updates):
+    """Met à jour plusieurs mesures en une seule écriture : {measure_id: (statut, performance)}"""
+    workspace().update_measure_statuses(updates)
 
 def delete_action(action_id):
     """Supprime une action"""
-    if action_id in st.session_state.actions:
-        del st.session_state.actions[action_id]
+    workspace().delete_action(action_id)
 
+@profiling.timed
 def get_measures_by_process(process):
     """Filtre les mesures par processus"""
     all_measures = get_all_measures()
     if process != "Tous":
-        return all_measures[all_measures["processus"].str.contains(process, na=False)]
+        # Test exact sur le masque : "VENTE" ne retient plus "VENTE WEB" ni "AUTRES_MODES_VENTE"
+        bit = PROCESS_BITS.get(process, 0)
+        return all_measures[(all_measures["process_mask"].to_numpy() & bit) != 0]
     return all_measures
+
+@profiling.timed
 def get_process_coverage_stats(process_name):
     """Calcule les statistiques de couverture pour un processus"""
-    stats = {
-        "total_risks": 0,
-        "measures_by_type": defaultdict(int),
-        "risks_by_family": defaultdict(int),
-        "total_measures": 0
-    }
-    
-    for family_key, family_data in st.session_state.risk_families.items():
-        for risk_key, risk_data in family_data["risks"].items():
-            if process_name in risk_data.get("processes", []):
-                stats["total_risks"] += 1
-                stats["risks_by_family"][family_key] += 1
-                
-                for measure_type, measures in risk_data["measures"].items():
-                    measure_count = len(measures)
-                    stats["measures_by_type"][measure_type] += measure_count
-                    stats["total_measures"] += measure_count
-    
-    return stats
+    return workspace().process_stats(process_name)
+
+@profiling.timed
+def get_coverage_cube():
+    """Cube processus × famille × type de mesure, lu dans les compteurs incrémentaux"""
+    return workspace().coverage_cube()
 
+def start_measures_report(process):
+    """Lance le rapport des mesures en arrière-plan"""
+    suffix = "tous" if process == "Tous" else process.lower()
+    submit_job(
+        "report", f"Rapport des mesures ({process})", run_export,
+        build_measures_report, f"rapport_mesures_{suffix}_{datetime.now():%Y%m%d_%H%M%S}.csv", "text/csv",
+        frozen_families(),
+        dict(st.session_state.measure_status),
+        dict(st.session_state.measure_performance),
+        st.session_state.action_store.count_by_measure(),
+        process,
+        unit="mesures"
+    )
+
+@profiling.timed
 def get_risks_by_process(process_name):
     """Récupère tous les risques associés à un processus"""
     process_risks = []
-    for family_key, family_data in st.session_state.risk_families.items():
-        for risk_key, risk_data in family_data["risks"].items():
-            if process_name in risk_data.get("processes", []):
-                process_risks.append({
-                    "family": family_key,
-                    "risk": risk_key,
-                    "description": risk_data["description"],
-                    "measures": risk_data["measures"]
-                })
+    store = st.session_state.risk_store
+    for family_key, risk_key in store.risk_refs_by_process(process_name):
+        risk_data = store.risk(family_key, risk_key)
+        process_risks.append({
+            "family": family_key,
+            "risk": risk_key,
+            "description": risk_data["description"],
+            "measures": risk_data["measures"]
+        })
     return process_risks
 
 # Interface principale
-col1, col2 = st.columns([3, 1])
+profiling.mark("initialisation")
+sync_from_backend()
+sync_shared_register()
+
+col1, col2 = st.columns([5, 2])
 with col1:
     st.markdown("### Gestion des Risques")
+    register = session_register()
+    if register is not None and register.pending:
+        # Sans stockage persistant, les modifications restent propres à la session jusqu'à publication
+        pending_col, publish_col, discard_col = st.columns([3, 1, 1])
+        with pending_col:
+            st.caption(f"✏️ {register.pending} modification(s) non publiée(s) : visibles dans cette session seulement")
+        with publish_col:
+            if st.button("Publier", key="publish_register", help="Rendre les modifications visibles par toutes les sessions"):
+                register.commit()
+                st.rerun()
+        with discard_col:
+            if st.button("Annuler", key="discard_register", help="Revenir à la version publiée"):
+                register.discard()
+                bump_data_version()
+                st.rerun()
 with col2:
-    upload_col, export_col = st.columns([1, 1])
+    upload_col, json_col, csv_col, snapshot_col = st.columns([2, 1, 1, 1])
     with upload_col:
         uploaded_file = st.file_uploader(
             "⬆️ Import",
-            type=["json", "csv"], 
+            type=["json", "csv", "gz"],
             label_visibility="collapsed"
         )
+        st.toggle(
+            "Fusionner",
+            key="import_merge",
+            help="Ajoute et met à jour familles, risques et mesures sans rien supprimer ; "
+                 "une mesure dont le texte existe déjà pour le risque et le type est ignorée"
+        )
         if uploaded_file:
-            if uploaded_file.type == "application/json":
-                load_from_json(uploaded_file)
-            else:
-                load_from_csv(uploaded_file)
-    with export_col:
-        st.markdown(
-            f"""<div class="download-container">{save_to_json()} {save_to_csv()}</div>""", 
-            unsafe_allow_html=True
+            handle_upload(uploaded_file)
+        else:
+            forget_finished_uploads()
+    # Exports générés uniquement au clic, puis réutilisés tant que les données ne changent pas
+    current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
+    with json_col:
+        export_button("⬇️ JSON", "json", f"risk_data_{current_time}.json")
+    with csv_col:
+        export_button(
+            "⬇️ CSV", "csv", f"risk_data_{current_time}.csv",
+            disabled=not st.session_state.risk_store.families
         )
+    with snapshot_col:
+        export_button(
+            "⬇️ Tout",
+            "snapshot",
+            f"risk_data_{current_time}{SNAPSHOT_SUFFIX}",
+            st.session_state.risk_store.families,
+            st.session_state.action_store.actions,
+            st.session_state.measure_status,
+            st.session_state.measure_performance,
+            help_text="Snapshot compressé de l'état complet : registre, actions et évaluations"
+        )
+profiling.mark("en-tête et exports")
+render_jobs()
+profiling.mark("tâches")
 
-# Onglets principaux
-tab1, tab2, tab3, tab4 = st.tabs([
-    "📊 Risques | Gestion par famille",
-    "🔄 Processus | Vue par processus",
-    "🏢 Service | Impact par service",
-    "🔍 Mesures & Actions"
-])
-
-# Tab 1: Gestion par famille
-with tab1:
+# Vue 1: Gestion par famille
+def render_family_view():
+    """Gestion des familles, risques et mesures"""
     if st.button("+ Nouvelle Famille", use_container_width=False, type="secondary"):
         st.session_state.show_family_form = True
     
@@ -529,9 +651,31 @@ with tab1:
     with col3:
         selected_measure_type = st.selectbox("Type de mesure", ["Tous"] + list(MEASURE_TYPES.values()))
 
+    # Sélection des risques via les index du registre plutôt qu'un parcours complet
+    store = st.session_state.risk_store
+    if selected_process == "Tous":
+        visible_risks = None
+    else:
+        visible_risks = store.risks_by_process(selected_process)
+    if selected_measure_type != "Tous":
+        measure_type_code = next(k for k, v in MEASURE_TYPES.items() if v == selected_measure_type)
+        with_measure_type = set(store.risk_refs_by_measure_type(measure_type_code))
+    else:
+        with_measure_type = None
+    # Recherche plein texte : risques trouvés par famille, par ordre de pertinence
+    # (pas de filtre tant que la saisie n'a aucun terme cherchable, un seul caractère par exemple)
+    found = store.search(search_term) if search_term else None
+    if found is not None:
+        search_hits = defaultdict(list)
+        for family_key, risk_key in found:
+            search_hits[family_key].append(risk_key)
+    else:
+        search_hits = None
+    profiling.mark("filtres et recherche")
+
     # Affichage des familles de risques
-    for family_key, family_data in st.session_state.risk_families.items():
-        with st.expander(f"📁 {family_data['name']}", expanded=False):
+    for family_key, family_data in store.families.items():
+        with st.expander(f"📁 {family_data['name']}", expanded=bool(search_hits and family_key in search_hits)):
             cols = st.columns([20, 1])
             with cols[1]:
                 if st.button("＋", key=f"add_risk_{family_key}", help="Ajouter un risque", type="secondary"):
@@ -567,7 +711,7 @@ with tab1:
                     if st.button("＋", key=f"add_measure_{family_key}"):
                         if measure_text and any(measure_types_selected.values()) and risk_name:
                             risk_key = f"{family_key} - {risk_name}"
-                            if risk_key not in st.session_state.risk_families[family_key]["risks"]:
+                            if risk_key not in store.risks_by_family(family_key):
                                 add_risk(family_key, risk_name, risk_desc, selected_processes)
                             
                             for m_type, selected in measure_types_selected.items():
@@ -591,32 +735,43 @@ with tab1:
                         st.rerun()
             
             # Affichage des risques existants
-            for risk_key, risk_data in family_data["risks"].items():
-                if (selected_process == "Tous" or selected_process in risk_data.get("processes", [])):
-                    if not search_term or search_term.lower() in risk_key.lower():
-                        measure_counts = {
-                            MEASURE_TYPES[m_type]: len(measures) 
-                            for m_type, measures in risk_data["measures"].items()
-                        }
-                        
-                        cols = st.columns([8, 4, 4, 1])
-                        with cols[0]:
-                            st.markdown(f"**{risk_key.split(' - ')[1]}**")
-                        with cols[1]:
-                            st.markdown(", ".join(risk_data["processes"][:2] + 
-                                      (["..."] if len(risk_data["processes"]) > 2 else [])))
-                        with cols[2]:
-                            st.markdown(" ".join([
-                                f'<span style="background:#f5f5f5;padding:0 0.25rem;'
-                                f'border-radius:2px;font-size:0.7rem">{t}:{c}</span>'
-                                for t, c in measure_counts.items() if c > 0
-                            ]), unsafe_allow_html=True)
-                        with cols[3]:
-                            if st.button("📝", key=f"edit_{risk_key}"):
-                                st.session_state[f"edit_risk_{risk_key}"] = True
-
-# Tab 2: Vue par processus
-with tab2:
+            if visible_risks is None:
+                family_risks = family_data["risks"]
+            else:
+                family_risks = visible_risks.get(family_key, {})
+            if search_hits is not None:
+                family_risks = {
+                    risk_key: family_risks[risk_key]
+                    for risk_key in search_hits.get(family_key, [])
+                    if risk_key in family_risks
+                }
+            for risk_key, risk_data in family_risks.items():
+                if with_measure_type is None or (family_key, risk_key) in with_measure_type:
+                    measure_counts = {
+                        MEASURE_TYPES[m_type]: len(measures) 
+                        for m_type, measures in risk_data["measures"].items()
+                    }
+                    
+                    cols = st.columns([8, 4, 4, 1])
+                    with cols[0]:
+                        st.markdown(f"**{risk_key.split(' - ')[1]}**")
+                    with cols[1]:
+                        st.markdown(", ".join(risk_data["processes"][:2] + 
+                                  (["..."] if len(risk_data["processes"]) > 2 else [])))
+                    with cols[2]:
+                        st.markdown(" ".join([
+                            f'<span style="background:#f5f5f5;padding:0 0.25rem;'
+                            f'border-radius:2px;font-size:0.7rem">{t}:{c}</span>'
+                            for t, c in measure_counts.items() if c > 0
+                        ]), unsafe_allow_html=True)
+                    with cols[3]:
+                        if st.button("📝", key=f"edit_{risk_key}"):
+                            st.session_state[f"edit_risk_{risk_key}"] = True
+    profiling.mark("boucle des familles")
+
+# Vue 2: Vue par processus
+def render_process_view():
+    """Couverture et risques d'un processus"""
     selected_process_view = st.selectbox(
         "Sélectionner un processus",
         PROCESSES,
@@ -633,8 +788,7 @@ with tab2:
     with col2:
         st.metric("Mesures en place", process_stats["total_measures"])
     with col3:
-        coverage_pct = (process_stats["total_measures"] / (process_stats["total_risks"] * 5)) * 100 if process_stats["total_risks"] > 0 else 0
-        st.metric("Taux de couverture", f"{coverage_pct:.1f}%")
+        st.metric("Taux de couverture", f"{process_stats['coverage_pct']:.1f}%")
     
     # Répartition des mesures
     st.subheader("Répartition des mesures")
@@ -658,42 +812,158 @@ with tab2:
                     if measures:
                         st.markdown(f"**{MEASURE_TYPES[measure_type]}**")
                         for measure in measures:
-                            st.markdown(f"- {measure}")
+                            st.markdown(f"- {measure['text']}")
     else:
         st.info("Aucun risque associé à ce processus")
 
-# Tab 3: Vue par service
-with tab3:
-    selected_service = st.selectbox(
-        "Sélectionner un service",
-        PROCESSES,
-        key="service_view_selector"
+# Vue d'ensemble : couverture de tous les processus
+OVERVIEW_TOTAL = "TOTAL"
+
+def select_overview_cell():
+    """Reporte la cellule cliquée dans la carte de chaleur sur les sélecteurs de détail"""
+    points = st.session_state.overview_heatmap.selection.points
+    if points and "x" in points[0] and "y" in points[0]:
+        st.session_state.overview_process = points[0]["y"]
+        st.session_state.overview_family = points[0]["x"]
+
+def render_overview_view():
+    """Carte de chaleur de la couverture processus × famille, avec détail par cellule"""
+    # Importés à la première ouverture de la vue, pas au démarrage (voir benchmarks/bench_startup.py)
+    import pandas as pd
+    import plotly.graph_objects as go
+
+    store = st.session_state.risk_store
+    families, risks, measures = get_coverage_cube()
+    if not families:
+        st.info("Aucune famille de risques")
+        return
+
+    type_names = {name: i for i, name in enumerate(MEASURE_TYPES.values())}
+    selected_type = st.selectbox("Type de mesure", ["Tous les types"] + list(type_names), key="overview_measure_type")
+    if selected_type == "Tous les types":
+        cell_measures = measures.sum(axis=2)
+        expected_per_risk = len(MEASURE_TYPES)
+    else:
+        cell_measures = measures[:, :, type_names[selected_type]]
+        expected_per_risk = 1
+
+    # Colonne TOTAL : un risque appartient à une seule famille, les totaux sont des sommes
+    cell_risks = np.column_stack([risks, risks.sum(axis=1)])
+    cell_measures = np.column_stack([cell_measures, cell_measures.sum(axis=1)])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        coverage = np.where(cell_risks > 0, cell_measures / (cell_risks * expected_per_risk) * 100, np.nan)
+
+    columns = families + [OVERVIEW_TOTAL]
+    family_names = [store.families[f]["name"] for f in families] + ["Tous les risques"]
+    hover = [
+        [
+            f"{process} × {family_name}<br>Risques : {n_risks}<br>Mesures : {n_measures}"
+            for family_name, n_risks, n_measures in zip(family_names, risk_row, measure_row)
+        ]
+        for process, risk_row, measure_row in zip(PROCESSES, cell_risks.tolist(), cell_measures.tolist())
+    ]
+    fig = go.Figure(go.Heatmap(
+        z=coverage,
+        x=columns,
+        y=PROCESSES,
+        text=hover,
+        hovertemplate="%{text}<br>Couverture : %{z:.0f}%<extra></extra>",
+        colorscale="RdYlGn",
+        zmin=0,
+        zmax=100,
+        colorbar={"title": "Couverture %"},
+        xgap=1,
+        ygap=1
+    ))
+    fig.update_layout(
+        height=max(400, 22 * len(PROCESSES)),
+        margin={"l": 0, "r": 0, "t": 10, "b": 0},
+        yaxis={"autorange": "reversed"},
+        xaxis={"side": "top", "type": "category"}
     )
-    
+    st.plotly_chart(fig, key="overview_heatmap", on_select=select_overview_cell, selection_mode="points")
+
+    # Détail d'une cellule : cliquer dans la carte ou choisir ci-dessous
+    col1, col2 = st.columns(2)
+    with col1:
+        process = st.selectbox("Processus", PROCESSES, key="overview_process")
+    with col2:
+        family = st.selectbox(
+            "Famille",
+            columns,
+            format_func=lambda f: OVERVIEW_TOTAL if f == OVERVIEW_TOTAL else f"{f} - {store.families[f]['name']}",
+            key="overview_family"
+        )
+
+    p = PROCESSES.index(process)
+    f = columns.index(family)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Risques", int(cell_risks[p, f]))
+    with col2:
+        st.metric("Mesures", int(cell_measures[p, f]))
+    with col3:
+        st.metric("Couverture", "-" if np.isnan(coverage[p, f]) else f"{coverage[p, f]:.1f}%")
+
+    refs = store.select_risks(any_of=[process], families=() if family == OVERVIEW_TOTAL else [family])
+    if refs:
+        detail = pd.DataFrame(
+            [
+                [family_key, risk_key.split(" - ", 1)[-1]]
+                + [len(store.risk(family_key, risk_key)["measures"].get(t, [])) for t in MEASURE_TYPES]
+                for family_key, risk_key in refs
+            ],
+            columns=["Famille", "Risque"] + list(MEASURE_TYPES.values())
+        )
+        st.dataframe(detail, hide_index=True, width="stretch")
+    else:
+        st.info("Aucun risque pour cette cellule")
+
+# Vue 3: Vue par service
+def render_service_view():
+    """Risques d'un ou plusieurs services regroupés par famille"""
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        selected_services = st.multiselect(
+            "Sélectionner un ou plusieurs services",
+            PROCESSES,
+            default=PROCESSES[:1],
+            key="service_view_selector"
+        )
+    with col2:
+        combine = st.radio("Combinaison", ["OU", "ET"], horizontal=True, key="service_view_combine")
+
+    if not selected_services:
+        st.info("Sélectionnez au moins un service")
+        return
+
+    # Sélection vectorisée sur le miroir colonnaire du registre
+    store = st.session_state.risk_store
+    arrays = store.arrays
+    if combine == "ET":
+        rows = arrays.select(all_of=selected_services)
+    else:
+        rows = arrays.select(any_of=selected_services)
+
     # Création de la matrice de risques
     risk_matrix = defaultdict(list)
-    for family_key, family_data in st.session_state.risk_families.items():
-        for risk_key, risk_data in family_data["risks"].items():
-            if selected_service in risk_data.get("processes", []):
-                risk_matrix[family_key].append({
-                    "risk_key": risk_key,
-                    "description": risk_data["description"],
-                    "measures": risk_data["measures"],
-                    "measure_count": sum(len(m) for m in risk_data["measures"].values())
-                })
-    
+    for family_key, risk_key in arrays.refs_of(rows):
+        risk_data = store.risk(family_key, risk_key)
+        risk_matrix[family_key].append({
+            "risk_key": risk_key,
+            "description": risk_data["description"],
+            "measures": risk_data["measures"]
+        })
+
     if risk_matrix:
-        total_risks = sum(len(risks) for risks in risk_matrix.values())
-        total_measures = sum(
-            sum(risk["measure_count"] for risk in risks)
-            for risks in risk_matrix.values()
-        )
-        
-        col1, col2 = st.columns(2)
+        service_stats = arrays.stats(rows)
+        col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Total des risques", total_risks)
+            st.metric("Total des risques", service_stats["total_risks"])
         with col2:
-            st.metric("Total des mesures", total_measures)
+            st.metric("Total des mesures", service_stats["total_measures"])
+        with col3:
+            st.metric("Taux de couverture", f"{service_stats['coverage_pct']:.1f}%")
         
         for family_key, risks in risk_matrix.items():
             with st.expander(f"{family_key} ({len(risks)} risques)", expanded=True):
@@ -708,20 +978,22 @@ with tab3:
     else:
         st.info("Aucun risque associé à ce service")
 
-# Tab 4: Mesures & Actions
-with tab4:
+# Vue 4: Mesures & Actions
+def render_measures_view():
+    """Évaluation des mesures et suivi des actions"""
     # Filtres en haut de page
     col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
     with col1:
         view_mode = st.radio("Mode d'affichage", 
                           ["Tableau de bord", "Suivi des mesures", "Actions à suivre"], 
-                          horizontal=True)
+                          horizontal=True,
+                          key="measures_view_mode")
     with col2:
-        filter_process = st.selectbox("Processus", ["Tous"] + PROCESSES)
+        filter_process = st.selectbox("Processus", ["Tous"] + PROCESSES, key="measures_filter_process")
     with col3:
-        filter_measure = st.selectbox("Type", ["Tous"] + list(MEASURE_TYPES.values()))
+        filter_measure = st.selectbox("Type", ["Tous"] + list(MEASURE_TYPES.values()), key="measures_filter_type")
     with col4:
-        filter_status = st.selectbox("Statut", ["Tous"] + MEASURE_STATUS)
+        filter_status = st.selectbox("Statut", ["Tous"] + MEASURE_STATUS, key="measures_filter_status")
 
     # Récupération des données
     df_measures = get_measures_by_process(filter_process)
@@ -734,6 +1006,13 @@ with tab4:
         df_measures = df_measures[df_measures["statut"] == filter_status]
 
     if view_mode == "Tableau de bord":
+        st.button(
+            "📄 Rapport des mesures (CSV)",
+            key="measures_report",
+            on_click=start_measures_report,
+            args=(filter_process,),
+            help="Généré en arrière-plan pour le processus sélectionné, à télécharger dans le panneau des tâches"
+        )
         # Métriques globales
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -748,7 +1027,8 @@ with tab4:
             pct_effective = len(measures_effective)/total_measures*100 if total_measures > 0 else 0
             st.metric("Efficaces", f"{len(measures_effective)} ({pct_effective:.0f}%)")
         with col4:
-            actions_in_progress = len(df_actions[df_actions["statut"].isin(["À faire", "En cours"])])
+            action_status_counts = st.session_state.action_store.count_by_status()
+            actions_in_progress = action_status_counts.get("À faire", 0) + action_status_counts.get("En cours", 0)
             st.metric("Actions en cours", actions_in_progress)
 
         # Graphiques et statistiques
@@ -757,7 +1037,7 @@ with tab4:
             st.subheader("Statut des mesures")
             if not df_measures.empty:
                 status_counts = df_measures["statut"].value_counts()
-                colors = [STATUS_COLORS[status] for status in status_counts.index]
+                colors = [STATUS_COLORS.get(status, "#6c757d") for status in status_counts.index]
                 st.bar_chart(status_counts)
         with col2:
             st.subheader("Actions par priorité")
@@ -766,72 +1046,87 @@ with tab4:
                 st.bar_chart(priority_counts)
 
     elif view_mode == "Suivi des mesures":
-        # Vue tabulaire des mesures avec possibilité d'évaluation
+        # Vue paginée : tri et filtrage côté serveur, seule la page courante est rendue
         if not df_measures.empty:
-            for idx, measure in df_measures.iterrows():
-                with st.expander(f"{measure['famille']} - {measure['risque']}", expanded=False):
-                    # Affichage des informations de la mesure
-                    col1, col2 = st.columns([3, 1])
-                    with col1:
-                        st.write("**Mesure:**", measure['mesure'])
-                        st.write("**Processus:**", measure['processus'])
-                        st.write("**Type:**", measure['type'])
-                    with col2:
-                        new_status = st.selectbox(
-                            "Statut",
-                            MEASURE_STATUS,
-                            index=MEASURE_STATUS.index(measure['statut']),
-                            key=f"status_{measure['id']}"
-                        )
-                        new_performance = st.text_area(
-                            "Évaluation",
-                            value=measure['performance'],
-                            key=f"perf_{measure['id']}"
-                        )
-                        if st.button("Mettre à jour", key=f"update_{measure['id']}"):
-                            update_measure_status(measure['id'], new_status, new_performance)
-                            st.rerun()
+            sort_col1, sort_col2, page_col1, page_col2 = st.columns([2, 1, 1, 1])
+            with sort_col1:
+                sort_column = st.selectbox("Trier par", list(MEASURE_SORT_COLUMNS), key="measures_sort_column")
+            with sort_col2:
+                sort_ascending = st.toggle("Croissant", value=True, key="measures_sort_ascending")
+            with page_col1:
+                page_size = st.selectbox("Par page", MEASURE_PAGE_SIZES, key="measures_page_size")
+            page_count = max(1, -(-len(df_measures) // page_size))
+            with page_col2:
+                page = st.number_input(f"Page (/{page_count})", min_value=1, max_value=page_count, value=1,
+                                       key="measures_page")
 
-                    # Actions associées
-                    related_actions = df_actions[df_actions["mesure_id"] == measure["id"]]
-                    if len(related_actions) > 0:
-                        st.write("**Actions associées:**")
-                        for _, action in related_actions.iterrows():
-                            col1, col2, col3 = st.columns([2, 2, 1])
-                            with col1:
-                                st.markdown(f"- {action['description']}")
-                            with col2:
-                                st.markdown(f"👤 {action['responsable']} | 📅 {action['deadline']}")
-                            with col3:
-                                status_color = STATUS_COLORS.get(action['statut'], "#6c757d")
-                                st.markdown(f'<span style="color:{status_color}">{action["statut"]}</span>', unsafe_allow_html=True)
-
-                    # Bouton pour ajouter une nouvelle action
-                    if st.button("+ Nouvelle action", key=f"new_action_{measure['id']}"):
-                        st.session_state[f"show_action_form_{measure['id']}"] = True
-
-                    # Formulaire d'ajout d'action
-                    if st.session_state.get(f"show_action_form_{measure['id']}", False):
-                        with st.form(f"action_form_{measure['id']}"):
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                action_desc = st.text_area("Description")
-                                action_resp = st.text_input("Responsable")
-                            with col2:
-                                action_deadline = st.date_input("Échéance")
-                                action_priority = st.selectbox("Priorité", ACTION_PRIORITY)
-                            
-                            submit_col1, submit_col2 = st.columns([1, 4])
-                            with submit_col1:
-                                if st.form_submit_button("Ajouter"):
-                                    add_action(measure['id'], action_desc, action_resp, 
-                                             action_deadline, action_priority)
-                                    st.session_state[f"show_action_form_{measure['id']}"] = False
-                                    st.rerun()
-                            with submit_col2:
-                                if st.form_submit_button("Annuler"):
-                                    st.session_state[f"show_action_form_{measure['id']}"] = False
-                                    st.rerun()
+            sorted_measures = df_measures.sort_values(
+                MEASURE_SORT_COLUMNS[sort_column], ascending=sort_ascending, kind="stable"
+            )
+            page_measures = sorted_measures.iloc[(page - 1) * page_size:page * page_size]
+            action_store = st.session_state.action_store
+
+            # Grille éditable : les modifications sont enregistrées en une seule écriture
+            grid = page_measures[["id", "famille", "risque", "type", "mesure", "statut", "performance"]].copy()
+            grid["performance"] = grid["performance"].fillna(NO_EVALUATION)
+            action_counts = action_store.count_by_measure()
+            grid["actions"] = [action_counts.get(measure_id, 0) for measure_id in grid["id"]]
+            with st.form("measures_grid_form", border=False):
+                edited = st.data_editor(
+                    grid,
+                    hide_index=True,
+                    width="stretch",
+                    disabled=["id", "famille", "risque", "type", "mesure", "actions"],
+                    column_config={
+                        "id": None,
+                        "statut": st.column_config.SelectboxColumn("Statut", options=MEASURE_STATUS, required=True),
+                        "performance": st.column_config.TextColumn("Évaluation"),
+                        "actions": st.column_config.NumberColumn("Actions")
+                    },
+                    key=f"measures_grid_{page}_{page_size}_{sort_column}_{sort_ascending}"
+                )
+                if st.form_submit_button("Enregistrer les modifications"):
+                    changed = (edited["statut"] != grid["statut"]) | (edited["performance"] != grid["performance"])
+                    updates = {
+                        measure_id: (status, None if performance in (NO_EVALUATION, "") else performance)
+                        for measure_id, status, performance in edited.loc[changed, ["id", "statut", "performance"]].itertuples(index=False)
+                    }
+                    if updates:
+                        update_measure_statuses(updates)
+                        st.rerun()
+
+            # Détail d'une mesure de la page : actions associées et ajout d'action
+            measure_labels = {
+                measure_id: f"{famille} - {risque} | {mesure[:60]}"
+                for measure_id, famille, risque, mesure in page_measures[["id", "famille", "risque", "mesure"]].itertuples(index=False)
+            }
+            selected_measure_id = st.selectbox(
+                "Actions de la mesure",
+                list(measure_labels),
+                format_func=measure_labels.get,
+                key="measures_detail_selector"
+            )
+            for _, action in action_store.actions_for_measure(selected_measure_id):
+                col1, col2, col3 = st.columns([2, 2, 1])
+                with col1:
+                    st.markdown(f"- {action['description']}")
+                with col2:
+                    st.markdown(f"👤 {action['responsable']} | 📅 {action['deadline']}")
+                with col3:
+                    status_color = STATUS_COLORS.get(action['statut'], "#6c757d")
+                    st.markdown(f'<span style="color:{status_color}">{action["statut"]}</span>', unsafe_allow_html=True)
+
+            with st.form("measure_action_form", clear_on_submit=True):
+                col1, col2 = st.columns(2)
+                with col1:
+                    action_desc = st.text_area("Description")
+                    action_resp = st.text_input("Responsable")
+                with col2:
+                    action_deadline = st.date_input("Échéance")
+                    action_priority = st.selectbox("Priorité", ACTION_PRIORITY)
+                if st.form_submit_button("+ Nouvelle action"):
+                    add_action(selected_measure_id, action_desc, action_resp, action_deadline, action_priority)
+                    st.rerun()
         else:
             st.info("Aucune mesure ne correspond aux critères sélectionnés")
 
@@ -841,26 +1136,28 @@ with tab4:
         with col1:
             action_status_filter = st.selectbox("Statut des actions", ["Tous"] + ACTION_STATUS)
         with col2:
-            action_priority_filter = st.selectbox("Priorité", ["Tous"] + ACTION_PRIORITY)
+            action_priority_filter = st.selectbox("Priorité", ["Tous"] + ACTION_PRIORITY, key="actions_filter_priority")
         with col3:
-            action_date_filter = st.selectbox("Date", ["Toutes", "À échéance", "En retard"])
-
-        # Filtrage des actions
-        filtered_actions = df_actions.copy()
-        if action_status_filter != "Tous":
-            filtered_actions = filtered_actions[filtered_actions["statut"] == action_status_filter]
-        if action_priority_filter != "Tous":
-            filtered_actions = filtered_actions[filtered_actions["priorite"] == action_priority_filter]
-        if action_date_filter != "Toutes":
-            today = pd.Timestamp.now().date()
-            if action_date_filter == "En retard":
-                filtered_actions = filtered_actions[filtered_actions["deadline"] < today]
-            elif action_date_filter == "À échéance":
-                filtered_actions = filtered_actions[filtered_actions["deadline"] == today]
+            action_date_filter = st.selectbox("Date", list(ACTION_DEADLINE_WINDOWS))
+
+        # Filtrage des actions par les index du store (triées par échéance)
+        first = last = None
+        window = ACTION_DEADLINE_WINDOWS[action_date_filter]
+        if window is not None:
+            today = datetime.now().date()
+            first, last = (None if offset is None else today + timedelta(days=offset) for offset in window)
+        action_store = st.session_state.action_store
+        filtered_ids = action_store.query(
+            statuses=None if action_status_filter == "Tous" else [action_status_filter],
+            priorities=None if action_priority_filter == "Tous" else [action_priority_filter],
+            first=first,
+            last=last
+        )
 
         # Affichage des actions
-        if not filtered_actions.empty:
-            for _, action in filtered_actions.iterrows():
+        if filtered_ids:
+            for action_id in filtered_ids:
+                action = action_store.actions[action_id]
                 with st.expander(
                     f"{action['priorite']} | {action['description'][:50]}{'...' if len(action['description']) > 50 else ''}", 
                     expanded=False
@@ -875,18 +1172,78 @@ with tab4:
                             "Statut",
                             ACTION_STATUS,
                             index=ACTION_STATUS.index(action['statut']),
-                            key=f"action_status_{action['id']}"
+                            key=f"action_status_{action_id}"
                         )
-                        if st.button("Mettre à jour", key=f"update_action_{action['id']}"):
-                            update_action(action['id'], statut=new_status)
+                        if st.button("Mettre à jour", key=f"update_action_{action_id}"):
+                            update_action(action_id, statut=new_status)
                             st.rerun()
         else:
             st.info("Aucune action ne correspond aux critères sélectionnés")
 
-# Gestion des notifications
-if "notifications" not in st.session_state:
-    st.session_state.notifications = []
+# Panneau de profilage (barre latérale, repliée par défaut)
+def render_profile_panel(record, history):
+    """Durées du dernier rerun et p50/p95 sur les reruns de la session"""
+    import pandas as pd
 
+    summary = profiling.summarize(history)
+    rows = [
+        {
+            "section": name,
+            "dernier (ms)": seconds * 1000,
+            "p50 (ms)": summary[name][0] * 1000,
+            "p95 (ms)": summary[name][1] * 1000,
+            "appels": record["calls"].get(name, 1)
+        }
+        for name, seconds in [(profiling.TOTAL, record[profiling.TOTAL]), *record["sections"].items()]
+    ]
+    with st.sidebar.expander("⏱️ Profilage", expanded=False):
+        st.caption(
+            f"{len(history)} reruns · {sum(record['widgets'].values())} widgets · "
+            "les fonctions de données (nom()) sont comptées aussi dans la section qui les appelle"
+        )
+        st.dataframe(pd.DataFrame(rows).round(1), hide_index=True, width="stretch")
+        st.dataframe(
+            pd.Series(record["widgets"], name="widgets", dtype="int64").sort_values(ascending=False),
+            width="stretch"
+        )
+        if profiling.LOG_PATH is not None:
+            st.caption(f"Journal : {profiling.LOG_PATH}")
+
+# Navigation : seule la vue active est exécutée à chaque rerun
+# (st.tabs exécuterait le contenu des quatre onglets)
+VIEWS = {
+    "📊 Risques | Gestion par famille": render_family_view,
+    "🔄 Processus | Vue par processus": render_process_view,
+    "🗺️ Couverture | Vue d'ensemble": render_overview_view,
+    "🏢 Service | Impact par service": render_service_view,
+    "🔍 Mesures & Actions": render_measures_view
+}
+
+active_view = st.radio(
+    "Vue",
+    list(VIEWS),
+    horizontal=True,
+    label_visibility="collapsed",
+    key="active_view"
+)
+profiling.mark("navigation")
+with profiling.section(active_view):
+    VIEWS[active_view]()
+
+# Gestion des notifications
 for notification in st.session_state.notifications:
     st.toast(notification["message"])
 st.session_state.notifications = []
+profiling.mark("notifications")
+
+if profile is not None:
+    if "profile_history" not in st.session_state:
+        st.session_state.profile_history = deque(maxlen=profiling.SETTINGS["profile_history"])
+        st.session_state.profile_session = os.urandom(4).hex()
+    profile_record = profiling.finish_rerun(
+        profile,
+        st.session_state.profile_history,
+        session=st.session_state.profile_session,
+        view=active_view
+    )
+    render_profile_panel(profile_record, st.session_state.profile_history)
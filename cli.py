@@ -0,0 +1,241 @@
+"""Traitements par lots sans navigateur ni Streamlit : import, export, validation, couverture, rapports
+
+L'état est lu dans le stockage persistant (``--sqlite`` ou ``--journal``,
+par défaut ``CARTO_SQLITE_PATH`` / ``CARTO_JOURNAL_DIR`` comme l'interface)
+ou, avec ``--input``, dans un fichier JSON, CSV ou snapshot.
+
+Une base SQLite peut être traitée pendant que l'interface tourne. Un
+journal ne s'ouvre que dans un seul processus : ``--journal`` est refusé
+(code de retour 1) tant que l'interface, ou un autre traitement, l'utilise.
+
+    python cli.py --sqlite carto.db import registre.json
+    python cli.py --sqlite carto.db import nouveaux_risques.csv --merge
+    python cli.py --sqlite carto.db export sauvegarde.carto.gz
+    python cli.py --input registre.csv validate
+    python cli.py --journal donnees/ coverage --output couverture.csv  # interface arrêtée
+    python cli.py --sqlite carto.db report mesures_vente.csv --process VENTE
+    python cli.py --sqlite carto.db reports rapports/ --workers 4
+
+Code de retour : 0 si tout va bien, 1 en cas d'erreur ou d'anomalie détectée par ``validate``.
+"""
+import argparse
+import os
+import sys
+import time
+
+from core import (
+    EXPORT_FORMATS, FILE_UNITS, MEASURE_TYPES, PROCESSES, Workspace, detect_file_type, merge_summary_text,
+    parse_upload
+)
+from reports import REPORT_FORMATS, REPORT_KINDS, build_report_data, write_reports
+
+# Intervalle minimal entre deux affichages de progression (s)
+PROGRESS_INTERVAL = 0.5
+
+
+class Progress:
+    """Progression sur la sortie d'erreur : ``progress(fraction, count)``"""
+
+    def __init__(self, label, unit, stream=sys.stderr):
+        self.label = label
+        self.unit = unit
+        self.stream = stream
+        self.start = self.shown = time.perf_counter()
+
+    def __call__(self, fraction, count):
+        now = time.perf_counter()
+        if now - self.shown >= PROGRESS_INTERVAL:
+            self.shown = now
+            self.stream.write(f"\r{self.label} : {fraction:.0%} ({count:,} {self.unit})")
+            self.stream.flush()
+
+    def done(self, detail=""):
+        elapsed = time.perf_counter() - self.start
+        self.stream.write(f"\r{self.label} : terminé en {elapsed:.1f} s{detail}\n")
+
+
+def read_file(path):
+    """État contenu dans un fichier JSON, CSV ou snapshot"""
+    file_type = detect_file_type(path)
+    progress = Progress(f"Lecture {os.path.basename(path)}", FILE_UNITS[file_type])
+    size = max(os.path.getsize(path), 1)
+    with open(path, "rb") as f:
+        state = parse_upload(f, file_type, progress=lambda count: progress(f.tell() / size, count))
+    progress.done()
+    return state
+
+
+def open_workspace(args):
+    """Espace de travail : fichier ``--input``, sinon stockage persistant"""
+    if args.input:
+        workspace = Workspace()
+        workspace.import_state(read_file(args.input))
+        return workspace
+    if not (args.sqlite or args.journal):
+        raise ValueError("aucune source : indiquez --input, --sqlite ou --journal")
+    return Workspace.open(args.sqlite, args.journal)
+
+
+def write_output(path, payload):
+    """Écrit un fichier de sortie, ou la sortie standard pour « - »"""
+    if path == "-":
+        sys.stdout.buffer.write(payload)
+    else:
+        with open(path, "wb") as f:
+            f.write(payload)
+        print(f"{path} : {len(payload) / 1e6:.2f} Mo", file=sys.stderr)
+
+
+def command_import(args):
+    if args.input:
+        raise ValueError("import écrit dans le stockage persistant : --input ne s'applique pas")
+    if not (args.sqlite or args.journal):
+        raise ValueError("import : indiquez --sqlite ou --journal")
+    state = read_file(args.file)
+    workspace = Workspace.open(args.sqlite, args.journal)
+    if args.merge:
+        print(f"fusion — {merge_summary_text(workspace.merge_state(state))}")
+    else:
+        workspace.import_state(state)
+    print(summary(workspace))
+    return 0
+
+
+def command_export(args):
+    workspace = open_workspace(args)
+    fmt = args.format or detect_file_type(args.file)
+    progress = Progress(f"Export {fmt.upper()}", FILE_UNITS[fmt])
+    payload = workspace.export(fmt, progress=progress)
+    progress.done()
+    write_output(args.file, payload)
+    return 0
+
+
+def command_validate(args):
+    workspace = open_workspace(args)
+    print(summary(workspace))
+    problems = workspace.validate()
+    for problem in problems:
+        print(f"anomalie : {problem}")
+    if not problems:
+        print("aucune anomalie")
+    return 1 if problems else 0
+
+
+def coverage_frame(workspace, processes):
+    """Couverture par processus : risques, mesures par type et taux"""
+    import pandas as pd
+
+    rows = []
+    for process in processes:
+        stats = workspace.process_stats(process)
+        rows.append({
+            "processus": process,
+            "risques": stats["total_risks"],
+            "mesures": stats["total_measures"],
+            **{name: stats["measures_by_type"][measure_type] for measure_type, name in MEASURE_TYPES.items()},
+            "couverture_pct": round(stats["coverage_pct"], 1)
+        })
+    return pd.DataFrame(rows)
+
+
+def command_coverage(args):
+    workspace = open_workspace(args)
+    frame = coverage_frame(workspace, args.process or PROCESSES)
+    if args.output:
+        write_output(args.output, frame.to_csv(index=False).encode())
+    else:
+        print(frame.to_string(index=False))
+    return 0
+
+
+def command_report(args):
+    workspace = open_workspace(args)
+    progress = Progress(f"Rapport des mesures ({args.process})", "mesures")
+    payload = workspace.measures_report(args.process, progress=progress)
+    progress.done()
+    write_output(args.file, payload)
+    return 0
+
+
+def command_reports(args):
+    workspace = open_workspace(args)
+    data = build_report_data(workspace.risk_store, args.process or PROCESSES)
+    progress = Progress("Rapports", "rapports")
+    count, size = write_reports(
+        data, args.directory, args.kind, args.format, workers=args.workers, progress=progress
+    )
+    progress.done(f" : {count} rapports, {size / 1e6:.2f} Mo dans {args.directory}")
+    return 0
+
+
+def summary(workspace):
+    families = workspace.families
+    risks = sum(len(family_data["risks"]) for family_data in families.values())
+    measures = sum(
+        len(measures)
+        for family_data in families.values()
+        for risk_data in family_data["risks"].values()
+        for measures in risk_data["measures"].values()
+    )
+    return (
+        f"{len(families)} familles, {risks} risques, {measures} mesures, "
+        f"{len(workspace.action_store)} actions, {len(workspace.measure_status)} évaluations"
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Cartographie des risques sans interface")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--sqlite", default=os.environ.get("CARTO_SQLITE_PATH"), help="base SQLite")
+    source.add_argument("--journal", default=os.environ.get("CARTO_JOURNAL_DIR"), help="répertoire du journal")
+    parser.add_argument("--input", help="fichier JSON, CSV ou snapshot à traiter au lieu du stockage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("import", help="remplace l'état du stockage par un fichier, ou l'y fusionne")
+    command.add_argument("file")
+    command.add_argument(
+        "--merge", action="store_true",
+        help="ajoute et met à jour familles, risques et mesures sans rien supprimer (mesures en double ignorées)"
+    )
+    command.set_defaults(run=command_import)
+
+    command = commands.add_parser("export", help="exporte en JSON, CSV ou snapshot (« - » : sortie standard)")
+    command.add_argument("file")
+    command.add_argument("--format", choices=list(EXPORT_FORMATS), help="par défaut, d'après l'extension")
+    command.set_defaults(run=command_export)
+
+    command = commands.add_parser("validate", help="contrôle la cohérence du registre, des actions et évaluations")
+    command.set_defaults(run=command_validate)
+
+    command = commands.add_parser("coverage", help="couverture par processus")
+    command.add_argument("--process", nargs="+", choices=PROCESSES, metavar="PROCESSUS")
+    command.add_argument("--output", help="fichier CSV (par défaut, tableau sur la sortie standard)")
+    command.set_defaults(run=command_coverage)
+
+    command = commands.add_parser("report", help="rapport CSV des mesures")
+    command.add_argument("file")
+    command.add_argument("--process", default="Tous", choices=["Tous", *PROCESSES], metavar="PROCESSUS")
+    command.set_defaults(run=command_report)
+
+    command = commands.add_parser("reports", help="rapports HTML et CSV de chaque processus et service")
+    command.add_argument("directory")
+    command.add_argument("--process", nargs="+", choices=PROCESSES, metavar="PROCESSUS")
+    command.add_argument("--kind", nargs="+", choices=REPORT_KINDS, default=list(REPORT_KINDS))
+    command.add_argument("--format", nargs="+", choices=REPORT_FORMATS, default=list(REPORT_FORMATS))
+    command.add_argument("--workers", type=int, help="processus de rendu (par défaut, nombre de cœurs)")
+    command.set_defaults(run=command_reports)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.run(args)
+    except (OSError, ValueError) as e:
+        print(f"erreur : {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,578 @@
+"""Logique métier de la cartographie, sans interface
+
+Un ``Workspace`` regroupe l'état de travail (registre, actions, évaluations)
+et le stockage persistant optionnel. L'interface Streamlit lui passe
+``st.session_state`` comme état ; un traitement par lots (voir ``cli.py``)
+un simple dict créé par ``new_state()``. Les fonctions d'export et de
+lecture de fichiers travaillent sur des structures explicites et peuvent
+être appelées depuis n'importe quel thread.
+
+pandas n'est importé que par les fonctions qui produisent un DataFrame
+ou un CSV : l'interface et la ligne de commande démarrent sans lui.
+"""
+import io
+import json
+from collections import Counter
+
+from action_store import ActionStore, new_action_id
+from journal import Journal
+from register_io import read_csv_register, read_json_register, read_snapshot, write_snapshot
+from risk_store import RiskStore
+from shared_register import SessionRegister
+from sqlite_backend import SqliteBackend
+
+PROCESSES = [
+    "DIRECTION", "INTERNATIONAL", "PERFORMANCE", "DEVELOPPEMENT_NATIONAL",
+    "DEVELOPPEMENT_INTERNATIONAL", "RSE", "GESTION_RISQUES", "FUSAC",
+    "INNOV_TRANSFO", "VENTE", "MAGASIN", "LOGISTIQUE", "APPROVISONNEMENT",
+    "ACHATS", "SAV", "IMPORT", "FINANCEMENT", "AUTRES_MODES_VENTE",
+    "VALO_DECHETS", "QUALITE", "VENTE WEB", "FRANCHISE", "COMPTABILITE",
+    "DSI", "RH", "MARKETING", "ORGANISATION", "TECHNIQUE", "JURIDIQUE", "SECURITE"
+]
+
+# Un bit par processus : l'appartenance à un processus est un test exact sur un entier
+PROCESS_BITS = {process: 1 << i for i, process in enumerate(PROCESSES)}
+
+MEASURE_TYPES = {
+    "D": "Détection",
+    "R": "Réduction",
+    "A": "Acceptation",
+    "F": "Refus",
+    "T": "Transfert"
+}
+
+MEASURE_STATUS = [
+    "Non évalué",
+    "Efficace",
+    "Partiellement efficace",
+    "Insuffisant",
+    "Critique"
+]
+
+ACTION_STATUS = [
+    "À faire",
+    "En cours",
+    "En attente",
+    "Terminé",
+    "Annulé"
+]
+
+ACTION_PRIORITY = [
+    "BASSE",
+    "NORMALE",
+    "HAUTE",
+    "CRITIQUE"
+]
+
+# Unité de progression de chaque format d'import (et d'export)
+FILE_UNITS = {"json": "familles", "csv": "lignes", "snapshot": "enregistrements"}
+# Snapshot : état complet compressé (voir register_io.write_snapshot)
+SNAPSHOT_SUFFIX = ".carto.gz"
+
+MEASURE_COLUMNS = ["id", "famille", "risque", "processus", "process_mask", "type", "mesure", "statut", "performance"]
+ACTION_COLUMNS = ["id", "mesure_id", "description", "responsable", "deadline", "statut", "priorite", "commentaire"]
+
+
+# Stockage persistant
+def open_backend(sqlite_path=None, journal_dir=None):
+    """Stockage persistant : SQLite s'il est configuré, sinon journal, sinon None"""
+    if sqlite_path:
+        return SqliteBackend(sqlite_path)
+    return Journal(journal_dir, MEASURE_TYPES) if journal_dir else None
+
+
+# Exports
+def save_to_json(risk_families, progress=None):
+    """Exporte les données en JSON"""
+    # Famille par famille (même texte que json.dumps(..., indent=2)) : la progression est suivie
+    parts = []
+    for i, (family_key, family_data) in enumerate(risk_families.items()):
+        family_json = json.dumps(family_data, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        parts.append(f"  {json.dumps(family_key, ensure_ascii=False)}: {family_json}")
+        if progress:
+            progress((i + 1) / len(risk_families), i + 1)
+    return ("{\n" + ",\n".join(parts) + "\n}" if parts else "{}").encode()
+
+
+def save_to_csv(risk_families, progress=None):
+    """Exporte les données en CSV"""
+    import pandas as pd
+
+    rows = []
+    for i, (family_key, family_data) in enumerate(risk_families.items()):
+        if progress:
+            progress(i / len(risk_families), len(rows))
+        for risk_key, risk_data in family_data["risks"].items():
+            for measure_type, measures in risk_data["measures"].items():
+                for measure in measures:
+                    rows.append({
+                        "family": family_key,
+                        "family_name": family_data["name"],
+                        "risk_name": risk_key.split(" - ")[1],
+                        "description": risk_data["description"],
+                        "processes": "|".join(risk_data["processes"]),
+                        "measure_type": measure_type,
+                        "measure_id": measure["id"],
+                        "measure": measure["text"]
+                    })
+
+    if rows:
+        return pd.DataFrame(rows).to_csv(index=False).encode()
+    return b""
+
+
+def save_to_snapshot(risk_families, actions, measure_status, measure_performance, progress=None):
+    """Exporte l'état complet (registre, actions, évaluations) en snapshot compressé"""
+    report = None
+    if progress:
+        total = sum(1 + len(f["risks"]) for f in risk_families.values()) + len(actions) + len(
+            measure_status.keys() | measure_performance.keys()
+        )
+
+        def report(count):
+            progress(count / max(total, 1), count)
+    buffer = io.BytesIO()
+    write_snapshot(buffer, risk_families, actions, measure_status, measure_performance, progress=report)
+    return buffer.getvalue()
+
+
+# Exports : sérialiseur, type MIME et extension par format
+EXPORT_FORMATS = {
+    "json": (save_to_json, "application/json", ".json"),
+    "csv": (save_to_csv, "text/csv", ".csv"),
+    "snapshot": (save_to_snapshot, "application/gzip", SNAPSHOT_SUFFIX)
+}
+
+
+def build_measures_report(risk_families, measure_status, measure_performance, action_counts,
+                          process="Tous", progress=None):
+    """Rapport CSV des mesures (évaluation et nombre d'actions), éventuellement limité à un processus"""
+    import pandas as pd
+
+    rows = []
+    for i, (family_key, family_data) in enumerate(risk_families.items()):
+        if progress:
+            progress(i / len(risk_families), len(rows))
+        for risk_key, risk_data in family_data["risks"].items():
+            if process != "Tous" and process not in risk_data["processes"]:
+                continue
+            for measure_type, measures in risk_data["measures"].items():
+                for measure in measures:
+                    rows.append({
+                        "famille": family_key,
+                        "nom_famille": family_data["name"],
+                        "risque": risk_key,
+                        "processus": "|".join(risk_data["processes"]),
+                        "type": MEASURE_TYPES[measure_type],
+                        "mesure": measure["text"],
+                        "statut": measure_status.get(measure["id"], "Non évalué"),
+                        "evaluation": measure_performance.get(measure["id"], ""),
+                        "actions": action_counts.get(measure["id"], 0)
+                    })
+    return pd.DataFrame(rows).to_csv(index=False).encode() if rows else b""
+
+
+# Imports
+def detect_file_type(name, mime=None):
+    """Format d'un fichier d'après son nom (ou son type MIME) : json, csv ou snapshot"""
+    if name.endswith(SNAPSHOT_SUFFIX):
+        return "snapshot"
+    if mime is not None:
+        return "json" if mime == "application/json" else "csv"
+    return "json" if name.lower().endswith(".json") else "csv"
+
+
+def parse_upload(source, file_type, progress=None):
+    """Lit un fichier importé depuis un flux binaire
+
+    Retourne l'état à importer : ``{"families"}`` pour un JSON ou un CSV,
+    avec en plus actions et évaluations pour un snapshot.
+    """
+    if file_type == "snapshot":
+        return read_snapshot(source, MEASURE_TYPES, progress=progress)
+    if file_type == "json":
+        # Décodage au fil de l'eau : ni copie str du fichier entier, ni arbre JSON intermédiaire
+        text_stream = io.TextIOWrapper(source, encoding="utf-8")
+        try:
+            return {"families": read_json_register(text_stream, MEASURE_TYPES, progress=progress)}
+        finally:
+            text_stream.detach()
+    return {"families": read_csv_register(source, MEASURE_TYPES, progress=progress)}
+
+
+# Résumé d'une fusion : (libellé, accords singulier / pluriel de chaque statut)
+MERGE_SUMMARY_WORDS = {
+    "families": ("familles", {"added": ("ajoutée", "ajoutées"), "updated": ("mise à jour", "mises à jour"),
+                              "unchanged": ("inchangée", "inchangées")}),
+    "risks": ("risques", {"added": ("ajouté", "ajoutés"), "updated": ("mis à jour", "mis à jour"),
+                          "unchanged": ("inchangé", "inchangés")}),
+    "measures": ("mesures", {"added": ("ajoutée", "ajoutées"), "updated": ("mise à jour", "mises à jour"),
+                             "unchanged": ("inchangée", "inchangées")})
+}
+
+
+def merge_summary_text(summary):
+    """Résumé lisible d'une fusion : ajoutés, mis à jour et inchangés par niveau"""
+    parts = []
+    for level, (label, words) in MERGE_SUMMARY_WORDS.items():
+        details = [
+            f"{summary[level][status]} {forms[summary[level][status] > 1]}"
+            for status, forms in words.items() if summary[level][status]
+        ]
+        parts.append(f"{label} : {', '.join(details) or 'aucun changement'}")
+    return " ; ".join(parts)
+
+
+def categorical(values, categories):
+    """Colonne catégorielle ; les valeurs hors de la liste sont ajoutées en fin de catégories"""
+    import pandas as pd
+
+    extra = sorted(set(values).difference(categories))
+    return pd.Categorical(values, categories=[*categories, *extra])
+
+
+def new_state():
+    """État de travail vide (mêmes clés que la session Streamlit)"""
+    return {
+        "risk_store": RiskStore(measure_types=MEASURE_TYPES),
+        "action_store": ActionStore(),
+        "measure_status": {},
+        "measure_performance": {},
+        "data_version": 0,
+        "db_revision": None
+    }
+
+
+class Workspace:
+    """Registre, actions et évaluations, avec stockage persistant optionnel
+
+    ``state`` est un mapping aux clés de ``new_state()`` (``st.session_state``
+    dans l'interface) ; ``risk_store`` y est un ``RiskStore`` ou un
+    ``SessionRegister``. Chaque modification est répercutée dans ``backend``
+    (SqliteBackend, Journal ou None) et incrémente ``data_version``, qui
+    invalide les caches de l'interface.
+    """
+
+    def __init__(self, state=None, backend=None):
+        self.state = new_state() if state is None else state
+        self.backend = backend
+
+    @classmethod
+    def open(cls, sqlite_path=None, journal_dir=None):
+        """Espace de travail chargé depuis le stockage persistant"""
+        workspace = cls(backend=open_backend(sqlite_path, journal_dir))
+        workspace.sync()
+        return workspace
+
+    @property
+    def risk_store(self):
+        return self.state["risk_store"]
+
+    @property
+    def action_store(self):
+        return self.state["action_store"]
+
+    @property
+    def measure_status(self):
+        return self.state["measure_status"]
+
+    @property
+    def measure_performance(self):
+        return self.state["measure_performance"]
+
+    @property
+    def families(self):
+        return self.state["risk_store"].families
+
+    def touch(self):
+        """Signale une modification (invalide les exports et tableaux en cache)"""
+        self.state["data_version"] += 1
+
+    # Stockage persistant
+    def persist(self, operation, *args):
+        """Répercute une écriture dans le stockage persistant s'il est activé"""
+        if self.backend is None:
+            return
+        self._publish(self._write_backend(operation, *args))
+
+    def _write_backend(self, operation, *args):
+        """Écrit dans le stockage persistant (activé) et retourne sa nouvelle révision"""
+        previous = self.state.get("db_revision")
+        revision = getattr(self.backend, operation)(*args)
+        # Si une autre session a écrit entre-temps, la révision saute : on laisse
+        # sync recharger le registre au prochain appel
+        if previous is not None and revision == previous + 1:
+            self.state["db_revision"] = revision
+        return revision
+
+    def _publish(self, revision):
+        """Avec un stockage, chaque modification est publiée aussitôt écrite"""
+        store = self.risk_store
+        if isinstance(store, SessionRegister):
+            store.commit(revision)
+
+    def sync(self):
+        """Recharge l'état si le stockage a changé depuis le dernier chargement ; True si rechargé"""
+        backend = self.backend
+        if backend is None:
+            return False
+        revision = backend.revision()
+        if self.state.get("db_revision") == revision:
+            return False
+        store = self.risk_store
+        if isinstance(store, SessionRegister):
+            # Lu une seule fois par révision pour toutes les sessions
+            state = store.shared.sync(revision, lambda: backend.load_state(MEASURE_TYPES))
+            store.discard()
+            store.refresh()
+        else:
+            state = backend.load_state(MEASURE_TYPES)
+            store.load(state["families"])
+        # Actions et évaluations restent propres à chaque session (copies)
+        self.action_store.load({action_id: dict(action) for action_id, action in state["actions"].items()})
+        self.state["measure_status"] = dict(state["measure_status"])
+        self.state["measure_performance"] = dict(state["measure_performance"])
+        self.state["db_revision"] = revision
+        self.touch()
+        return True
+
+    # Registre
+    def add_family(self, family_key, family_name):
+        """Ajoute une nouvelle famille de risques"""
+        if family_key and family_name:
+            self.risk_store.add_family(family_key, family_name)
+            self.persist("add_family", family_key, family_name)
+            self.touch()
+
+    def add_risk(self, family_key, risk_name, description, processes=None):
+        """Ajoute un nouveau risque à une famille"""
+        if not risk_name:
+            return
+        risk_key = f"{family_key} - {risk_name}"
+        self.risk_store.add_risk(family_key, risk_key, description, processes or [])
+        self.persist("add_risk", family_key, risk_key, description, processes or [])
+        self.touch()
+
+    def add_measure(self, family_key, risk_key, measure_type, measure_text):
+        """Ajoute une ou plusieurs mesures à un risque"""
+        if measure_text:
+            # Sépare le texte en mesures individuelles basées sur les sauts de ligne
+            texts = [m.strip() for m in measure_text.split('\n') if m.strip()]
+            measures = self.risk_store.add_measures(family_key, risk_key, measure_type, texts)
+            self.persist("add_measures", family_key, risk_key, measure_type, measures)
+            self.touch()
+
+    def delete_risk(self, family_key, risk_key):
+        """Supprime un risque"""
+        if self.risk_store.delete_risk(family_key, risk_key):
+            self.persist("delete_risk", family_key, risk_key)
+            self.touch()
+
+    def delete_measure(self, family_key, risk_key, measure_type, measure_index):
+        """Supprime une mesure"""
+        if self.risk_store.delete_measure(family_key, risk_key, measure_type, measure_index):
+            self.persist("delete_measure", family_key, risk_key, measure_type, measure_index)
+            self.touch()
+
+    def import_state(self, state):
+        """Remplace l'état par un état importé (voir parse_upload)
+
+        Le stockage est écrit avant la mémoire : un état qu'il refuse laisse
+        la session inchangée.
+        """
+        revision = None
+        if self.backend is not None:
+            if "actions" in state:
+                revision = self._write_backend(
+                    "replace_state", state["families"], state["actions"],
+                    state["measure_status"], state["measure_performance"]
+                )
+            else:
+                revision = self._write_backend("replace_register", state["families"])
+        self.risk_store.load(state["families"])
+        if "actions" in state:
+            self.action_store.load(state["actions"])
+            self.state["measure_status"] = state["measure_status"]
+            self.state["measure_performance"] = state["measure_performance"]
+        if self.backend is not None:
+            self._publish(revision)
+        self.touch()
+
+    def merge_state(self, state):
+        """Fusionne le registre d'un état importé (voir RiskStore.merge) ; retourne le résumé
+
+        Rien n'est supprimé ; les actions et évaluations d'un snapshot ne sont pas reprises.
+        """
+        summary, operations = self.risk_store.merge(state["families"])
+        if operations:
+            self.persist("merge_register", operations)
+            self.touch()
+        return summary
+
+    # Actions et évaluations
+    def add_action(self, measure_id, description, responsable, deadline, priorite="NORMALE"):
+        """Ajoute une nouvelle action"""
+        action_id = new_action_id()
+        action = self.action_store.add(action_id, {
+            "measure_id": measure_id,
+            "description": description,
+            "responsable": responsable,
+            "deadline": deadline,
+            "statut": "À faire",
+            "priorite": priorite,
+            "commentaire": ""
+        })
+        self.persist("save_action", action_id, action)
+        self.touch()
+        return action_id
+
+    def update_action(self, action_id, **kwargs):
+        """Met à jour une action existante"""
+        action = self.action_store.update(action_id, **kwargs)
+        if action is not None:
+            self.persist("save_action", action_id, action)
+            self.touch()
+
+    def delete_action(self, action_id):
+        """Supprime une action"""
+        if self.action_store.delete(action_id):
+            self.persist("delete_action", action_id)
+            self.touch()
+
+    def update_measure_status(self, measure_id, status, performance):
+        """Met à jour le statut et la performance d'une mesure"""
+        self.measure_status[measure_id] = status
+        self.measure_performance[measure_id] = performance
+        self.persist("update_measure_status", measure_id, status, performance)
+        self.touch()
+
+    def update_measure_statuses(self, updates):
+        """Met à jour plusieurs mesures en une seule écriture : {measure_id: (statut, performance)}"""
+        measure_status = self.measure_status
+        measure_performance = self.measure_performance
+        for measure_id, (status, performance) in updates.items():
+            measure_status[measure_id] = status
+            measure_performance[measure_id] = performance
+        self.persist("update_measure_statuses", updates)
+        self.touch()
+
+    # Lecture
+    def measures_frame(self):
+        """DataFrame des mesures avec leur contexte"""
+        import pandas as pd
+
+        measures_data = []
+        measure_status = self.measure_status
+        measure_performance = self.measure_performance
+        for family_key, family_data in self.families.items():
+            for risk_key, risk_data in family_data["risks"].items():
+                risk_name = risk_key.split(" - ")[1]
+                processes = ", ".join(risk_data["processes"])
+                process_mask = 0
+                for process in risk_data["processes"]:
+                    process_mask |= PROCESS_BITS.get(process, 0)
+                for measure_type, measures in risk_data["measures"].items():
+                    for measure in measures:
+                        measure_id = measure["id"]
+                        measures_data.append((
+                            measure_id,
+                            family_data["name"],
+                            risk_name,
+                            processes,
+                            process_mask,
+                            MEASURE_TYPES[measure_type],
+                            measure["text"],
+                            measure_status.get(measure_id, "Non évalué"),
+                            measure_performance.get(measure_id)
+                        ))
+        df = pd.DataFrame(measures_data, columns=MEASURE_COLUMNS)
+        df["process_mask"] = df["process_mask"].astype("int64")
+        df["famille"] = categorical(df["famille"], sorted(set(df["famille"])))
+        df["type"] = categorical(df["type"], list(MEASURE_TYPES.values()))
+        df["statut"] = categorical(df["statut"], MEASURE_STATUS)
+        return df
+
+    def actions_frame(self):
+        """DataFrame des actions"""
+        import pandas as pd
+
+        actions_data = [
+            (
+                action_id,
+                action["measure_id"],
+                action["description"],
+                action["responsable"],
+                action["deadline"],
+                action["statut"],
+                action["priorite"],
+                action["commentaire"]
+            )
+            for action_id, action in self.action_store.actions.items()
+        ]
+        df = pd.DataFrame(actions_data, columns=ACTION_COLUMNS)
+        df["statut"] = categorical(df["statut"], ACTION_STATUS)
+        df["priorite"] = categorical(df["priorite"], ACTION_PRIORITY)
+        return df
+
+    def process_stats(self, process):
+        """Statistiques de couverture d'un processus"""
+        return self.risk_store.coverage.process_stats(process)
+
+    def coverage_cube(self):
+        """Cube processus × famille × type de mesure : (familles, risques, mesures)"""
+        store = self.risk_store
+        families = list(store.families)
+        risks, measures = store.coverage.cube(PROCESSES, families)
+        return families, risks, measures
+
+    def export(self, fmt, progress=None):
+        """Export au format ``fmt`` (json, csv ou snapshot)"""
+        serializer = EXPORT_FORMATS[fmt][0]
+        if fmt == "snapshot":
+            return serializer(
+                self.families, self.action_store.actions,
+                self.measure_status, self.measure_performance, progress=progress
+            )
+        return serializer(self.families, progress=progress)
+
+    def measures_report(self, process="Tous", progress=None):
+        """Rapport CSV des mesures (voir build_measures_report)"""
+        return build_measures_report(
+            self.families, self.measure_status, self.measure_performance,
+            self.action_store.count_by_measure(), process, progress
+        )
+
+    def validate(self):
+        """Contrôles de cohérence ; retourne la liste des anomalies (vide si tout est cohérent)"""
+        store = self.risk_store
+        problems = [f"compteurs de couverture divergents : {name}" for name in store.check_consistency()]
+        unknown_processes = sorted({
+            process
+            for family_data in store.families.values()
+            for risk_data in family_data["risks"].values()
+            for process in risk_data["processes"]
+            if process not in PROCESS_BITS
+        })
+        if unknown_processes:
+            problems.append(f"processus inconnus : {', '.join(unknown_processes)}")
+        measure_ids = Counter(
+            measure["id"]
+            for family_data in store.families.values()
+            for risk_data in family_data["risks"].values()
+            for measures in risk_data["measures"].values()
+            for measure in measures
+        )
+        duplicates = sorted(measure_id for measure_id, count in measure_ids.items() if count > 1)
+        if duplicates:
+            problems.append(f"{len(duplicates)} identifiant(s) de mesure en double : {', '.join(duplicates[:5])}")
+        orphans = [
+            action_id for action_id, action in self.action_store.actions.items()
+            if store.locate_measure(action["measure_id"]) is None
+        ]
+        if orphans:
+            problems.append(f"{len(orphans)} action(s) rattachée(s) à une mesure inexistante")
+        evaluated = self.measure_status.keys() | self.measure_performance.keys()
+        stale = sum(1 for measure_id in evaluated if store.locate_measure(measure_id) is None)
+        if stale:
+            problems.append(f"{stale} évaluation(s) de mesures inexistantes")
+        return problems
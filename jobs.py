@@ -0,0 +1,158 @@
+"""Tâches d'arrière-plan : imports, exports et rapports hors du thread du script
+
+Un ``JobPool`` (un par serveur) exécute les tâches de toutes les sessions
+dans un nombre fixe de threads. Chaque session ne peut avoir que
+``max_per_owner`` tâches en attente ou en cours : un gros import d'un
+utilisateur ne monopolise pas les threads des autres.
+
+La fonction d'une tâche reçoit le ``Job`` en premier argument et publie sa
+progression par ``job.progress(...)`` ; c'est aussi là qu'une annulation
+demandée par la session l'interrompt (``JobCancelled``). Le résultat reste
+dans le ``Job`` jusqu'à ce que la session le récupère.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+
+class JobCancelled(Exception):
+    """Levée dans la tâche à son prochain point de progression après une annulation"""
+
+
+class JobLimitError(RuntimeError):
+    """Trop de tâches en attente ou en cours pour une même session"""
+
+
+class Job:
+    """Tâche soumise au pool
+
+    ``status`` passe de queued à running puis done, error ou cancelled.
+    ``fraction`` (0 à 1, None si inconnue) et ``count`` décrivent la
+    progression ; ``result`` ou ``error`` le résultat.
+    """
+
+    def __init__(self, job_id, owner, kind, label, unit=""):
+        self.id = job_id
+        self.owner = owner
+        self.kind = kind
+        self.label = label
+        self.unit = unit
+        self.status = QUEUED
+        self.fraction = None
+        self.count = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+        self.future = None
+
+    @property
+    def active(self):
+        return self.status in ACTIVE
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def progress(self, fraction=None, count=None):
+        """Publie la progression ; lève JobCancelled si la tâche a été annulée"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        if fraction is not None:
+            self.fraction = min(max(fraction, 0.0), 1.0)
+        if count is not None:
+            self.count = count
+
+    def cancel(self):
+        """Demande l'annulation : immédiate si la tâche attend encore, sinon au prochain point de progression"""
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self._finish(CANCELLED)
+
+    def _finish(self, status, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+        self.status = status
+
+
+class JobPool:
+    """Threads partagés par les sessions, avec un plafond de tâches par session"""
+
+    def __init__(self, max_workers=3, max_per_owner=2, keep_seconds=3600):
+        self.max_workers = max_workers
+        self.max_per_owner = max_per_owner
+        # Durée de conservation d'un résultat jamais récupéré (session fermée)
+        self.keep_seconds = keep_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="carto-job")
+        self._lock = threading.Lock()
+        self._ids = count(1)
+        self._jobs = {}
+
+    def submit(self, owner, kind, label, func, *args, unit=""):
+        """Soumet ``func(job, *args)`` pour la session ``owner`` et retourne le Job
+
+        Lève JobLimitError si la session a déjà ``max_per_owner`` tâches actives.
+        """
+        with self._lock:
+            self._evict()
+            active = sum(1 for job in self._jobs.values() if job.owner == owner and job.active)
+            if active >= self.max_per_owner:
+                raise JobLimitError(
+                    f"{active} tâche(s) déjà en cours : attendez leur fin ou annulez-en une"
+                )
+            job = Job(next(self._ids), owner, kind, label, unit)
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job, func, args):
+        if job.cancel_requested:
+            job._finish(CANCELLED)
+            return
+        job.status = RUNNING
+        try:
+            result = func(job, *args)
+        except JobCancelled:
+            job._finish(CANCELLED)
+        except Exception as e:
+            job._finish(ERROR, error=str(e))
+        else:
+            job.fraction = 1.0
+            job._finish(DONE, result=result)
+
+    def _evict(self):
+        limit = time.time() - self.keep_seconds
+        for job_id in [i for i, job in self._jobs.items() if job.finished is not None and job.finished < limit]:
+            del self._jobs[job_id]
+
+    def jobs_for(self, owner):
+        """Tâches d'une session, dans l'ordre de soumission"""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.owner == owner]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def forget(self, job_id):
+        """Retire une tâche terminée (son résultat est libéré) ; une tâche active est d'abord annulée"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None and job.active:
+            job.cancel()
+
+    def stats(self):
+        """Nombre de tâches par état, toutes sessions confondues"""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in (QUEUED, RUNNING, DONE, ERROR, CANCELLED)}
@@ -0,0 +1,312 @@
+import json
+import os
+import threading
+from datetime import date
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+from action_store import ActionStore
+from register_io import read_snapshot, read_snapshot_header, write_snapshot
+from risk_store import RiskStore
+
+JOURNAL_FILE = "journal.jsonl"
+SNAPSHOT_FILE = "snapshot.carto.gz"
+LOCK_FILE = "journal.lock"
+# Taille du journal au-delà de laquelle il est compacté en snapshot
+COMPACT_BYTES = 4 * 1024 * 1024
+
+
+def _encode_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"valeur non sérialisable : {type(value).__name__}")
+
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_encode_default)
+
+
+def replay(state, operation, args):
+    """Rejoue une opération du journal sur un état (voir Journal.load_state)"""
+    action_store = state["action_store"]
+    if operation == "save_action":
+        action_store.add(*args)
+    elif operation == "delete_action":
+        action_store.delete(*args)
+    elif operation == "update_measure_status":
+        measure_id, status, performance = args
+        state["measure_status"][measure_id] = status
+        state["measure_performance"][measure_id] = performance
+    elif operation == "update_measure_statuses":
+        for measure_id, (status, performance) in args[0].items():
+            state["measure_status"][measure_id] = status
+            state["measure_performance"][measure_id] = performance
+    elif operation == "merge_register":
+        for merge_operation, merge_args in args[0]:
+            state["risk_store"].apply(merge_operation, *merge_args)
+    else:
+        # Opérations du registre : add_family, add_risk, add_measures, delete_*
+        state["risk_store"].apply(operation, *args)
+
+
+class JournalLockedError(OSError):
+    """Le répertoire du journal est déjà ouvert par un autre processus (ou un autre Journal)"""
+
+
+class Journal:
+    """Persistance par journal d'opérations et snapshot périodique
+
+    Chaque écriture ajoute une ligne ``{"seq", "op", "args"}`` à
+    ``journal.jsonl`` (forcée sur disque) : son coût est proportionnel au
+    changement, pas au registre. Au-delà de ``compact_bytes``, un thread
+    rejoue le journal sur le dernier snapshot et écrit un nouveau snapshot
+    (numéro de séquence dans ses métadonnées), puis ne garde dans le journal
+    que les opérations postérieures. Le chargement lit le snapshot et rejoue
+    les opérations de numéro supérieur : un arrêt brutal, même pendant un
+    compactage, ne perd que la ligne en cours d'écriture.
+
+    Mêmes méthodes d'écriture que SqliteBackend ; chacune retourne le
+    numéro de séquence, qui sert de révision.
+
+    Un seul processus peut ouvrir un répertoire de journal : le numéro de
+    séquence n'est tenu qu'en mémoire et un import remplace le fichier du
+    journal. Un verrou exclusif (``journal.lock``) est pris à l'ouverture ;
+    une seconde ouverture lève JournalLockedError. Pour partager un stockage
+    entre l'interface et des traitements par lots, utiliser SQLite.
+    """
+
+    def __init__(self, directory, measure_types, compact_bytes=COMPACT_BYTES):
+        self.directory = directory
+        self.measure_types = list(measure_types)
+        self.compact_bytes = compact_bytes
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self._lock = threading.RLock()
+        self._compacting = False
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = self._acquire_directory(directory)
+        self.base_seq = self._snapshot_seq()
+        self.seq = self.base_seq
+        self._recover()
+        self._file = open(self.journal_path, "ab")
+
+    @staticmethod
+    def _acquire_directory(directory):
+        """Verrou exclusif du répertoire, gardé jusqu'à close()"""
+        lock_file = open(os.path.join(directory, LOCK_FILE), "a")
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise JournalLockedError(
+                f"journal {directory} déjà ouvert par un autre processus : "
+                "arrêtez l'interface ou utilisez un stockage SQLite (--sqlite)"
+            ) from None
+        return lock_file
+
+    def _snapshot_seq(self):
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        with open(self.snapshot_path, "rb") as f:
+            return read_snapshot_header(f).get("metadata", {}).get("seq", 0)
+
+    def _recover(self):
+        """Tronque une dernière ligne incomplète (arrêt pendant une écriture) et relit le dernier numéro"""
+        if not os.path.exists(self.journal_path):
+            return
+        valid_bytes = 0
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                valid_bytes += len(line)
+                self.seq = max(self.seq, record["seq"])
+        if valid_bytes < os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(valid_bytes)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            # Fermer le fichier libère le verrou
+            self._lock_file.close()
+
+    # Révisions
+    def revision(self):
+        with self._lock:
+            return self.seq
+
+    # Lecture
+    def _iter_operations(self, after, until=None):
+        """Opérations du journal de numéro supérieur à ``after`` (et au plus ``until``)
+
+        Le compactage lit le journal hors verrou : une dernière ligne sans fin
+        de ligne, en cours d'écriture, est ignorée comme dans _recover.
+        """
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                if until is not None and record["seq"] > until:
+                    break
+                if record["seq"] > after:
+                    yield record
+
+    def _read_state(self, measure_types, until=None):
+        """Snapshot + rejeu du journal (jusqu'à ``until`` inclus) ; retourne (état, numéro atteint)"""
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = read_snapshot(f, measure_types)
+        else:
+            snapshot = {"families": {}, "actions": {}, "measure_status": {}, "measure_performance": {}}
+        seq = snapshot.get("metadata", {}).get("seq", 0)
+        state = {
+            "risk_store": RiskStore(snapshot["families"], measure_types),
+            "action_store": ActionStore(snapshot["actions"]),
+            "measure_status": snapshot["measure_status"],
+            "measure_performance": snapshot["measure_performance"]
+        }
+        for record in self._iter_operations(seq, until):
+            replay(state, record["op"], record["args"])
+            seq = record["seq"]
+        return state, seq
+
+    def load_state(self, measure_types):
+        """État complet : ``{"families", "actions", "measure_status", "measure_performance"}``"""
+        with self._lock:
+            state, _ = self._read_state(measure_types)
+        return {
+            "families": state["risk_store"].families,
+            "actions": state["action_store"].actions,
+            "measure_status": state["measure_status"],
+            "measure_performance": state["measure_performance"]
+        }
+
+    # Écriture
+    def _append(self, operation, *args):
+        with self._lock:
+            self.seq += 1
+            line = _ENCODER.encode({"seq": self.seq, "op": operation, "args": args}) + "\n"
+            self._file.write(line.encode())
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            seq = self.seq
+            compact = not self._compacting and self._file.tell() > self.compact_bytes
+            if compact:
+                self._compacting = True
+        if compact:
+            threading.Thread(target=self._compact, name="carto-journal-compact", daemon=True).start()
+        return seq
+
+    def _write_snapshot(self, families, actions, measure_status, measure_performance, seq):
+        """Écrit un snapshot de numéro ``seq`` dans un fichier temporaire (mis en place par os.replace)"""
+        tmp_path = f"{self.snapshot_path}.{seq}.tmp"
+        with open(tmp_path, "wb") as f:
+            write_snapshot(f, families, actions, measure_status, measure_performance, metadata={"seq": seq})
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path
+
+    def _truncate_journal(self, after):
+        """Réécrit le journal sans les opérations de numéro inférieur ou égal à ``after``"""
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for record in self._iter_operations(after):
+                f.write((_ENCODER.encode(record) + "\n").encode())
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.journal_path)
+        self._file = open(self.journal_path, "ab")
+
+    def compact(self):
+        """Écrit un snapshot de l'état courant et vide le journal (sans effet si un compactage est en cours)"""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        self._compact()
+
+    def _compact(self):
+        try:
+            with self._lock:
+                until = self.seq
+            # Lecture et écriture hors verrou : les sessions continuent d'écrire dans le journal
+            state, seq = self._read_state(self.measure_types, until)
+            tmp_path = self._write_snapshot(
+                state["risk_store"].families,
+                state["action_store"].actions,
+                state["measure_status"],
+                state["measure_performance"],
+                seq
+            )
+            with self._lock:
+                if self.base_seq > seq:
+                    # Un import a remplacé le registre entre-temps : ce snapshot est périmé
+                    os.remove(tmp_path)
+                    return
+                os.replace(tmp_path, self.snapshot_path)
+                self.base_seq = seq
+                self._truncate_journal(seq)
+        finally:
+            self._compacting = False
+
+    def replace_state(self, families, actions, measure_status, measure_performance):
+        """Remplace tout l'état (import) : un snapshot suffit, le journal est vidé"""
+        with self._lock:
+            seq = self.seq + 1
+            tmp_path = self._write_snapshot(families, actions, measure_status, measure_performance, seq)
+            os.replace(tmp_path, self.snapshot_path)
+            self.seq = self.base_seq = seq
+            self._truncate_journal(seq)
+            return seq
+
+    def replace_register(self, families):
+        """Remplace le registre ; actions et évaluations sont conservées"""
+        with self._lock:
+            state = self.load_state(self.measure_types)
+            return self.replace_state(
+                families, state["actions"], state["measure_status"], state["measure_performance"]
+            )
+
+    def merge_register(self, operations):
+        """Fusion d'un import : ses opérations élémentaires en une seule ligne"""
+        return self._append("merge_register", operations)
+
+    def add_family(self, family_key, family_name):
+        return self._append("add_family", family_key, family_name)
+
+    def add_risk(self, family_key, risk_key, description, processes):
+        return self._append("add_risk", family_key, risk_key, description, processes)
+
+    def add_measures(self, family_key, risk_key, measure_type, measures):
+        return self._append("add_measures", family_key, risk_key, measure_type, measures)
+
+    def delete_risk(self, family_key, risk_key):
+        return self._append("delete_risk", family_key, risk_key)
+
+    def delete_measure(self, family_key, risk_key, measure_type, measure_index):
+        return self._append("delete_measure", family_key, risk_key, measure_type, measure_index)
+
+    def save_action(self, action_id, action):
+        return self._append("save_action", action_id, action)
+
+    def delete_action(self, action_id):
+        return self._append("delete_action", action_id)
+
+    def update_measure_status(self, measure_id, status, performance):
+        return self._append("update_measure_status", measure_id, status, performance)
+
+    def update_measure_statuses(self, updates):
+        return self._append("update_measure_statuses", updates)
@@ -0,0 +1,269 @@
+"""Instrumentation des reruns : durée de chaque section du script et nombre de widgets
+
+Activée par ``profile = true`` dans la section ``[carto]`` de ``config.toml``
+ou par la variable d'environnement ``CARTO_PROFILE=1`` (qui l'emporte).
+Désactivée, ``section`` renvoie un contexte vide partagé, ``mark`` ne fait
+rien et ``timed`` laisse la fonction décorée inchangée.
+
+Chaque rerun produit un enregistrement (durées par section, widgets créés
+par type) ajouté à l'historique de la session et écrit sur une ligne du
+journal JSON ``profile_log``. Résumé p50/p95 d'un journal :
+
+    python profiling.py [carto_profile.jsonl]
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tomllib
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent
+DEFAULT_SETTINGS = {"profile": False, "profile_log": "carto_profile.jsonl", "profile_history": 200}
+
+# Fonctions Streamlit qui créent un widget
+WIDGET_FUNCTIONS = (
+    "button", "download_button", "form_submit_button", "checkbox", "toggle", "radio",
+    "selectbox", "multiselect", "slider", "select_slider", "text_input", "text_area",
+    "number_input", "date_input", "time_input", "file_uploader", "color_picker",
+    "data_editor", "pills", "segmented_control", "feedback", "chat_input", "camera_input"
+)
+TOTAL = "total"
+
+
+def load_settings(path=APP_DIR / "config.toml"):
+    """Réglages de la section [carto] de config.toml, surchargés par l'environnement"""
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(path, "rb") as f:
+            settings.update(tomllib.load(f).get("carto", {}))
+    except (OSError, tomllib.TOMLDecodeError):
+        pass
+    if "CARTO_PROFILE" in os.environ:
+        settings["profile"] = os.environ["CARTO_PROFILE"].strip().lower() not in ("", "0", "false", "non")
+    settings["profile_log"] = os.environ.get("CARTO_PROFILE_LOG", settings["profile_log"])
+    return settings
+
+
+SETTINGS = load_settings()
+ENABLED = bool(SETTINGS["profile"])
+LOG_PATH = APP_DIR / SETTINGS["profile_log"] if SETTINGS["profile_log"] else None
+
+_NULL_CONTEXT = nullcontext()
+# Profil du rerun en cours : Streamlit exécute le script d'une session dans son propre thread
+_current = threading.local()
+_log_lock = threading.Lock()
+_widgets_installed = False
+
+
+class RerunProfile:
+    """Mesures d'un rerun
+
+    ``sections`` associe à chaque section (les sections imbriquées sont
+    nommées « parent/enfant ») sa durée cumulée en secondes, ``calls`` son
+    nombre d'exécutions et ``widgets`` le nombre de widgets créés par type.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sections = {}
+        self.calls = Counter()
+        self.widgets = Counter()
+        # Pile des sections ouvertes : [nom complet, instant du dernier repère]
+        self._stack = [["", self.start]]
+
+    def _record(self, name, seconds):
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+        self.calls[name] += 1
+
+    @contextmanager
+    def section(self, name):
+        parent = self._stack[-1][0]
+        full_name = f"{parent}/{name}" if parent else name
+        start = time.perf_counter()
+        self._stack.append([full_name, start])
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._stack.pop()
+            self._record(full_name, end - start)
+            # Le repère du parent avance : mark ne recompte pas la section
+            self._stack[-1][1] = end
+
+    def mark(self, name):
+        """Attribue à ``name`` le temps écoulé depuis le repère précédent de la section courante"""
+        now = time.perf_counter()
+        frame = self._stack[-1]
+        self._record(f"{frame[0]}/{name}" if frame[0] else name, now - frame[1])
+        frame[1] = now
+
+    def to_record(self):
+        return {
+            TOTAL: time.perf_counter() - self.start,
+            "sections": self.sections,
+            "calls": dict(self.calls),
+            "widgets": dict(self.widgets)
+        }
+
+
+def current():
+    """Profil du rerun en cours dans ce thread (None si désactivé ou hors script)"""
+    return getattr(_current, "profile", None) if ENABLED else None
+
+
+def section(name):
+    """Contexte chronométrant un bloc ; contexte vide si l'instrumentation est désactivée"""
+    profile = current()
+    if profile is None:
+        return _NULL_CONTEXT
+    return profile.section(name)
+
+
+def mark(name):
+    """Repère de phase (voir RerunProfile.mark)"""
+    profile = current()
+    if profile is not None:
+        profile.mark(name)
+
+
+def timed(func):
+    """Décorateur chronométrant une fonction de données (sans effet si désactivé)"""
+    if not ENABLED:
+        return func
+    name = f"{func.__name__}()"
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = current()
+        if profile is None:
+            return func(*args, **kwargs)
+        # Section à la racine : la durée d'une fonction est agrégée quel que soit l'appelant
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile._record(name, time.perf_counter() - start)
+    return wrapper
+
+
+def _install_widget_counters():
+    """Compte les widgets créés en enveloppant les fonctions de Streamlit (une fois par processus)"""
+    global _widgets_installed
+    if _widgets_installed:
+        return
+    import streamlit as st
+    from streamlit.delta_generator import DeltaGenerator
+
+    def counted(func, widget):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = current()
+            if profile is not None:
+                profile.widgets[widget] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    for widget in WIDGET_FUNCTIONS:
+        # st.button est une méthode liée au conteneur principal : elle ne voit
+        # pas le remplacement de DeltaGenerator.button (utilisé par st.sidebar, colonnes…)
+        if hasattr(DeltaGenerator, widget):
+            setattr(DeltaGenerator, widget, counted(getattr(DeltaGenerator, widget), widget))
+        if hasattr(st, widget):
+            setattr(st, widget, counted(getattr(st, widget), widget))
+    _widgets_installed = True
+
+
+def start_rerun():
+    """Ouvre le profil du rerun ; None si l'instrumentation est désactivée"""
+    if not ENABLED:
+        return None
+    _install_widget_counters()
+    _current.profile = RerunProfile()
+    return _current.profile
+
+
+def percentile(values, q):
+    """Percentile par rang le plus proche (``q`` entre 0 et 100)"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(records):
+    """{section: (p50, p95, nombre de reruns)} en secondes, y compris le total"""
+    samples = {}
+    for record in records:
+        samples.setdefault(TOTAL, []).append(record[TOTAL])
+        for name, seconds in record["sections"].items():
+            samples.setdefault(name, []).append(seconds)
+    return {
+        name: (percentile(values, 50), percentile(values, 95), len(values))
+        for name, values in samples.items()
+    }
+
+
+def finish_rerun(profile, history, **context):
+    """Clôt le profil : l'ajoute à ``history`` (deque de la session) et l'écrit dans le journal
+
+    ``context`` (vue active, identifiant de session…) est recopié dans l'enregistrement.
+    """
+    _current.profile = None
+    record = profile.to_record()
+    history.append(record)
+    if LOG_PATH is not None:
+        p50, p95, _ = summarize(history)[TOTAL]
+        line = {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            **context,
+            "total_ms": round(record[TOTAL] * 1000, 3),
+            "session_p50_ms": round(p50 * 1000, 3),
+            "session_p95_ms": round(p95 * 1000, 3),
+            "sections_ms": {name: round(s * 1000, 3) for name, s in record["sections"].items()},
+            "calls": record["calls"],
+            "widgets": record["widgets"]
+        }
+        with _log_lock, open(LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    return record
+
+
+def read_log(path):
+    """Relit un journal JSON : enregistrements au format de ``summarize``"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                records.append({
+                    TOTAL: entry["total_ms"] / 1000,
+                    "sections": {name: ms / 1000 for name, ms in entry["sections_ms"].items()}
+                })
+    return records
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else LOG_PATH
+    if path is None:
+        # profile_log vide : aucun journal par défaut
+        raise SystemExit("usage : python profiling.py <journal.jsonl>")
+    try:
+        records = read_log(path)
+    except OSError as e:
+        raise SystemExit(f"journal illisible : {e}")
+    print(f"{len(records)} reruns")
+    print(f"{'section':<60} {'p50 (ms)':>10} {'p95 (ms)':>10} {'reruns':>7}")
+    summary = summarize(records)
+    for name, (p50, p95, n) in sorted(summary.items(), key=lambda item: -item[1][1]):
+        print(f"{name:<60} {p50 * 1000:>10.1f} {p95 * 1000:>10.1f} {n:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+from collections import ChainMap
+
+import numpy as np
+
+WORD_BITS = 64
+# Au-delà, les couches de l'index des lignes héritées des forks sont fusionnées
+MAX_ROW_LAYERS = 8
+# Tableaux et liste partagés avec l'original après un fork, copiés à la première écriture
+SHARED_FIELDS = ("masks", "counts", "family_codes", "valid", "refs")
+
+
+class RegisterArrays:
+    """Miroir colonnaire (NumPy) du registre, une ligne par risque
+
+    - ``masks`` : processus du risque, un bit par processus (mots de 64 bits) ;
+    - ``counts`` : nombre de mesures par type (risque × type de mesure) ;
+    - ``family_codes`` : code de la famille du risque.
+
+    Les filtres par processus (ET/OU) ou par famille et les taux de couverture
+    sont des opérations vectorisées sur ces tableaux. La mémoire est celle des
+    tableaux plus une référence (famille, risque) par ligne. Les lignes des
+    risques supprimés sont invalidées puis récupérées par compactage.
+
+    ``fork()`` partage les tableaux avec l'original : chacun n'est copié qu'à
+    sa première écriture, et l'index des lignes reçoit une couche propre.
+    """
+
+    def __init__(self, measure_types=(), capacity=1024):
+        self.measure_types = list(measure_types)
+        self._type_codes = {measure_type: i for i, measure_type in enumerate(self.measure_types)}
+        self.processes = []
+        self._process_bits = {}
+        self.families = []
+        self._family_codes = {}
+        # ligne -> (famille, risque), None pour une ligne supprimée
+        self.refs = []
+        self._rows = {}
+        self._live = 0
+        self._dead = 0
+        self._shared = set()
+        self.masks = np.zeros((capacity, 1), dtype=np.uint64)
+        self.counts = np.zeros((capacity, len(self.measure_types)), dtype=np.int32)
+        self.family_codes = np.zeros(capacity, dtype=np.int32)
+        self.valid = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self._live
+
+    @property
+    def size(self):
+        """Nombre de lignes utilisées (y compris les lignes invalidées)"""
+        return len(self.refs)
+
+    @classmethod
+    def build(cls, families, measure_types=()):
+        """Construit les tableaux en une passe sur le registre"""
+        arrays = cls(measure_types, capacity=0)
+        masks = []
+        family_codes = []
+        # Mesures non nulles : (ligne, code du type, nombre)
+        count_rows, count_cols, count_values = [], [], []
+        for family_key, family_data in families.items():
+            family_code = arrays._family_code(family_key)
+            for risk_key, risk_data in family_data["risks"].items():
+                row = len(arrays.refs)
+                arrays._rows[(family_key, risk_key)] = row
+                arrays.refs.append((family_key, risk_key))
+                family_codes.append(family_code)
+                masks.append(arrays._mask_of(risk_data.get("processes", [])))
+                for measure_type, measures in risk_data["measures"].items():
+                    if measures:
+                        count_rows.append(row)
+                        count_cols.append(arrays._type_code(measure_type))
+                        count_values.append(len(measures))
+
+        n_words = arrays.masks.shape[1]
+        arrays.masks = np.array(
+            [[(mask >> (WORD_BITS * w)) & (2 ** WORD_BITS - 1) for w in range(n_words)] for mask in masks],
+            dtype=np.uint64
+        ).reshape(len(masks), n_words)
+        arrays.counts = np.zeros((len(masks), len(arrays.measure_types)), dtype=np.int32)
+        arrays.counts[count_rows, count_cols] = count_values
+        arrays.family_codes = np.array(family_codes, dtype=np.int32)
+        arrays.valid = np.ones(len(masks), dtype=bool)
+        arrays._live = len(masks)
+        return arrays
+
+    def fork(self):
+        """Miroir modifiable partageant les tableaux de celui-ci, qui ne doit plus être modifié"""
+        arrays = RegisterArrays(self.measure_types, capacity=0)
+        # Dictionnaires de codes : quelques dizaines d'entrées, copiés d'emblée
+        arrays.processes = list(self.processes)
+        arrays._process_bits = dict(self._process_bits)
+        arrays.families = list(self.families)
+        arrays._family_codes = dict(self._family_codes)
+        for name in SHARED_FIELDS:
+            setattr(arrays, name, getattr(self, name))
+        arrays._shared = set(SHARED_FIELDS)
+        # None masque la ligne d'un risque supprimé dans le fork
+        layers = self._rows.maps if isinstance(self._rows, ChainMap) else [self._rows]
+        if len(layers) >= MAX_ROW_LAYERS:
+            layers = [{ref: row for ref, row in ChainMap(*layers).items() if row is not None}]
+        arrays._rows = ChainMap({}, *layers)
+        arrays._live = self._live
+        arrays._dead = self._dead
+        return arrays
+
+    def _writable(self, name):
+        """Tableau (ou liste) modifiable : dans un fork, copié à la première écriture"""
+        if name in self._shared:
+            setattr(self, name, getattr(self, name).copy())
+            self._shared.discard(name)
+        return getattr(self, name)
+
+    # Dictionnaires de codes
+    def _family_code(self, family_key):
+        code = self._family_codes.get(family_key)
+        if code is None:
+            code = self._family_codes[family_key] = len(self.families)
+            self.families.append(family_key)
+        return code
+
+    def _type_code(self, measure_type):
+        code = self._type_codes.get(measure_type)
+        if code is None:
+            code = self._type_codes[measure_type] = len(self.measure_types)
+            self.measure_types.append(measure_type)
+            self.counts = np.pad(self.counts, ((0, 0), (0, 1)))
+            self._shared.discard("counts")
+        return code
+
+    def _process_bit(self, process):
+        bit = self._process_bits.get(process)
+        if bit is None:
+            bit = self._process_bits[process] = len(self.processes)
+            self.processes.append(process)
+            if bit // WORD_BITS >= self.masks.shape[1]:
+                self.masks = np.pad(self.masks, ((0, 0), (0, 1)))
+                self._shared.discard("masks")
+        return bit
+
+    def _mask_of(self, processes):
+        mask = 0
+        for process in processes:
+            mask |= 1 << self._process_bit(process)
+        return mask
+
+    def _query_mask(self, processes):
+        """Masque (mots de 64 bits) des processus connus ; None si l'un est inconnu"""
+        words = np.zeros(self.masks.shape[1], dtype=np.uint64)
+        for process in processes:
+            bit = self._process_bits.get(process)
+            if bit is None:
+                return None
+            words[bit // WORD_BITS] |= np.uint64(1 << (bit % WORD_BITS))
+        return words
+
+    # Mises à jour incrémentales
+    def _grow(self):
+        capacity = max(1024, 2 * len(self.valid))
+        extra = capacity - len(self.valid)
+        self.masks = np.pad(self.masks, ((0, extra), (0, 0)))
+        self.counts = np.pad(self.counts, ((0, extra), (0, 0)))
+        self.family_codes = np.pad(self.family_codes, (0, extra))
+        self.valid = np.pad(self.valid, (0, extra))
+        self._shared.difference_update(("masks", "counts", "family_codes", "valid"))
+
+    def add_risk(self, family_key, risk_key, risk_data):
+        """Ajoute (ou remplace) la ligne d'un risque"""
+        self.remove_risk(family_key, risk_key)
+        mask = self._mask_of(risk_data.get("processes", []))
+        for measure_type, measures in risk_data["measures"].items():
+            if measures:
+                self._type_code(measure_type)
+        if self.size == len(self.valid):
+            self._grow()
+        row = self.size
+        self._rows[(family_key, risk_key)] = row
+        self._writable("refs").append((family_key, risk_key))
+        masks = self._writable("masks")
+        for w in range(masks.shape[1]):
+            masks[row, w] = (mask >> (WORD_BITS * w)) & (2 ** WORD_BITS - 1)
+        counts = self._writable("counts")
+        counts[row] = 0
+        for measure_type, measures in risk_data["measures"].items():
+            if measures:
+                counts[row, self._type_codes[measure_type]] = len(measures)
+        self._writable("family_codes")[row] = self._family_code(family_key)
+        self._writable("valid")[row] = True
+        self._live += 1
+
+    def remove_risk(self, family_key, risk_key):
+        """Invalide la ligne d'un risque"""
+        ref = (family_key, risk_key)
+        row = self._rows.get(ref)
+        if row is None:
+            return
+        if isinstance(self._rows, ChainMap):
+            self._rows[ref] = None
+        else:
+            del self._rows[ref]
+        self._writable("refs")[row] = None
+        self._writable("valid")[row] = False
+        self._live -= 1
+        self._dead += 1
+        if self._dead > 1024 and self._dead * 2 > self.size:
+            self._compact()
+
+    def add_measures(self, family_key, risk_key, measure_type, delta):
+        """Applique un delta au nombre de mesures d'un type pour un risque"""
+        code = self._type_code(measure_type)
+        self._writable("counts")[self._rows[(family_key, risk_key)], code] += delta
+
+    def _compact(self):
+        keep = np.flatnonzero(self.valid[:self.size])
+        self.masks = self.masks[keep]
+        self.counts = self.counts[keep]
+        self.family_codes = self.family_codes[keep]
+        self.valid = np.ones(len(keep), dtype=bool)
+        self.refs = [self.refs[row] for row in keep]
+        self._rows = {ref: row for row, ref in enumerate(self.refs)}
+        self._dead = 0
+        self._shared.clear()
+
+    # Requêtes vectorisées
+    def select(self, any_of=(), all_of=(), families=()):
+        """Sélectionne des lignes (tableau booléen)
+
+        Un risque est retenu s'il a au moins un processus de ``any_of`` (OU),
+        tous ceux de ``all_of`` (ET) et une famille de ``families`` ; un
+        critère vide ne filtre pas.
+        """
+        n = self.size
+        rows = self.valid[:n].copy()
+        masks = self.masks[:n]
+        if any_of:
+            words = self._query_mask([p for p in any_of if p in self._process_bits])
+            rows &= (masks & words).any(axis=1)
+        if all_of:
+            words = self._query_mask(all_of)
+            if words is None:
+                rows[:] = False
+            else:
+                rows &= ((masks & words) == words).all(axis=1)
+        if families:
+            codes = [self._family_codes[f] for f in families if f in self._family_codes]
+            rows &= np.isin(self.family_codes[:n], codes)
+        return rows
+
+    def select_process(self, process):
+        """Lignes des risques rattachés à un processus"""
+        return self.select(any_of=[process])
+
+    def refs_of(self, rows):
+        """Références (famille, risque) des lignes retenues, dans l'ordre d'ajout"""
+        return [self.refs[row] for row in np.flatnonzero(rows)]
+
+    def stats(self, rows):
+        """Statistiques de couverture d'une sélection de lignes"""
+        total_risks = int(np.count_nonzero(rows))
+        by_type = self.counts[:self.size][rows].sum(axis=0)
+        total_measures = int(by_type.sum())
+        by_family = np.bincount(self.family_codes[:self.size][rows], minlength=len(self.families))
+        return {
+            "total_risks": total_risks,
+            "measures_by_type": dict(zip(self.measure_types, by_type.tolist())),
+            "risks_by_family": {
+                self.families[code]: int(count) for code, count in enumerate(by_family) if count
+            },
+            "total_measures": total_measures,
+            "coverage_pct": (
+                total_measures / (total_risks * len(self.measure_types)) * 100 if total_risks else 0
+            )
+        }
+
+    def process_matrix(self):
+        """Appartenance risque × processus (tableau booléen, colonnes = ``processes``)"""
+        n = self.size
+        # Largeur explicite : -1 ne se déduit pas d'un registre vide
+        as_bytes = self.masks[:n].astype("<u8").view(np.uint8).reshape(n, self.masks.shape[1] * 8)
+        bits = np.unpackbits(as_bytes, axis=1, bitorder="little")[:, :len(self.processes)]
+        return bits.astype(bool) & self.valid[:n, None]
+
+    def totals_by_process(self):
+        """Nombre de risques et de mesures par processus, calculés pour tous les processus à la fois"""
+        membership = self.process_matrix()
+        measures_per_risk = self.counts[:self.size].sum(axis=1)
+        risks = membership.sum(axis=0)
+        measures = membership.T.astype(np.int64) @ measures_per_risk
+        return {
+            process: (int(risks[i]), int(measures[i]))
+            for i, process in enumerate(self.processes)
+        }
@@ -0,0 +1,482 @@
+import gzip
+import io
+import json
+from datetime import date, datetime
+
+import numpy as np
+
+from action_store import parse_deadline
+from risk_store import make_measures, new_measure_ids
+
+CSV_COLUMNS = [
+    "family", "family_name", "risk_name", "description", "processes", "measure_type", "measure_id", "measure"
+]
+# Les exports antérieurs aux identifiants de mesure n'ont pas de colonne measure_id
+CSV_OPTIONAL_COLUMNS = {"measure_id"}
+CSV_CHUNKSIZE = 50_000
+JSON_READ_SIZE = 1 << 16
+
+SNAPSHOT_FORMAT = "carto-snapshot"
+SNAPSHOT_VERSION = 1
+# Compromis taille / vitesse : les niveaux supérieurs gagnent peu sur ce texte répétitif
+SNAPSHOT_COMPRESSLEVEL = 6
+SNAPSHOT_PROGRESS_EVERY = 1000
+
+
+def read_csv_register(source, measure_types, chunksize=CSV_CHUNKSIZE, progress=None):
+    """Construit le registre imbriqué à partir d'un export CSV, par blocs
+
+    Chaque bloc est traité avec des opérations vectorisées (concaténation des
+    clés, dédoublonnage, groupby) : la boucle Python ne porte que sur les
+    familles, risques et groupes (risque, type) nouveaux, et sur les
+    identifiants de mesure : un identifiant déjà lu (plus haut dans le
+    fichier ou dans le même bloc) est remplacé par un nouveau.
+    ``progress`` est appelé avec le nombre de lignes lues après chaque bloc.
+    """
+    import pandas as pd
+
+    families = {}
+    risks = {}
+    seen_ids = set()
+    rows_read = 0
+    reader = pd.read_csv(
+        source,
+        usecols=lambda column: column in CSV_COLUMNS,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunksize
+    )
+    for chunk in reader:
+        missing = set(CSV_COLUMNS).difference(chunk.columns).difference(CSV_OPTIONAL_COLUMNS)
+        if missing:
+            raise ValueError(f"Colonne(s) manquante(s) : {', '.join(sorted(missing))}")
+        if "measure_id" not in chunk.columns:
+            chunk["measure_id"] = ""
+
+        unknown_types = set(chunk["measure_type"].unique()).difference(measure_types)
+        if unknown_types:
+            raise ValueError(f"Type(s) de mesure inconnu(s) : {', '.join(sorted(unknown_types))}")
+
+        chunk["risk_key"] = chunk["family"] + " - " + chunk["risk_name"]
+
+        # Identifiants en double : vidés, make_measures en génère de nouveaux
+        measure_ids = chunk["measure_id"].tolist()
+        for row, measure_id in enumerate(measure_ids):
+            if measure_id in seen_ids:
+                measure_ids[row] = ""
+            elif measure_id:
+                seen_ids.add(measure_id)
+
+        # Nouvelles familles (la première ligne rencontrée fait foi pour le nom)
+        first_families = chunk.drop_duplicates("family")
+        for family_key, family_name in zip(
+            first_families["family"].tolist(), first_families["family_name"].tolist()
+        ):
+            if family_key not in families:
+                families[family_key] = {"name": family_name, "risks": {}}
+
+        # Nouveaux risques (description et processus de la première ligne)
+        first_risks = chunk.drop_duplicates("risk_key")
+        first_risks = first_risks[[risk_key not in risks for risk_key in first_risks["risk_key"].tolist()]]
+        for family_key, risk_key, description, processes in zip(
+            first_risks["family"].tolist(),
+            first_risks["risk_key"].tolist(),
+            first_risks["description"].tolist(),
+            first_risks["processes"].str.split("|").tolist()
+        ):
+            risk_data = {
+                "description": description,
+                "processes": [p for p in processes if p],
+                "measures": {k: [] for k in measure_types}
+            }
+            families[family_key]["risks"][risk_key] = risk_data
+            risks[risk_key] = risk_data
+
+        # Mesures regroupées par (risque, type) en conservant l'ordre du fichier :
+        # tri stable sur le numéro de groupe puis découpage aux frontières
+        group_keys = ["risk_key", "measure_type"]
+        codes = chunk.groupby(group_keys, sort=False).ngroup().to_numpy()
+        order = np.argsort(codes, kind="stable")
+        bounds = (np.flatnonzero(np.diff(codes[order])) + 1).tolist()
+        sorted_measures = make_measures(
+            chunk["measure"].to_numpy(dtype=object)[order].tolist(),
+            np.array(measure_ids, dtype=object)[order].tolist()
+        )
+        first_groups = chunk.drop_duplicates(group_keys)
+        for risk_key, measure_type, start, end in zip(
+            first_groups["risk_key"].tolist(),
+            first_groups["measure_type"].tolist(),
+            [0] + bounds,
+            bounds + [len(sorted_measures)]
+        ):
+            risks[risk_key]["measures"][measure_type].extend(sorted_measures[start:end])
+
+        rows_read += len(chunk)
+        if progress:
+            progress(rows_read)
+    return families
+
+
+# Lecture JSON incrémentale
+_WHITESPACE = " \t\r\n"
+_DECODER = json.JSONDecoder()
+
+
+class _JsonStream:
+    """Lit un flux texte JSON valeur par valeur sans le charger entièrement
+
+    Seul le texte de la valeur en cours de décodage est conservé en mémoire.
+    """
+
+    def __init__(self, fp, read_size=JSON_READ_SIZE):
+        self.fp = fp
+        self.read_size = read_size
+        self.buf = ""
+        self.pos = 0
+        self.offset = 0  # nombre de caractères déjà abandonnés avant ``buf``
+        self.eof = False
+
+    def _extend(self):
+        """Lit un bloc supplémentaire en conservant le texte à partir de ``pos``"""
+        # La taille lue suit celle du tampon pour que les grosses valeurs restent linéaires
+        chunk = self.fp.read(max(self.read_size, len(self.buf) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.offset += self.pos
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def position(self):
+        return self.offset + self.pos
+
+    def peek(self):
+        """Retourne le prochain caractère significatif ("" en fin de flux)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._extend():
+                return ""
+
+    def expect(self, char, context):
+        found = self.peek()
+        if found != char:
+            found = repr(found) if found else "fin de fichier"
+            raise ValueError(
+                f"JSON invalide {context} : '{char}' attendu, {found} trouvé "
+                f"(caractère {self.position()})"
+            )
+        self.pos += 1
+
+    def _truncated(self, error):
+        """Indique si l'erreur de décodage vient seulement de la fin du tampon"""
+        if self.eof:
+            return False
+        return error.msg.startswith("Unterminated string") or error.pos >= len(self.buf) - 6
+
+    def decode_value(self, context):
+        """Décode la valeur JSON suivante et avance après elle
+
+        Le décodage (en C) est tenté sur le tampon courant ; s'il échoue parce
+        que la valeur est coupée par la fin du tampon, un bloc de plus est lu.
+        Toute autre erreur est remontée immédiatement.
+        """
+        if not self.peek():
+            raise ValueError(f"JSON invalide {context} : fin de fichier inattendue")
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._truncated(e) and self._extend():
+                    continue
+                raise ValueError(
+                    f"JSON invalide {context} : {e.msg} (caractère {self.offset + e.pos})"
+                ) from None
+            self.pos = end
+            return value
+
+
+def _validate_measures(measure_list, where, seen_ids):
+    """Valide une liste de mesures ; les anciens exports (texte seul) reçoivent un identifiant
+
+    ``seen_ids`` : identifiants déjà lus dans le fichier. Une mesure dont
+    l'identifiant est vide ou déjà pris en reçoit un nouveau : actions et
+    évaluations restent rattachées à la première.
+    """
+    if all(isinstance(m, dict) for m in measure_list):
+        for measure in measure_list:
+            if not isinstance(measure.get("id"), str) or not isinstance(measure.get("text"), str):
+                raise ValueError(f"{where} : chaque mesure doit avoir un 'id' et un 'text'")
+            if not measure["id"] or measure["id"] in seen_ids:
+                measure["id"] = new_measure_ids(1)[0]
+            seen_ids.add(measure["id"])
+        return measure_list
+    if all(isinstance(m, str) for m in measure_list):
+        measure_list = make_measures(measure_list)
+        seen_ids.update(measure["id"] for measure in measure_list)
+        return measure_list
+    raise ValueError(f"{where} : mesures invalides")
+
+
+def _validate_family(family_key, family_data, measure_types, seen_ids):
+    """Vérifie la structure d'une famille et complète les types de mesures absents
+
+    ``seen_ids`` : identifiants de mesure déjà lus (voir _validate_measures).
+    """
+    where = f"famille « {family_key} »"
+    if not isinstance(family_data, dict):
+        raise ValueError(f"{where} : un objet est attendu")
+    if not isinstance(family_data.get("name"), str):
+        raise ValueError(f"{where} : champ 'name' manquant ou invalide")
+    risks = family_data.get("risks")
+    if not isinstance(risks, dict):
+        raise ValueError(f"{where} : champ 'risks' manquant ou invalide")
+    for risk_key, risk_data in risks.items():
+        where = f"risque « {risk_key} » (famille « {family_key} »)"
+        if not isinstance(risk_data, dict):
+            raise ValueError(f"{where} : un objet est attendu")
+        risk_data.setdefault("description", "")
+        risk_data.setdefault("processes", [])
+        if not isinstance(risk_data["description"], str):
+            raise ValueError(f"{where} : champ 'description' invalide")
+        processes = risk_data["processes"]
+        if not isinstance(processes, list) or not all(isinstance(p, str) for p in processes):
+            raise ValueError(f"{where} : champ 'processes' invalide")
+        measures = risk_data.get("measures")
+        if not isinstance(measures, dict):
+            raise ValueError(f"{where} : champ 'measures' manquant ou invalide")
+        for measure_type, measure_list in measures.items():
+            if measure_type not in measure_types:
+                raise ValueError(f"{where} : type de mesure inconnu « {measure_type} »")
+            if not isinstance(measure_list, list):
+                raise ValueError(f"{where} : mesures « {measure_type} » invalides")
+            measures[measure_type] = _validate_measures(
+                measure_list, f"{where}, mesures « {measure_type} »", seen_ids
+            )
+        for measure_type in measure_types:
+            measures.setdefault(measure_type, [])
+
+
+def iter_json_families(fp, read_size=JSON_READ_SIZE):
+    """Itère sur les couples (clé, famille) d'un export JSON, une famille à la fois"""
+    stream = _JsonStream(fp, read_size)
+    stream.expect("{", "en début de fichier")
+    if stream.peek() == "}":
+        stream.pos += 1
+    else:
+        family_key = None
+        while True:
+            context = "en début de fichier" if family_key is None else f"après la famille « {family_key} »"
+            if stream.peek() != '"':
+                raise ValueError(f"JSON invalide {context} : clé de famille attendue (caractère {stream.position()})")
+            family_key = stream.decode_value(context)
+            context = f"dans la famille « {family_key} »"
+            stream.expect(":", context)
+            yield family_key, stream.decode_value(context)
+            separator = stream.peek()
+            if separator == "}":
+                stream.pos += 1
+                break
+            if separator != ",":
+                raise ValueError(
+                    f"JSON invalide après la famille « {family_key} » : ',' ou '}}' attendu "
+                    f"(caractère {stream.position()})"
+                )
+            stream.pos += 1
+    if stream.peek():
+        raise ValueError(f"JSON invalide : contenu inattendu après la fin (caractère {stream.position()})")
+
+
+def read_json_register(fp, measure_types, progress=None, read_size=JSON_READ_SIZE):
+    """Construit le registre à partir d'un flux texte JSON, famille par famille
+
+    Chaque famille est validée dès sa lecture : un fichier mal formé échoue au
+    plus tôt avec le nom de la famille ou du risque fautif. ``progress`` est
+    appelé avec le nombre de familles lues.
+    """
+    families = {}
+    seen_ids = set()
+    for family_key, family_data in iter_json_families(fp, read_size):
+        _validate_family(family_key, family_data, measure_types, seen_ids)
+        families[family_key] = family_data
+        if progress:
+            progress(len(families))
+    return families
+
+
+# Snapshot : état complet (registre, actions, évaluations) en JSON par ligne compressé
+# Encodeur partagé : json.dumps avec options en construit un à chaque appel
+_SNAPSHOT_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def _snapshot_line(record):
+    return _SNAPSHOT_ENCODER.encode(record) + "\n"
+
+
+def iter_snapshot_records(families, actions, measure_status, measure_performance, metadata=None):
+    """Enregistrements d'un snapshot, en-tête et fin compris, sans copie de l'état"""
+    evaluated = list(dict.fromkeys([*measure_status, *measure_performance]))
+    yield {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "metadata": metadata or {},
+        "counts": {
+            "families": len(families),
+            "risks": sum(len(family_data["risks"]) for family_data in families.values()),
+            "actions": len(actions),
+            "evaluations": len(evaluated)
+        }
+    }
+    count = 0
+    for family_key, family_data in families.items():
+        yield {"record": "family", "key": family_key, "name": family_data["name"]}
+        count += 1
+        for risk_key, risk_data in family_data["risks"].items():
+            yield {
+                "record": "risk",
+                "family": family_key,
+                "key": risk_key,
+                "description": risk_data.get("description", ""),
+                "processes": risk_data.get("processes", []),
+                # Types sans mesure omis : ils sont recréés à la lecture
+                "measures": {t: measures for t, measures in risk_data["measures"].items() if measures}
+            }
+            count += 1
+    for action_id, action in actions.items():
+        deadline = action.get("deadline")
+        yield {
+            "record": "action",
+            "id": action_id,
+            **action,
+            "deadline": deadline.isoformat() if isinstance(deadline, date) else deadline
+        }
+        count += 1
+    for measure_id in evaluated:
+        yield {
+            "record": "evaluation",
+            "measure_id": measure_id,
+            "status": measure_status.get(measure_id),
+            "performance": measure_performance.get(measure_id)
+        }
+        count += 1
+    yield {"record": "end", "records": count}
+
+
+def write_snapshot(fp, families, actions, measure_status, measure_performance,
+                   compresslevel=SNAPSHOT_COMPRESSLEVEL, metadata=None, progress=None):
+    """Écrit un snapshot compressé (gzip) dans le flux binaire ``fp``, ligne par ligne
+
+    ``metadata`` (dict JSON) est conservé dans l'en-tête et relu par read_snapshot.
+    ``progress`` est appelé avec le nombre d'enregistrements écrits.
+    """
+    with gzip.GzipFile(fileobj=fp, mode="wb", compresslevel=compresslevel, mtime=0) as compressed:
+        text = io.TextIOWrapper(compressed, encoding="utf-8", newline="\n")
+        try:
+            records = iter_snapshot_records(families, actions, measure_status, measure_performance, metadata)
+            for count, record in enumerate(records):
+                text.write(_snapshot_line(record))
+                if progress and count % SNAPSHOT_PROGRESS_EVERY == 0:
+                    progress(count)
+            text.flush()
+        finally:
+            text.detach()
+
+
+def read_snapshot_header(fp):
+    """En-tête d'un snapshot (format, version, métadonnées) sans lire les enregistrements"""
+    try:
+        with gzip.GzipFile(fileobj=fp, mode="rb") as compressed:
+            header = json.loads(compressed.readline() or b"null")
+    except (EOFError, gzip.BadGzipFile, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Snapshot illisible : {e}")
+    if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError("Snapshot invalide : en-tête absent")
+    return header
+
+
+def _read_snapshot_record(state, kind, record, measure_types, seen_ids):
+    """Ajoute un enregistrement de snapshot à l'état en cours de lecture"""
+    if kind == "family":
+        state["families"][record["key"]] = {"name": record["name"], "risks": {}}
+    elif kind == "risk":
+        family = state["families"].get(record["family"])
+        if family is None:
+            raise ValueError(f"famille « {record['family']} » inconnue")
+        risk_data = {
+            "description": record["description"],
+            "processes": record["processes"],
+            "measures": record["measures"]
+        }
+        _validate_family(
+            record["family"], {"name": family["name"], "risks": {record["key"]: risk_data}}, measure_types, seen_ids
+        )
+        family["risks"][record["key"]] = risk_data
+    elif kind == "action":
+        action_id = record.pop("id")
+        record["deadline"] = parse_deadline(record.get("deadline"))
+        state["actions"][action_id] = record
+    elif kind == "evaluation":
+        if record["status"] is not None:
+            state["measure_status"][record["measure_id"]] = record["status"]
+        if record["performance"] is not None:
+            state["measure_performance"][record["measure_id"]] = record["performance"]
+    else:
+        raise ValueError(f"type d'enregistrement « {kind} » inconnu")
+
+
+def read_snapshot(fp, measure_types, progress=None):
+    """Relit un snapshot depuis un flux binaire
+
+    Retourne ``{"families", "actions", "measure_status", "measure_performance",
+    "metadata"}``.
+    Chaque risque est validé à sa lecture ; un fichier tronqué (sans
+    enregistrement de fin) ou d'une version plus récente est refusé.
+    ``progress`` est appelé avec le nombre d'enregistrements lus.
+    """
+    state = {"families": {}, "actions": {}, "measure_status": {}, "measure_performance": {}}
+    seen_ids = set()
+    count = 0
+    expected = None
+    with gzip.GzipFile(fileobj=fp, mode="rb") as compressed:
+        lines = io.TextIOWrapper(compressed, encoding="utf-8", newline="\n")
+        try:
+            header = json.loads(lines.readline() or "null")
+            if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+                raise ValueError("Snapshot invalide : en-tête absent")
+            if header.get("version", 0) > SNAPSHOT_VERSION:
+                raise ValueError(
+                    f"Snapshot de version {header['version']} : version {SNAPSHOT_VERSION} au plus prise en charge"
+                )
+            state["metadata"] = header.get("metadata", {})
+            for line_number, line in enumerate(lines, start=2):
+                if expected is not None:
+                    raise ValueError(f"Snapshot invalide : contenu après la fin (ligne {line_number})")
+                try:
+                    record = json.loads(line)
+                    kind = record.pop("record")
+                    if kind == "end":
+                        expected = record["records"]
+                        continue
+                    _read_snapshot_record(state, kind, record, measure_types, seen_ids)
+                except (KeyError, TypeError, AttributeError) as e:
+                    raise ValueError(f"Snapshot invalide (ligne {line_number}) : champ manquant ou invalide {e}")
+                except ValueError as e:
+                    raise ValueError(f"Snapshot invalide (ligne {line_number}) : {e}")
+                count += 1
+                if progress and count % SNAPSHOT_PROGRESS_EVERY == 0:
+                    progress(count)
+        except (EOFError, gzip.BadGzipFile, UnicodeDecodeError) as e:
+            raise ValueError(f"Snapshot illisible : {e}")
+        finally:
+            lines.detach()
+    if expected is None:
+        raise ValueError("Snapshot tronqué : enregistrement de fin absent")
+    if expected != count:
+        raise ValueError(f"Snapshot incomplet : {count} enregistrements lus sur {expected}")
+    if progress:
+        progress(count)
+    return state
@@ -0,0 +1,267 @@
+"""Rapports statiques par processus et par service (HTML et CSV)
+
+Les rapports reprennent le contenu des vues « Vue par processus » (métriques,
+répartition des mesures, risques avec leurs mesures) et « Impact par
+service » (métriques, risques groupés par famille avec le nombre de mesures
+par type), pour tous les processus en une passe.
+
+``build_report_data`` calcule une fois l'agrégation partagée par tous les
+rapports : statistiques de couverture et risques de chaque processus, textes
+des risques concernés. ``write_reports`` répartit ensuite le rendu et
+l'écriture des fichiers sur un pool de processus ; chaque processus reçoit
+l'agrégation une seule fois, à son démarrage, et les tâches ne transportent
+qu'un couple (type de rapport, processus).
+"""
+import csv
+import html
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from core import MEASURE_TYPES, PROCESSES
+
+REPORT_KINDS = ("processus", "service")
+REPORT_FORMATS = ("html", "csv")
+
+REPORT_STYLE = (
+    "body{font-family:sans-serif;margin:2rem;color:#1f2937}"
+    "h1{font-size:1.5rem}h2{font-size:1.2rem;margin-top:2rem}h3{font-size:1rem;margin-bottom:.2rem}"
+    ".metrics{display:flex;gap:2rem;flex-wrap:wrap}.metric{min-width:8rem}"
+    ".metric b{display:block;font-size:1.6rem}"
+    "details{border:1px solid #e5e7eb;border-radius:4px;padding:.4rem .8rem;margin:.3rem 0}"
+    "summary{cursor:pointer;font-weight:600}table{border-collapse:collapse}"
+    "td,th{border:1px solid #e5e7eb;padding:.2rem .6rem;text-align:left}"
+    ".muted{color:#6b7280}"
+)
+
+# Agrégation reçue par chaque processus du pool (voir _init_worker)
+_worker_data = None
+
+
+def build_report_data(store, processes=PROCESSES):
+    """Agrégation commune à tous les rapports
+
+    Ne retient que les risques rattachés à l'un des ``processes``, avec les
+    seuls textes des mesures : c'est tout ce que les rapports affichent.
+    """
+    by_process = {}
+    risks = {}
+    for process in processes:
+        refs = store.risk_refs_by_process(process)
+        stats = store.coverage.process_stats(process)
+        by_process[process] = {
+            "refs": refs,
+            "total_risks": stats["total_risks"],
+            "total_measures": stats["total_measures"],
+            "coverage_pct": stats["coverage_pct"],
+            "measures_by_type": {measure_type: stats["measures_by_type"][measure_type] for measure_type in MEASURE_TYPES},
+            "risks_by_family": dict(stats["risks_by_family"])
+        }
+        for ref in refs:
+            if ref not in risks:
+                risk_data = store.risk(*ref)
+                risks[ref] = {
+                    "description": risk_data["description"],
+                    "measures": {
+                        measure_type: [measure["text"] for measure in measures]
+                        for measure_type, measures in risk_data["measures"].items()
+                    }
+                }
+    return {
+        "generated": datetime.now().strftime("%d/%m/%Y %H:%M"),
+        "family_names": {family_key: family_data["name"] for family_key, family_data in store.families.items()},
+        "by_process": by_process,
+        "risks": risks
+    }
+
+
+def report_name(kind, process):
+    """Nom de fichier (sans extension) d'un rapport"""
+    slug = re.sub(r"[^0-9a-z]+", "_", process.lower()).strip("_")
+    return f"{kind}_{slug}"
+
+
+def grouped_by_family(refs):
+    """Références groupées par famille, dans l'ordre de première apparition"""
+    grouped = {}
+    for family_key, risk_key in refs:
+        grouped.setdefault(family_key, []).append(risk_key)
+    return grouped
+
+
+# Rendu
+def html_page(title, generated, body):
+    return (
+        f'<!DOCTYPE html><html lang="fr"><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+        f"<style>{REPORT_STYLE}</style></head><body><h1>{html.escape(title)}</h1>"
+        f'<p class="muted">Généré le {generated}</p>{body}</body></html>'
+    )
+
+
+def html_metrics(metrics):
+    items = "".join(
+        f'<div class="metric"><span class="muted">{html.escape(label)}</span><b>{value}</b></div>'
+        for label, value in metrics
+    )
+    return f'<div class="metrics">{items}</div>'
+
+
+def process_html(data, process):
+    """Contenu de la vue « Vue par processus »"""
+    summary = data["by_process"][process]
+    parts = [
+        html_metrics([
+            ("Risques identifiés", summary["total_risks"]),
+            ("Mesures en place", summary["total_measures"]),
+            ("Taux de couverture", f"{summary['coverage_pct']:.1f}%")
+        ]),
+        "<h2>Répartition des mesures</h2>",
+        html_metrics([(name, summary["measures_by_type"][measure_type]) for measure_type, name in MEASURE_TYPES.items()]),
+        "<h2>Risques associés</h2>"
+    ]
+    if not summary["refs"]:
+        parts.append("<p>Aucun risque associé à ce processus</p>")
+    for ref in summary["refs"]:
+        risk = data["risks"][ref]
+        parts.append(f"<details><summary>{html.escape(ref[1])}</summary><p>{html.escape(risk['description'])}</p>")
+        for measure_type, texts in risk["measures"].items():
+            if texts:
+                items = "".join(f"<li>{html.escape(text)}</li>" for text in texts)
+                parts.append(f"<p><b>{MEASURE_TYPES[measure_type]}</b></p><ul>{items}</ul>")
+        parts.append("</details>")
+    return html_page(f"Processus {process}", data["generated"], "".join(parts))
+
+
+def service_html(data, process):
+    """Contenu de la vue « Impact par service » pour un service"""
+    summary = data["by_process"][process]
+    parts = [html_metrics([
+        ("Total des risques", summary["total_risks"]),
+        ("Total des mesures", summary["total_measures"]),
+        ("Taux de couverture", f"{summary['coverage_pct']:.1f}%")
+    ])]
+    if not summary["refs"]:
+        parts.append("<p>Aucun risque associé à ce service</p>")
+    for family_key, risk_keys in grouped_by_family(summary["refs"]).items():
+        parts.append(f"<h2>{html.escape(family_key)} ({len(risk_keys)} risques)</h2>")
+        for risk_key in risk_keys:
+            risk = data["risks"][(family_key, risk_key)]
+            counts = " | ".join(
+                f"<b>{MEASURE_TYPES[measure_type]}</b>: {len(texts)}"
+                for measure_type, texts in risk["measures"].items() if texts
+            )
+            parts.append(f"<h3>{html.escape(risk_key)}</h3><p>{html.escape(risk['description'])}</p><p>{counts}</p>")
+    return html_page(f"Service {process}", data["generated"], "".join(parts))
+
+
+def process_csv(data, process):
+    """Une ligne par mesure ; un risque sans mesure donne une ligne sans type ni mesure"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["famille", "nom_famille", "risque", "description", "type", "mesure"])
+    for family_key, risk_key in data["by_process"][process]["refs"]:
+        risk = data["risks"][(family_key, risk_key)]
+        context = [family_key, data["family_names"].get(family_key, ""), risk_key, risk["description"]]
+        rows = [
+            [*context, MEASURE_TYPES[measure_type], text]
+            for measure_type, texts in risk["measures"].items()
+            for text in texts
+        ]
+        writer.writerows(rows or [[*context, "", ""]])
+    return output.getvalue()
+
+
+def service_csv(data, process):
+    """Une ligne par risque, groupée par famille, avec le nombre de mesures par type"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["famille", "nom_famille", "risque", "description", *MEASURE_TYPES.values()])
+    for family_key, risk_keys in grouped_by_family(data["by_process"][process]["refs"]).items():
+        for risk_key in risk_keys:
+            risk = data["risks"][(family_key, risk_key)]
+            writer.writerow([
+                family_key, data["family_names"].get(family_key, ""), risk_key, risk["description"],
+                *(len(risk["measures"].get(measure_type, ())) for measure_type in MEASURE_TYPES)
+            ])
+    return output.getvalue()
+
+
+RENDERERS = {
+    ("processus", "html"): process_html,
+    ("processus", "csv"): process_csv,
+    ("service", "html"): service_html,
+    ("service", "csv"): service_csv
+}
+
+
+def index_html(data, kinds, formats):
+    """Page d'accueil : couverture de chaque processus et liens vers ses rapports"""
+    rows = []
+    for process, summary in data["by_process"].items():
+        links = " ".join(
+            f'<a href="{report_name(kind, process)}.{fmt}">{kind} ({fmt.upper()})</a>'
+            for kind in kinds for fmt in formats
+        )
+        rows.append(
+            f"<tr><td>{html.escape(process)}</td><td>{summary['total_risks']}</td>"
+            f"<td>{summary['total_measures']}</td><td>{summary['coverage_pct']:.1f}%</td><td>{links}</td></tr>"
+        )
+    table = (
+        "<table><tr><th>Processus</th><th>Risques</th><th>Mesures</th><th>Couverture</th><th>Rapports</th></tr>"
+        f"{''.join(rows)}</table>"
+    )
+    return html_page("Rapports par processus et par service", data["generated"], table)
+
+
+def write_report(data, kind, process, formats, directory):
+    """Écrit les fichiers d'un rapport ; retourne leur taille totale en octets"""
+    size = 0
+    for fmt in formats:
+        payload = RENDERERS[kind, fmt](data, process).encode()
+        with open(os.path.join(directory, f"{report_name(kind, process)}.{fmt}"), "wb") as f:
+            f.write(payload)
+        size += len(payload)
+    return size
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _write_worker_report(kind, process, formats, directory):
+    return write_report(_worker_data, kind, process, formats, directory)
+
+
+def write_reports(data, directory, kinds=REPORT_KINDS, formats=REPORT_FORMATS, workers=None, progress=None):
+    """Écrit tous les rapports de ``data`` dans ``directory`` et une page index.html
+
+    ``workers`` : taille du pool de processus (par défaut, nombre de cœurs) ;
+    1 fait tout le rendu dans le processus courant. ``progress(fraction,
+    count)`` est appelé après chaque rapport. Retourne (nombre de rapports,
+    octets écrits).
+    """
+    os.makedirs(directory, exist_ok=True)
+    tasks = [(kind, process) for process in data["by_process"] for kind in kinds]
+    workers = min(workers or os.cpu_count() or 1, len(tasks) or 1)
+    size = 0
+    if workers == 1:
+        for done, (kind, process) in enumerate(tasks, 1):
+            size += write_report(data, kind, process, formats, directory)
+            if progress:
+                progress(done / len(tasks), done)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) as pool:
+            futures = [pool.submit(_write_worker_report, kind, process, formats, directory) for kind, process in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                size += future.result()
+                if progress:
+                    progress(done / len(tasks), done)
+    if "html" in formats:
+        index = index_html(data, kinds, formats).encode()
+        with open(os.path.join(directory, "index.html"), "wb") as f:
+            f.write(index)
+        size += len(index)
+    return len(tasks), size
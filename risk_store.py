@@ -0,0 +1,576 @@
+import os
+import unicodedata
+from collections import ChainMap, Counter, defaultdict
+
+import numpy as np
+
+from register_arrays import RegisterArrays
+from search_index import SearchIndex
+
+MEASURE_ID_BYTES = 6
+# Au-delà, les couches d'identifiants de mesure héritées des forks sont fusionnées
+MAX_MEASURE_REF_LAYERS = 8
+
+
+def new_measure_ids(count):
+    """Génère ``count`` identifiants de mesure aléatoires (12 caractères hexadécimaux)"""
+    raw = os.urandom(MEASURE_ID_BYTES * count).hex()
+    width = 2 * MEASURE_ID_BYTES
+    return [raw[i:i + width] for i in range(0, len(raw), width)]
+
+
+def make_measures(texts, measure_ids=None):
+    """Construit les mesures {"id", "text"} ; les identifiants manquants sont générés"""
+    if measure_ids is None:
+        measure_ids = [None] * len(texts)
+    missing = sum(1 for measure_id in measure_ids if not measure_id)
+    generated = iter(new_measure_ids(missing))
+    return [
+        {"id": measure_id or next(generated), "text": text}
+        for measure_id, text in zip(measure_ids, texts)
+    ]
+
+
+def normalize_text(text):
+    """Forme canonique d'un texte de mesure pour la détection des doublons (casse, espaces, Unicode)"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def _add(counter, key, delta):
+    """Applique un delta à un compteur en supprimant les entrées nulles"""
+    value = counter[key] + delta
+    if value:
+        counter[key] = value
+    else:
+        del counter[key]
+
+
+class CoverageCounters:
+    """Compteurs de couverture processus × famille × type de mesure
+
+    Les compteurs sont mis à jour par deltas à chaque mutation du registre, ce
+    qui rend les métriques par processus (nombre de risques, de mesures,
+    répartition par type, taux de couverture) accessibles en O(1).
+    """
+
+    def __init__(self, measure_types=()):
+        self.measure_types = tuple(measure_types)
+        # processus -> Counter((famille, type) -> nb mesures)
+        self.measures = defaultdict(Counter)
+        # processus -> Counter(famille -> nb risques)
+        self.risks = defaultdict(Counter)
+        # Totaux par processus, dérivés des deux compteurs ci-dessus
+        self.total_risks = Counter()
+        self.total_measures = Counter()
+        self.measures_by_type = defaultdict(Counter)
+
+    @classmethod
+    def build(cls, families, measure_types=()):
+        """Reconstruit les compteurs à partir de zéro"""
+        counters = cls(measure_types)
+        for family_key, family_data in families.items():
+            for risk_data in family_data["risks"].values():
+                counters.update_risk(family_key, risk_data, 1)
+        return counters
+
+    def update_risk(self, family_key, risk_data, sign):
+        """Ajoute (sign=1) ou retire (sign=-1) un risque et toutes ses mesures"""
+        for process in dict.fromkeys(risk_data.get("processes", [])):
+            _add(self.risks[process], family_key, sign)
+            _add(self.total_risks, process, sign)
+        for measure_type, measures in risk_data["measures"].items():
+            if measures:
+                self.update_measures(family_key, risk_data, measure_type, sign * len(measures))
+
+    def update_measures(self, family_key, risk_data, measure_type, delta):
+        """Applique un delta au nombre de mesures d'un type pour un risque"""
+        for process in dict.fromkeys(risk_data.get("processes", [])):
+            _add(self.measures[process], (family_key, measure_type), delta)
+            _add(self.measures_by_type[process], measure_type, delta)
+            _add(self.total_measures, process, delta)
+
+    def copy(self):
+        """Copie indépendante des compteurs"""
+        counters = CoverageCounters(self.measure_types)
+        for name in ("measures", "risks", "measures_by_type"):
+            target = getattr(counters, name)
+            for process, counter in getattr(self, name).items():
+                target[process] = Counter(counter)
+        counters.total_risks = Counter(self.total_risks)
+        counters.total_measures = Counter(self.total_measures)
+        return counters
+
+    def coverage_pct(self, process):
+        """Taux de couverture : mesures / (risques × types de mesures)"""
+        total_risks = self.total_risks[process]
+        if not total_risks:
+            return 0
+        return self.total_measures[process] / (total_risks * len(self.measure_types)) * 100
+
+    def process_stats(self, process):
+        """Statistiques de couverture d'un processus"""
+        return {
+            "total_risks": self.total_risks[process],
+            "measures_by_type": defaultdict(int, self.measures_by_type.get(process, {})),
+            "risks_by_family": defaultdict(int, self.risks.get(process, {})),
+            "total_measures": self.total_measures[process],
+            "coverage_pct": self.coverage_pct(process)
+        }
+
+    def cube(self, processes, families):
+        """Cube dense des compteurs, sur les processus et familles demandés
+
+        Retourne ``(risks, measures)`` : nombre de risques processus × famille
+        et nombre de mesures processus × famille × type. Le coût est celui des
+        cellules non nulles, pas celui du registre.
+        """
+        family_index = {family_key: i for i, family_key in enumerate(families)}
+        type_index = {measure_type: i for i, measure_type in enumerate(self.measure_types)}
+        risks = np.zeros((len(processes), len(families)), dtype=np.int64)
+        measures = np.zeros((len(processes), len(families), len(self.measure_types)), dtype=np.int64)
+        for p, process in enumerate(processes):
+            for family_key, count in self.risks.get(process, {}).items():
+                if family_key in family_index:
+                    risks[p, family_index[family_key]] = count
+            for (family_key, measure_type), count in self.measures.get(process, {}).items():
+                if family_key in family_index and measure_type in type_index:
+                    measures[p, family_index[family_key], type_index[measure_type]] = count
+        return risks, measures
+
+    def _snapshot(self):
+        return (
+            {p: c for p, c in self.measures.items() if c},
+            {p: c for p, c in self.risks.items() if c},
+            {p: c for p, c in self.measures_by_type.items() if c},
+            +self.total_risks,
+            +self.total_measures
+        )
+
+    def diff(self, other):
+        """Liste les compteurs qui diffèrent d'un autre jeu de compteurs"""
+        names = ("measures", "risks", "measures_by_type", "total_risks", "total_measures")
+        return [
+            name for name, mine, theirs in zip(names, self._snapshot(), other._snapshot())
+            if mine != theirs
+        ]
+
+
+class RiskStore:
+    """Registre des risques avec index secondaires
+
+    Les données restent exposées sous la forme imbriquée habituelle
+    (``families[famille]["risks"][risque]["measures"][type]``) afin que
+    l'import/export JSON fonctionne sans conversion. Les index permettent de
+    filtrer par processus ou par type de mesure sans parcourir tout le registre.
+    Un risque est référencé par le couple ``(family_key, risk_key)`` ; chaque
+    mesure est un dict ``{"id": ..., "text": ...}`` dont l'identifiant est stable.
+
+    ``fork()`` retourne un registre modifiable qui partage ses données avec
+    l'original (copie sur écriture, voir ``shared_register``) : une famille,
+    un risque ou une entrée d'index n'y est copié qu'à sa première modification.
+    """
+
+    def __init__(self, families=None, measure_types=()):
+        self.measure_types = tuple(measure_types)
+        self.families = {}
+        # processus -> {(famille, risque): None} (dict utilisé comme ensemble ordonné)
+        self._by_process = defaultdict(dict)
+        # type de mesure -> {(famille, risque): liste des mesures de ce type}
+        self._by_measure_type = defaultdict(dict)
+        # identifiant de mesure -> (famille, risque, type)
+        self._measure_refs = {}
+        self.coverage = CoverageCounters(self.measure_types)
+        # Index plein texte construit à la première recherche puis tenu à jour
+        self._search = None
+        # Miroir colonnaire construit à la première requête vectorisée puis tenu à jour
+        self._arrays = None
+        # Copie sur écriture (fork) : familles, risques et entrées d'index déjà copiés
+        self._cow = False
+        self._owned_families = set()
+        self._owned_risks = set()
+        self._owned_buckets = set()
+        if families:
+            self.load(families)
+
+    def fork(self):
+        """Registre modifiable partageant les données de celui-ci, qui ne doit plus être modifié"""
+        store = RiskStore(measure_types=self.measure_types)
+        store.families = dict(self.families)
+        store._by_process = defaultdict(dict, self._by_process)
+        store._by_measure_type = defaultdict(dict, self._by_measure_type)
+        # Identifiants de mesure : couche propre au fork au-dessus de celles de l'original
+        # (None masque une mesure supprimée)
+        layers = self._measure_refs.maps if isinstance(self._measure_refs, ChainMap) else [self._measure_refs]
+        if len(layers) >= MAX_MEASURE_REF_LAYERS:
+            layers = [{k: v for k, v in ChainMap(*layers).items() if v is not None}]
+        store._measure_refs = ChainMap({}, *layers)
+        store.coverage = self.coverage.copy()
+        # Index plein texte et miroir colonnaire suivent le fork en copie sur écriture
+        if self._search is not None:
+            store._search = self._search.fork()
+        if self._arrays is not None:
+            store._arrays = self._arrays.fork()
+        store._cow = True
+        return store
+
+    # Chargement et indexation
+    def load(self, families):
+        """Remplace le contenu du registre et reconstruit les index"""
+        self.families = families
+        # Nouveaux index : ceux d'un fork peuvent être partagés avec son original
+        self._by_process = defaultdict(dict)
+        self._by_measure_type = defaultdict(dict)
+        self._measure_refs = {}
+        self._cow = False
+        self.coverage = CoverageCounters(self.measure_types)
+        self._search = None
+        self._arrays = None
+        for family_key, family_data in families.items():
+            for risk_key, risk_data in family_data["risks"].items():
+                self._index_risk(family_key, risk_key, risk_data)
+
+    # Copie sur écriture
+    def _bucket(self, index, key):
+        """Entrée d'index modifiable (copiée à la première écriture dans un fork)"""
+        if self._cow and (id(index), key) not in self._owned_buckets:
+            index[key] = dict(index.get(key, {}))
+            self._owned_buckets.add((id(index), key))
+        return index[key]
+
+    def _forget_measure(self, measure_id):
+        if self._cow:
+            self._measure_refs[measure_id] = None
+        else:
+            self._measure_refs.pop(measure_id, None)
+
+    def _own_family(self, family_key):
+        """Famille modifiable : dans un fork, copie de la famille et de son dict de risques"""
+        if self._cow and family_key not in self._owned_families:
+            family_data = self.families[family_key]
+            self.families[family_key] = {"name": family_data["name"], "risks": dict(family_data["risks"])}
+            self._owned_families.add(family_key)
+        return self.families[family_key]
+
+    def _own_risk(self, family_key, risk_key):
+        """Risque modifiable : dans un fork, copie du risque et de ses listes de mesures"""
+        risks = self._own_family(family_key)["risks"]
+        ref = (family_key, risk_key)
+        if self._cow and ref not in self._owned_risks:
+            risk_data = risks[risk_key]
+            risk_data = risks[risk_key] = {
+                **risk_data,
+                "processes": list(risk_data.get("processes", [])),
+                "measures": {t: list(measures) for t, measures in risk_data["measures"].items()}
+            }
+            # L'index par type pointe sur les listes de mesures : il suit la copie
+            for measure_type, measures in risk_data["measures"].items():
+                if measures:
+                    self._bucket(self._by_measure_type, measure_type)[ref] = measures
+            self._owned_risks.add(ref)
+        return risks[risk_key]
+
+    def _index_risk(self, family_key, risk_key, risk_data):
+        ref = (family_key, risk_key)
+        for process in risk_data.get("processes", []):
+            self._bucket(self._by_process, process)[ref] = None
+        for measure_type, measures in risk_data["measures"].items():
+            if measures:
+                self._bucket(self._by_measure_type, measure_type)[ref] = measures
+            for measure in measures:
+                self._measure_refs[measure["id"]] = (family_key, risk_key, measure_type)
+        self.coverage.update_risk(family_key, risk_data, 1)
+        if self._search is not None:
+            self._search.index_risk(family_key, risk_key, risk_data)
+        if self._arrays is not None:
+            self._arrays.add_risk(family_key, risk_key, risk_data)
+
+    def _unindex_risk(self, family_key, risk_key, risk_data):
+        ref = (family_key, risk_key)
+        for process in risk_data.get("processes", []):
+            self._bucket(self._by_process, process).pop(ref, None)
+        for measure_type, measures in risk_data["measures"].items():
+            if ref in self._by_measure_type.get(measure_type, ()):
+                self._bucket(self._by_measure_type, measure_type).pop(ref, None)
+            for measure in measures:
+                self._forget_measure(measure["id"])
+        self.coverage.update_risk(family_key, risk_data, -1)
+        if self._search is not None:
+            self._search.remove_risk(family_key, risk_key)
+        if self._arrays is not None:
+            self._arrays.remove_risk(family_key, risk_key)
+
+    # Mutations
+    def add_family(self, family_key, family_name):
+        """Ajoute (ou remplace) une famille de risques"""
+        if family_key in self.families:
+            self._drop_family_risks(family_key)
+        self.families[family_key] = {
+            "name": family_name,
+            "risks": {}
+        }
+        if self._cow:
+            self._owned_families.add(family_key)
+
+    def rename_family(self, family_key, family_name):
+        """Renomme une famille sans toucher à ses risques"""
+        self._own_family(family_key)["name"] = family_name
+
+    def _drop_family_risks(self, family_key):
+        for risk_key, risk_data in self.families[family_key]["risks"].items():
+            self._unindex_risk(family_key, risk_key, risk_data)
+
+    def add_risk(self, family_key, risk_key, description, processes):
+        """Ajoute (ou remplace) un risque dans une famille"""
+        risks = self._own_family(family_key)["risks"]
+        if risk_key in risks:
+            self._unindex_risk(family_key, risk_key, risks[risk_key])
+        risk_data = {
+            "description": description,
+            "processes": list(processes),
+            "measures": {k: [] for k in self.measure_types}
+        }
+        risks[risk_key] = risk_data
+        if self._cow:
+            self._owned_risks.add((family_key, risk_key))
+        self._index_risk(family_key, risk_key, risk_data)
+        return risk_data
+
+    def update_risk(self, family_key, risk_key, description, processes):
+        """Met à jour la description et les processus d'un risque en conservant ses mesures"""
+        risk_data = self._own_risk(family_key, risk_key)
+        self._unindex_risk(family_key, risk_key, risk_data)
+        risk_data["description"] = description
+        risk_data["processes"] = list(processes)
+        self._index_risk(family_key, risk_key, risk_data)
+        return risk_data
+
+    def add_measures(self, family_key, risk_key, measure_type, texts, measure_ids=None):
+        """Ajoute des mesures d'un type donné à un risque et les retourne
+
+        ``measure_ids`` conserve des identifiants existants (rejeu du journal).
+        """
+        if not texts:
+            return []
+        measures = make_measures(texts, measure_ids)
+        risk_data = self._own_risk(family_key, risk_key)
+        measure_list = risk_data["measures"][measure_type]
+        measure_list.extend(measures)
+        self._bucket(self._by_measure_type, measure_type)[(family_key, risk_key)] = measure_list
+        for measure in measures:
+            self._measure_refs[measure["id"]] = (family_key, risk_key, measure_type)
+        self.coverage.update_measures(family_key, risk_data, measure_type, len(measures))
+        if self._search is not None:
+            self._search.index_risk(family_key, risk_key, risk_data)
+        if self._arrays is not None:
+            self._arrays.add_measures(family_key, risk_key, measure_type, len(measures))
+        return measures
+
+    def delete_risk(self, family_key, risk_key):
+        """Supprime un risque et ses entrées d'index"""
+        if risk_key not in self.families[family_key]["risks"]:
+            return False
+        risk_data = self._own_family(family_key)["risks"].pop(risk_key)
+        self._unindex_risk(family_key, risk_key, risk_data)
+        return True
+
+    def delete_measure(self, family_key, risk_key, measure_type, measure_index):
+        """Supprime une mesure par sa position"""
+        if not 0 <= measure_index < len(self.families[family_key]["risks"][risk_key]["measures"][measure_type]):
+            return False
+        risk_data = self._own_risk(family_key, risk_key)
+        measures = risk_data["measures"][measure_type]
+        removed = measures.pop(measure_index)
+        self._forget_measure(removed["id"])
+        self.coverage.update_measures(family_key, risk_data, measure_type, -1)
+        if self._search is not None:
+            self._search.index_risk(family_key, risk_key, risk_data)
+        if self._arrays is not None:
+            self._arrays.add_measures(family_key, risk_key, measure_type, -1)
+        if not measures:
+            self._bucket(self._by_measure_type, measure_type).pop((family_key, risk_key), None)
+        return True
+
+    def apply(self, operation, *args):
+        """Rejoue une opération enregistrée (journal, modifications d'une session)
+
+        Les mesures ajoutées sont enregistrées avec leur identifiant :
+        ``("add_measures", famille, risque, type, [{"id", "text"}, ...])``.
+        """
+        if operation == "load":
+            self.load(*args)
+        elif operation == "add_measures":
+            family_key, risk_key, measure_type, measures = args
+            self.add_measures(
+                family_key, risk_key, measure_type,
+                [measure["text"] for measure in measures],
+                [measure["id"] for measure in measures]
+            )
+        elif operation in ("add_family", "rename_family", "add_risk", "update_risk", "delete_risk", "delete_measure"):
+            getattr(self, operation)(*args)
+        else:
+            raise ValueError(f"opération de registre inconnue « {operation} »")
+
+    def merge(self, families):
+        """Fusionne un registre importé : ajoute et met à jour, ne supprime rien
+
+        Familles et risques sont repérés par leur clé ; un nom, une
+        description ou des processus différents sont mis à jour, une valeur
+        vide dans l'import laisse celle du registre inchangée. Une mesure
+        n'est ajoutée que si son texte normalisé (``normalize_text``) est
+        absent de l'ensemble des textes de son risque et de son type, construit
+        pour les seuls risques présents dans l'import : le coût dépend de la
+        taille de l'import, pas de celle du registre. Les identifiants importés
+        sont conservés s'ils sont libres.
+
+        Retourne ``(summary, operations)`` : nombre d'éléments ajoutés, mis à
+        jour et inchangés par niveau (familles, risques, mesures), et les
+        opérations appliquées, au format de ``apply``.
+        """
+        summary = {level: Counter() for level in ("families", "risks", "measures")}
+        operations = []
+
+        def run(operation, *args):
+            result = getattr(self, operation)(*args)
+            if operation == "add_measures":
+                family_key, risk_key, measure_type, _, _ = args
+                args = (family_key, risk_key, measure_type, result)
+            operations.append((operation, args))
+
+        # Identifiants importés déjà attribués pendant cette fusion
+        taken_ids = set()
+        for family_key, family_data in families.items():
+            current = self.families.get(family_key)
+            if current is None:
+                run("add_family", family_key, family_data["name"])
+                summary["families"]["added"] += 1
+            elif family_data["name"] and family_data["name"] != current["name"]:
+                run("rename_family", family_key, family_data["name"])
+                summary["families"]["updated"] += 1
+            else:
+                summary["families"]["unchanged"] += 1
+
+            for risk_key, risk_data in family_data["risks"].items():
+                existing = self.families[family_key]["risks"].get(risk_key)
+                description = risk_data.get("description", "")
+                processes = list(risk_data.get("processes", []))
+                if existing is None:
+                    run("add_risk", family_key, risk_key, description, processes)
+                    status = "added"
+                else:
+                    # Valeur absente ou vide dans l'import : celle du registre est conservée
+                    description = description or existing["description"]
+                    processes = processes or existing["processes"]
+                    if description != existing["description"] or processes != existing["processes"]:
+                        run("update_risk", family_key, risk_key, description, processes)
+                        status = "updated"
+                    else:
+                        status = "unchanged"
+                existing = self.families[family_key]["risks"][risk_key]
+
+                for measure_type, measures in risk_data["measures"].items():
+                    if not measures:
+                        continue
+                    seen = {normalize_text(measure["text"]) for measure in existing["measures"][measure_type]}
+                    texts, measure_ids = [], []
+                    for measure in measures:
+                        key = normalize_text(measure["text"])
+                        if not key:
+                            continue
+                        if key in seen:
+                            summary["measures"]["unchanged"] += 1
+                            continue
+                        seen.add(key)
+                        measure_id = measure.get("id")
+                        # Identifiant déjà pris dans le registre ou dans l'import : un nouveau est généré
+                        if not measure_id or measure_id in taken_ids or self.locate_measure(measure_id) is not None:
+                            measure_id = None
+                        else:
+                            taken_ids.add(measure_id)
+                        texts.append(measure["text"])
+                        measure_ids.append(measure_id)
+                    if texts:
+                        run("add_measures", family_key, risk_key, measure_type, texts, measure_ids)
+                        summary["measures"]["added"] += len(texts)
+                        if status == "unchanged":
+                            status = "updated"
+                summary["risks"][status] += 1
+        return summary, operations
+
+    def check_consistency(self):
+        """Compare les compteurs incrémentaux à une reconstruction complète
+
+        Retourne la liste des compteurs divergents (vide si tout est cohérent).
+        """
+        rebuilt = CoverageCounters.build(self.families, self.measure_types)
+        diverging = self.coverage.diff(rebuilt)
+        if self._arrays is not None:
+            totals = self._arrays.totals_by_process()
+            expected = {
+                process: (rebuilt.total_risks[process], rebuilt.total_measures[process])
+                for process in totals
+            }
+            if totals != expected:
+                diverging.append("arrays")
+        return diverging
+
+    # Requêtes
+    @property
+    def search_index(self):
+        if self._search is None:
+            self._search = SearchIndex()
+            for family_key, family_data in self.families.items():
+                for risk_key, risk_data in family_data["risks"].items():
+                    self._search.index_risk(family_key, risk_key, risk_data)
+        return self._search
+
+    @property
+    def arrays(self):
+        """Miroir colonnaire NumPy du registre (voir ``RegisterArrays``)"""
+        if self._arrays is None:
+            self._arrays = RegisterArrays.build(self.families, self.measure_types)
+        return self._arrays
+
+    def select_risks(self, any_of=(), all_of=(), families=()):
+        """Références des risques filtrés par processus (OU / ET) et familles"""
+        arrays = self.arrays
+        return arrays.refs_of(arrays.select(any_of, all_of, families))
+
+    def search(self, query, limit=None):
+        """Recherche plein texte sur les noms, descriptions et mesures des risques
+
+        None si la requête n'a aucun terme cherchable (voir ``SearchIndex.search``).
+        """
+        return self.search_index.search(query, limit)
+
+    def locate_measure(self, measure_id):
+        """Retourne (famille, risque, type) d'une mesure, ou None"""
+        # None est aussi la marque d'une mesure supprimée dans un fork
+        return self._measure_refs.get(measure_id)
+
+    def risk(self, family_key, risk_key):
+        return self.families[family_key]["risks"][risk_key]
+
+    def risks_by_family(self, family_key):
+        """Index famille -> risques (la structure imbriquée elle-même)"""
+        return self.families[family_key]["risks"]
+
+    def risk_refs_by_process(self, process):
+        """Références des risques rattachés à un processus, en O(risques concernés)"""
+        return list(self._by_process.get(process, ()))
+
+    def risks_by_process(self, process):
+        """Risques d'un processus groupés par famille : {famille: {risque: données}}"""
+        grouped = defaultdict(dict)
+        for family_key, risk_key in self._by_process.get(process, ()):
+            grouped[family_key][risk_key] = self.families[family_key]["risks"][risk_key]
+        return grouped
+
+    def risk_refs_by_measure_type(self, measure_type):
+        """Références des risques ayant au moins une mesure du type donné"""
+        return list(self._by_measure_type.get(measure_type, ()))
+
+    def measures_by_type(self, measure_type):
+        """Itère sur (famille, risque, mesure) pour un type de mesure"""
+        for (family_key, risk_key), measures in self._by_measure_type.get(measure_type, {}).items():
+            for measure in measures:
+                yield family_key, risk_key, measure
@@ -0,0 +1,205 @@
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+
+# Poids des champs (bits du masque) dans le classement
+FIELD_NAME = 1
+FIELD_DESCRIPTION = 2
+FIELD_MEASURE = 4
+FIELD_WEIGHTS = {FIELD_NAME: 4, FIELD_DESCRIPTION: 2, FIELD_MEASURE: 1}
+_MASK_SCORES = [
+    sum(weight for field, weight in FIELD_WEIGHTS.items() if mask & field)
+    for mask in range(8)
+]
+
+# Au-delà, la couche propre d'un fork n'est plus copiée : l'index est reconstruit
+FORK_MAX_OWN_RISKS = 2000
+
+_TOKEN = re.compile(r"\w+")
+# Mots distincts dont la normalisation est mémorisée : le vocabulaire d'un registre y tient
+TOKEN_CACHE_SIZE = 1 << 16
+
+
+def normalize(text):
+    """Minuscules sans accents (« Sécurité » -> « securite »)"""
+    text = text.casefold()
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+_normalize_token = lru_cache(maxsize=TOKEN_CACHE_SIZE)(normalize)
+
+
+def tokenize(text):
+    """Découpe un texte en mots normalisés (normalisation mémorisée par mot)"""
+    return [_normalize_token(raw) for raw in _TOKEN.findall(text)]
+
+
+def _trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Index inversé des risques (nom, description, mesures)
+
+    Chaque mot normalisé pointe vers les risques qui le contiennent, avec un
+    masque des champs concernés. Les trigrammes ne sont calculés que sur le
+    vocabulaire : une recherche trouve d'abord les mots qui contiennent le
+    terme saisi (sous-chaîne, insensible à la casse et aux accents), puis
+    fusionne leurs listes de risques et classe selon les champs touchés.
+
+    ``fork()`` retourne un index modifiable superposé à celui-ci (voir
+    ``RiskStore.fork``) : il n'indexe que les risques modifiés dans le fork
+    et masque leurs anciennes versions dans l'index de base, partagé tel quel.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # mot -> {doc: masque}
+        self._grams = defaultdict(set)      # trigramme -> mots du vocabulaire
+        self._doc_tokens = {}               # doc -> mots indexés
+        self._doc_ids = {}                  # (famille, risque) -> doc
+        self._refs = {}                     # doc -> (famille, risque)
+        self._next_doc = 0
+        # Fork : index de base (jamais modifié) et risques qui y sont masqués
+        self._base = None
+        self._hidden = set()
+
+    def __len__(self):
+        if self._base is None:
+            return len(self._refs)
+        masked = sum(1 for ref in self._hidden if ref in self._base._doc_ids)
+        return len(self._base) - masked + len(self._refs)
+
+    def fork(self):
+        """Index modifiable superposé à celui-ci, qui ne doit plus être modifié
+
+        Retourne None si les modifications accumulées dépassent
+        ``FORK_MAX_OWN_RISKS`` risques : l'index est alors à reconstruire.
+        """
+        if self._base is None:
+            index = SearchIndex()
+            index._base = self
+            return index
+        if len(self._refs) + len(self._hidden) > FORK_MAX_OWN_RISKS:
+            return None
+        # Même base ; seule la couche propre (petite) est copiée
+        index = SearchIndex()
+        index._base = self._base
+        index._hidden = set(self._hidden)
+        index._postings = defaultdict(dict, {token: dict(docs) for token, docs in self._postings.items()})
+        index._grams = defaultdict(set, {gram: set(tokens) for gram, tokens in self._grams.items()})
+        index._doc_tokens = dict(self._doc_tokens)
+        index._doc_ids = dict(self._doc_ids)
+        index._refs = dict(self._refs)
+        index._next_doc = self._next_doc
+        return index
+
+    def index_risk(self, family_key, risk_key, risk_data):
+        """Indexe (ou réindexe) un risque"""
+        ref = (family_key, risk_key)
+        self.remove_risk(family_key, risk_key)
+        doc = self._next_doc
+        self._next_doc += 1
+        self._doc_ids[ref] = doc
+        self._refs[doc] = ref
+
+        masks = defaultdict(int)
+        for token in tokenize(risk_key.split(" - ", 1)[-1]):
+            masks[token] |= FIELD_NAME
+        for token in tokenize(risk_data.get("description") or ""):
+            masks[token] |= FIELD_DESCRIPTION
+        for measures in risk_data["measures"].values():
+            for measure in measures:
+                for token in tokenize(measure["text"]):
+                    masks[token] |= FIELD_MEASURE
+        for token, mask in masks.items():
+            posting = self._postings[token]
+            if not posting:
+                for gram in _trigrams(token):
+                    self._grams[gram].add(token)
+            posting[doc] = mask
+        self._doc_tokens[doc] = tuple(masks)
+
+    def remove_risk(self, family_key, risk_key):
+        if self._base is not None:
+            self._hidden.add((family_key, risk_key))
+        doc = self._doc_ids.pop((family_key, risk_key), None)
+        if doc is None:
+            return
+        del self._refs[doc]
+        for token in self._doc_tokens.pop(doc):
+            posting = self._postings[token]
+            del posting[doc]
+            if not posting:
+                del self._postings[token]
+                for gram in _trigrams(token):
+                    self._grams[gram].discard(token)
+
+    def _matching_tokens(self, word):
+        """Mots du vocabulaire contenant le terme (préfixe pour 2 lettres)"""
+        if len(word) >= 3:
+            grams = sorted(
+                (self._grams.get(word[i:i + 3], set()) for i in range(len(word) - 2)),
+                key=len
+            )
+            candidates = grams[0].intersection(*grams[1:])
+            return [token for token in candidates if word in token]
+        return [token for token in self._grams.get(f" {word}", ()) if token.startswith(word)]
+
+    def _match_word(self, word):
+        """Risques contenant le terme : {doc: masque des champs}"""
+        tokens = self._matching_tokens(word)
+        if not tokens:
+            return {}
+        if len(tokens) == 1:
+            return self._postings[tokens[0]]
+        matches = dict(self._postings[tokens[0]])
+        for token in tokens[1:]:
+            for doc, mask in self._postings[token].items():
+                matches[doc] = matches.get(doc, 0) | mask
+        return matches
+
+    def search(self, query, limit=None):
+        """Retourne les références (famille, risque) classées par pertinence
+
+        None si la requête n'a aucun terme cherchable (mots d'au moins deux
+        caractères) : l'appelant ne filtre alors rien.
+        """
+        words = [w for w in tokenize(query) if len(w) >= 2]
+        if not words:
+            return None
+        scores = self._scores(words)
+        if self._base is None:
+            ranked = sorted(scores, key=lambda doc: (-scores[doc], doc))
+            return [self._refs[doc] for doc in ranked[:limit]]
+        # Fork : résultats de la base hors risques masqués, puis ceux de la couche propre
+        # (numéros décalés après ceux de la base, qui ne change plus)
+        base = self._base
+        merged = base._scores(words)
+        for ref in self._hidden:
+            merged.pop(base._doc_ids.get(ref), None)
+        offset = base._next_doc
+        for doc, score in scores.items():
+            merged[offset + doc] = score
+        ranked = sorted(merged, key=lambda doc: (-merged[doc], doc))
+        return [base._refs[doc] if doc < offset else self._refs[doc - offset] for doc in ranked[:limit]]
+
+    def _scores(self, words):
+        """Score de chaque risque de cet index contenant tous les termes : {doc: score}"""
+        scores = None
+        for word in sorted(set(words), key=len, reverse=True):
+            matches = self._match_word(word)
+            if scores is None:
+                scores = {doc: _MASK_SCORES[mask] for doc, mask in matches.items()}
+            else:
+                scores = {
+                    doc: score + _MASK_SCORES[matches[doc]]
+                    for doc, score in scores.items() if doc in matches
+                }
+            if not scores:
+                return {}
+        return scores
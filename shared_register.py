@@ -0,0 +1,227 @@
+import threading
+
+from risk_store import RiskStore
+
+
+def replay(store, operations):
+    """Rejoue des opérations sur ``store`` ; retourne celles qui ont pu s'appliquer
+
+    Une opération dont la cible a disparu entre-temps (famille ou risque
+    supprimé par une autre session) est abandonnée : la dernière
+    publication l'emporte.
+    """
+    applied = []
+    for operation, args in operations:
+        try:
+            store.apply(operation, *args)
+        except (KeyError, IndexError):
+            continue
+        applied.append((operation, args))
+    return applied
+
+
+class SharedRegister:
+    """Registre canonique, chargé une fois par processus serveur
+
+    Chaque version publiée est un ``RiskStore`` qui n'est plus jamais
+    modifié : les sessions le lisent sans copie. Publier des modifications
+    crée une nouvelle version par ``fork()`` (copie sur écriture), qui
+    partage avec la précédente tout ce qui n'a pas changé. ``revision`` est
+    la révision du stockage persistant dont la version est issue (None sans
+    stockage ou si elle est incertaine).
+    """
+
+    def __init__(self, measure_types=()):
+        self.measure_types = tuple(measure_types)
+        self._lock = threading.Lock()
+        self.version = 0
+        self.revision = None
+        self.store = RiskStore(measure_types=self.measure_types)
+        # État complet lu dans le stockage persistant (voir sync) et révision de
+        # cette lecture : actions et évaluations n'y sont à jour qu'à cette révision
+        self.backend_state = None
+        self.state_revision = None
+        self._load_lock = threading.Lock()
+
+    def current(self):
+        """(version, registre) publiés"""
+        with self._lock:
+            return self.version, self.store
+
+    def publish(self, base_version, operations, store=None, revision=None):
+        """Publie des modifications faites sur la version ``base_version``
+
+        ``store`` est le fork sur lequel elles ont été appliquées : si aucune
+        version n'a été publiée entre-temps, il devient la nouvelle version
+        tel quel ; sinon les opérations sont rejouées sur la version courante.
+        ``revision`` est la révision du stockage après l'écriture de ces
+        modifications. Retourne (version, registre) publiés.
+        """
+        with self._lock:
+            if store is None or base_version != self.version:
+                store = self.store.fork()
+                replay(store, operations)
+            self.store = store
+            self.version += 1
+            # Révision sûre seulement si aucune écriture d'une autre session ne manque
+            contiguous = revision is not None and self.revision is not None and revision == self.revision + 1
+            # Des modifications du registre laissent actions et évaluations lues
+            # inchangées ; un import (« load ») a pu les remplacer
+            if contiguous and self.state_revision == self.revision and \
+                    all(operation != "load" for operation, _ in operations):
+                self.state_revision = revision
+            self.revision = revision if contiguous else None
+            return self.version, self.store
+
+    def replace(self, families, revision=None):
+        """Publie un registre complet (chargement depuis le stockage persistant)"""
+        store = RiskStore(families, self.measure_types)
+        with self._lock:
+            self.store = store
+            self.version += 1
+            self.revision = revision
+            return self.version, self.store
+
+    def sync(self, revision, load_state):
+        """État du stockage à ``revision``, lu une seule fois pour toutes les sessions
+
+        ``load_state()`` retourne ``{"families", "actions", "measure_status",
+        "measure_performance"}`` ; le registre en devient la version publiée.
+        Après des publications contiguës, seuls le registre publié, les
+        actions et les évaluations de l'état retourné sont à jour.
+        """
+        with self._load_lock:
+            if self.backend_state is None or self.revision != revision or self.state_revision != revision:
+                state = load_state()
+                self.replace(state["families"], revision)
+                self.backend_state = state
+                self.state_revision = revision
+            return self.backend_state
+
+
+class SessionRegister:
+    """Registre vu par une session : version partagée + modifications locales
+
+    Tant que la session n'a rien modifié, ``store`` est la version publiée
+    elle-même. La première modification crée un fork (copie sur écriture) :
+    la mémoire propre à la session croît avec ses modifications, pas avec
+    la taille du registre. Les lectures sont déléguées à ``store``, avec
+    l'API de ``RiskStore`` ; ``commit()`` publie les modifications,
+    ``discard()`` les abandonne.
+    """
+
+    def __init__(self, shared):
+        self.shared = shared
+        self.version, self._base = shared.current()
+        self._fork = None
+        # [(opération, arguments)] appliquées au fork, dans l'ordre
+        self.operations = []
+
+    def __getattr__(self, name):
+        # Lecture (families, coverage, search…) sur la vue courante de la session
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.store, name)
+
+    @property
+    def store(self):
+        return self._fork if self._fork is not None else self._base
+
+    @property
+    def pending(self):
+        """Nombre de modifications non publiées"""
+        return len(self.operations)
+
+    def _edit(self, operation, *args):
+        fork = self._fork
+        if fork is None:
+            # Un import remplace tout : inutile de partager quoi que ce soit avec la version publiée
+            if operation == "load":
+                fork = RiskStore(measure_types=self._base.measure_types)
+            else:
+                fork = self._base.fork()
+        result = getattr(fork, operation)(*args)
+        if operation in ("delete_risk", "delete_measure") and not result:
+            # Cible absente : rien n'a changé, ni fork ni opération à rejouer
+            return result
+        self._fork = fork
+        if operation == "add_measures":
+            # Mesures enregistrées avec leur identifiant : le rejeu les conserve
+            family_key, risk_key, measure_type, _ = args
+            args = (family_key, risk_key, measure_type, result)
+        self.operations.append((operation, args))
+        return result
+
+    def add_family(self, family_key, family_name):
+        return self._edit("add_family", family_key, family_name)
+
+    def add_risk(self, family_key, risk_key, description, processes):
+        return self._edit("add_risk", family_key, risk_key, description, processes)
+
+    def add_measures(self, family_key, risk_key, measure_type, texts):
+        return self._edit("add_measures", family_key, risk_key, measure_type, texts)
+
+    def delete_risk(self, family_key, risk_key):
+        return self._edit("delete_risk", family_key, risk_key)
+
+    def delete_measure(self, family_key, risk_key, measure_type, measure_index):
+        return self._edit("delete_measure", family_key, risk_key, measure_type, measure_index)
+
+    def load(self, families):
+        return self._edit("load", families)
+
+    def merge(self, families):
+        """Fusion d'un import (voir ``RiskStore.merge``) ; ses opérations élémentaires sont enregistrées
+
+        Une fusion qui ne change rien ne laisse pas de fork : la session
+        continue de lire la version publiée.
+        """
+        fork = self._base.fork() if self._fork is None else self._fork
+        summary, operations = fork.merge(families)
+        if operations:
+            self._fork = fork
+            self.operations.extend(operations)
+        return summary, operations
+
+    def freeze(self):
+        """Registre de la session qui ne sera plus modifié (lecture depuis un autre thread)
+
+        Un fork en cours est figé : la session continue sur un fork de celui-ci.
+        """
+        if self._fork is None:
+            return self._base
+        frozen = self._fork
+        self._fork = frozen.fork()
+        return frozen
+
+    def refresh(self):
+        """Suit la dernière version publiée ; retourne True si la vue de la session a changé
+
+        Les modifications non publiées sont rejouées sur la nouvelle version
+        (voir ``replay`` pour celles qui ne s'appliquent plus).
+        """
+        version, base = self.shared.current()
+        if version == self.version:
+            return False
+        self.version, self._base = version, base
+        if self.operations:
+            self._fork = base.fork()
+            self.operations = replay(self._fork, self.operations)
+        return True
+
+    def commit(self, revision=None):
+        """Publie les modifications de la session comme nouvelle version partagée
+
+        ``revision`` : révision du stockage persistant qui contient ces modifications.
+        """
+        if not self.operations:
+            return
+        self.version, self._base = self.shared.publish(self.version, self.operations, self._fork, revision)
+        # Le fork est devenu (ou a servi à construire) la version partagée : il n'est plus modifiable
+        self._fork = None
+        self.operations = []
+
+    def discard(self):
+        """Abandonne les modifications non publiées"""
+        self._fork = None
+        self.operations = []
@@ -0,0 +1,384 @@
+import sqlite3
+import threading
+from datetime import date
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0);
+
+CREATE TABLE IF NOT EXISTS families (
+    family_key TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS risks (
+    id INTEGER PRIMARY KEY,
+    family_key TEXT NOT NULL REFERENCES families (family_key) ON DELETE CASCADE,
+    risk_key TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    UNIQUE (family_key, risk_key)
+);
+
+CREATE TABLE IF NOT EXISTS risk_processes (
+    risk_id INTEGER NOT NULL REFERENCES risks (id) ON DELETE CASCADE,
+    process TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_risk_processes_process ON risk_processes (process);
+CREATE INDEX IF NOT EXISTS idx_risk_processes_risk ON risk_processes (risk_id);
+
+CREATE TABLE IF NOT EXISTS measures (
+    id INTEGER PRIMARY KEY,
+    risk_id INTEGER NOT NULL REFERENCES risks (id) ON DELETE CASCADE,
+    measure_type TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    measure_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_measures_risk ON measures (risk_id, measure_type, position);
+
+CREATE TABLE IF NOT EXISTS actions (
+    action_id TEXT PRIMARY KEY,
+    measure_id TEXT NOT NULL,
+    description TEXT,
+    responsable TEXT,
+    deadline TEXT,
+    statut TEXT,
+    priorite TEXT,
+    commentaire TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_actions_measure ON actions (measure_id);
+
+CREATE TABLE IF NOT EXISTS measure_evaluations (
+    measure_id TEXT PRIMARY KEY,
+    status TEXT,
+    performance TEXT
+);
+"""
+
+ACTION_FIELDS = ["measure_id", "description", "responsable", "deadline", "statut", "priorite", "commentaire"]
+
+
+def _to_db_date(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def _from_db_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class SqliteBackend:
+    """Stockage persistant du registre dans SQLite (mode WAL)
+
+    Une seule connexion est partagée par tous les threads du serveur ; les
+    accès sont sérialisés par un verrou. Chaque écriture incrémente la
+    révision de la base, ce qui permet aux sessions de détecter qu'une autre
+    session a modifié le registre.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self):
+        """Met à niveau une base créée par une version antérieure"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(measures)")}
+        if "measure_id" not in columns:
+            self._conn.execute("ALTER TABLE measures ADD COLUMN measure_id TEXT")
+        self._conn.execute(
+            "UPDATE measures SET measure_id = lower(hex(randomblob(6))) WHERE measure_id IS NULL"
+        )
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_measures_id ON measures (measure_id)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Révisions
+    def revision(self):
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def _write(self, func, *args):
+        """Exécute une écriture dans une transaction et retourne la nouvelle révision"""
+        with self._lock, self._conn:
+            func(self._conn, *args)
+            self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    @staticmethod
+    def _risk_id(conn, family_key, risk_key):
+        row = conn.execute(
+            "SELECT id FROM risks WHERE family_key = ? AND risk_key = ?", (family_key, risk_key)
+        ).fetchone()
+        return row[0] if row else None
+
+    # Lecture
+    def load_families(self, measure_types):
+        """Reconstruit le registre imbriqué dans l'ordre d'insertion"""
+        with self._lock:
+            families = {
+                family_key: {"name": name, "risks": {}}
+                for family_key, name in self._conn.execute(
+                    "SELECT family_key, name FROM families ORDER BY rowid"
+                )
+            }
+            risks_by_id = {}
+            for risk_id, family_key, risk_key, description in self._conn.execute(
+                "SELECT id, family_key, risk_key, description FROM risks ORDER BY id"
+            ):
+                risk_data = {
+                    "description": description,
+                    "processes": [],
+                    "measures": {k: [] for k in measure_types}
+                }
+                families[family_key]["risks"][risk_key] = risk_data
+                risks_by_id[risk_id] = risk_data
+            for risk_id, process in self._conn.execute(
+                "SELECT risk_id, process FROM risk_processes ORDER BY rowid"
+            ):
+                risks_by_id[risk_id]["processes"].append(process)
+            for risk_id, measure_type, measure_id, text in self._conn.execute(
+                "SELECT risk_id, measure_type, measure_id, text FROM measures "
+                "ORDER BY risk_id, measure_type, position"
+            ):
+                risks_by_id[risk_id]["measures"].setdefault(measure_type, []).append(
+                    {"id": measure_id, "text": text}
+                )
+        return families
+
+    def load_state(self, measure_types):
+        """État complet : ``{"families", "actions", "measure_status", "measure_performance"}``"""
+        with self._lock:
+            measure_status, measure_performance = self.load_evaluations()
+            return {
+                "families": self.load_families(measure_types),
+                "actions": self.load_actions(),
+                "measure_status": measure_status,
+                "measure_performance": measure_performance
+            }
+
+    def load_actions(self):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT action_id, {', '.join(ACTION_FIELDS)} FROM actions ORDER BY rowid"
+            ).fetchall()
+        actions = {}
+        for action_id, *values in rows:
+            action = dict(zip(ACTION_FIELDS, values))
+            action["deadline"] = _from_db_date(action["deadline"])
+            actions[action_id] = action
+        return actions
+
+    def load_evaluations(self):
+        """Retourne (statuts, performances) indexés par identifiant de mesure"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT measure_id, status, performance FROM measure_evaluations"
+            ).fetchall()
+        return (
+            {measure_id: status for measure_id, status, _ in rows},
+            {measure_id: performance for measure_id, _, performance in rows}
+        )
+
+    # Écriture du registre
+    def replace_register(self, families):
+        """Remplace tout le registre (import de fichier)"""
+        return self._write(self._replace_register, families)
+
+    @staticmethod
+    def _replace_register(conn, families):
+        conn.execute("DELETE FROM families")
+        conn.executemany(
+            "INSERT INTO families (family_key, name) VALUES (?, ?)",
+            [(family_key, family_data["name"]) for family_key, family_data in families.items()]
+        )
+        for family_key, family_data in families.items():
+            for risk_key, risk_data in family_data["risks"].items():
+                risk_id = conn.execute(
+                    "INSERT INTO risks (family_key, risk_key, description) VALUES (?, ?, ?)",
+                    (family_key, risk_key, risk_data.get("description", ""))
+                ).lastrowid
+                SqliteBackend._insert_risk_content(conn, risk_id, risk_data)
+
+    def replace_state(self, families, actions, measure_status, measure_performance):
+        """Remplace registre, actions et évaluations (import d'un snapshot)"""
+        return self._write(self._replace_state, families, actions, measure_status, measure_performance)
+
+    @staticmethod
+    def _replace_state(conn, families, actions, measure_status, measure_performance):
+        SqliteBackend._replace_register(conn, families)
+        conn.execute("DELETE FROM actions")
+        for action_id, action in actions.items():
+            SqliteBackend._save_action(conn, action_id, action)
+        conn.execute("DELETE FROM measure_evaluations")
+        SqliteBackend._update_measure_statuses(conn, {
+            measure_id: (measure_status.get(measure_id), measure_performance.get(measure_id))
+            for measure_id in dict.fromkeys([*measure_status, *measure_performance])
+        })
+
+    def merge_register(self, operations):
+        """Fusion d'un import : opérations élémentaires (voir RiskStore.merge) dans une seule transaction"""
+        return self._write(self._merge_register, operations)
+
+    @staticmethod
+    def _merge_register(conn, operations):
+        writers = {
+            "add_family": SqliteBackend._add_family,
+            "rename_family": SqliteBackend._rename_family,
+            "add_risk": SqliteBackend._add_risk,
+            "update_risk": SqliteBackend._update_risk,
+            "add_measures": SqliteBackend._add_measures
+        }
+        for operation, args in operations:
+            writers[operation](conn, *args)
+
+    @staticmethod
+    def _insert_risk_content(conn, risk_id, risk_data):
+        conn.executemany(
+            "INSERT INTO risk_processes (risk_id, process) VALUES (?, ?)",
+            [(risk_id, process) for process in risk_data.get("processes", [])]
+        )
+        conn.executemany(
+            "INSERT INTO measures (risk_id, measure_type, position, measure_id, text) VALUES (?, ?, ?, ?, ?)",
+            [
+                (risk_id, measure_type, position, measure["id"], measure["text"])
+                for measure_type, measures in risk_data["measures"].items()
+                for position, measure in enumerate(measures)
+            ]
+        )
+
+    def add_family(self, family_key, family_name):
+        return self._write(self._add_family, family_key, family_name)
+
+    @staticmethod
+    def _add_family(conn, family_key, family_name):
+        # Le remplacement d'une famille vide ses risques mais garde sa position
+        conn.execute("DELETE FROM risks WHERE family_key = ?", (family_key,))
+        conn.execute(
+            "INSERT INTO families (family_key, name) VALUES (?, ?) "
+            "ON CONFLICT (family_key) DO UPDATE SET name = excluded.name",
+            (family_key, family_name)
+        )
+
+    @staticmethod
+    def _rename_family(conn, family_key, family_name):
+        conn.execute("UPDATE families SET name = ? WHERE family_key = ?", (family_name, family_key))
+
+    def add_risk(self, family_key, risk_key, description, processes):
+        return self._write(self._add_risk, family_key, risk_key, description, processes)
+
+    @staticmethod
+    def _add_risk(conn, family_key, risk_key, description, processes):
+        risk_id = SqliteBackend._risk_id(conn, family_key, risk_key)
+        if risk_id is None:
+            risk_id = conn.execute(
+                "INSERT INTO risks (family_key, risk_key, description) VALUES (?, ?, ?)",
+                (family_key, risk_key, description)
+            ).lastrowid
+        else:
+            conn.execute("UPDATE risks SET description = ? WHERE id = ?", (description, risk_id))
+            conn.execute("DELETE FROM risk_processes WHERE risk_id = ?", (risk_id,))
+            conn.execute("DELETE FROM measures WHERE risk_id = ?", (risk_id,))
+        SqliteBackend._insert_risk_content(conn, risk_id, {"processes": processes, "measures": {}})
+
+    @staticmethod
+    def _update_risk(conn, family_key, risk_key, description, processes):
+        # Description et processus seulement : les mesures sont conservées
+        risk_id = SqliteBackend._risk_id(conn, family_key, risk_key)
+        conn.execute("UPDATE risks SET description = ? WHERE id = ?", (description, risk_id))
+        conn.execute("DELETE FROM risk_processes WHERE risk_id = ?", (risk_id,))
+        SqliteBackend._insert_risk_content(conn, risk_id, {"processes": processes, "measures": {}})
+
+    def add_measures(self, family_key, risk_key, measure_type, measures):
+        return self._write(self._add_measures, family_key, risk_key, measure_type, measures)
+
+    @staticmethod
+    def _add_measures(conn, family_key, risk_key, measure_type, measures):
+        risk_id = SqliteBackend._risk_id(conn, family_key, risk_key)
+        start = conn.execute(
+            "SELECT COALESCE(MAX(position) + 1, 0) FROM measures WHERE risk_id = ? AND measure_type = ?",
+            (risk_id, measure_type)
+        ).fetchone()[0]
+        conn.executemany(
+            "INSERT INTO measures (risk_id, measure_type, position, measure_id, text) VALUES (?, ?, ?, ?, ?)",
+            [
+                (risk_id, measure_type, start + i, measure["id"], measure["text"])
+                for i, measure in enumerate(measures)
+            ]
+        )
+
+    def delete_risk(self, family_key, risk_key):
+        return self._write(self._delete_risk, family_key, risk_key)
+
+    @staticmethod
+    def _delete_risk(conn, family_key, risk_key):
+        conn.execute("DELETE FROM risks WHERE family_key = ? AND risk_key = ?", (family_key, risk_key))
+
+    def delete_measure(self, family_key, risk_key, measure_type, measure_index):
+        return self._write(self._delete_measure, family_key, risk_key, measure_type, measure_index)
+
+    @staticmethod
+    def _delete_measure(conn, family_key, risk_key, measure_type, measure_index):
+        risk_id = SqliteBackend._risk_id(conn, family_key, risk_key)
+        conn.execute(
+            "DELETE FROM measures WHERE id = ("
+            "SELECT id FROM measures WHERE risk_id = ? AND measure_type = ? "
+            "ORDER BY position LIMIT 1 OFFSET ?)",
+            (risk_id, measure_type, measure_index)
+        )
+
+    # Écriture des actions et évaluations
+    def save_action(self, action_id, action):
+        return self._write(self._save_action, action_id, action)
+
+    @staticmethod
+    def _save_action(conn, action_id, action):
+        values = [_to_db_date(action[field]) if field == "deadline" else action[field] for field in ACTION_FIELDS]
+        conn.execute(
+            f"INSERT INTO actions (action_id, {', '.join(ACTION_FIELDS)}) "
+            f"VALUES (?, {', '.join('?' * len(ACTION_FIELDS))}) "
+            f"ON CONFLICT (action_id) DO UPDATE SET "
+            f"{', '.join(f'{field} = excluded.{field}' for field in ACTION_FIELDS)}",
+            [action_id, *values]
+        )
+
+    def delete_action(self, action_id):
+        return self._write(self._delete_action, action_id)
+
+    @staticmethod
+    def _delete_action(conn, action_id):
+        conn.execute("DELETE FROM actions WHERE action_id = ?", (action_id,))
+
+    def update_measure_status(self, measure_id, status, performance):
+        return self._write(self._update_measure_status, measure_id, status, performance)
+
+    def update_measure_statuses(self, updates):
+        """Enregistre plusieurs évaluations dans une seule transaction"""
+        return self._write(self._update_measure_statuses, updates)
+
+    @staticmethod
+    def _update_measure_statuses(conn, updates):
+        conn.executemany(
+            "INSERT OR REPLACE INTO measure_evaluations (measure_id, status, performance) VALUES (?, ?, ?)",
+            [(measure_id, status, performance) for measure_id, (status, performance) in updates.items()]
+        )
+
+    @staticmethod
+    def _update_measure_status(conn, measure_id, status, performance):
+        conn.execute(
+            "INSERT OR REPLACE INTO measure_evaluations (measure_id, status, performance) VALUES (?, ?, ?)",
+            (measure_id, status, performance)
+        )